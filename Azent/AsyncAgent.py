@@ -0,0 +1,135 @@
+import asyncio
+import json
+import inspect
+from opik import track
+from Azent.clients import get_llm_client
+from Azent.Azent import Agent
+from tools.redis_cache import AsyncRedisCache
+from tools.thread_store import AsyncThreadStore
+
+
+class AsyncAgent(Agent):
+    """
+    asyncio version of Agent.
+
+    LLM calls go through AsyncOpenAI and threads are persisted with an async
+    redis client, so a single worker can keep many completions in flight.
+    Tools stay plain functions; blocking ones are executed in a worker thread.
+    """
+
+    def create_client(self, base_url, api_key, client_type):
+        return get_llm_client(client_type, base_url, api_key, asynchronous=True)
+
+    def create_cache(self):
+        return AsyncRedisCache()
+
+    def create_thread_store(self):
+        return AsyncThreadStore(self.redis_cache.binary_client)
+
+    def load_thread(self):
+        raise RuntimeError("AsyncAgent threads must be loaded with aload_thread")
+
+    async def aload_thread(self):
+        self.set_threads(*await self.thread_store.load(self.name, self.session_id))
+
+    @track
+    async def execute_tool_call(self, tool_call, tools_map):
+        name = tool_call.function.name
+        args = json.loads(tool_call.function.arguments)
+
+        print(f"Assistant: {name}({args})")
+        tool = tools_map[name]
+        if inspect.iscoroutinefunction(tool):
+            return await tool(**args)
+        return await asyncio.to_thread(tool, **args)
+
+    @track
+    async def run(self, query, response_format=None, max_tool_calls=1):
+        """
+        Run the agent with fixed tool calling sequence
+        """
+        try:
+            if self._thread is None:
+                await self.aload_thread()
+
+            self.add_message({"role": "user", "content": str(query)})
+
+            if not self.tools:
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=self.context_messages(),
+                    temperature=self.temp,
+                    response_format=self.get_response_format(response_format)
+                )
+                message = response.choices[0].message.content
+                self.add_message({"role": "assistant", "content": str(message)})
+                await self.save_thread()
+                return self.overall_thread
+
+            tool_schemas = self.tools_to_toolschema()
+            tools_map = {tool.__name__: tool for tool in self.tools}
+            tool_call_count = 0
+
+            while tool_call_count < max_tool_calls:
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=self.context_messages(),
+                    tools=tool_schemas,
+                    temperature=self.temp,
+                    response_format=self.get_response_format(response_format)
+                )
+
+                message = response.choices[0].message
+                assistant_message = self.assistant_message(message)
+
+                self.add_message(assistant_message)
+
+                if not message.tool_calls:
+                    break
+
+                for tool_call in message.tool_calls:
+                    if tool_call.function.name in tools_map:
+                        try:
+                            print('calling tool: ', tool_call.function)
+                            result = await self.execute_tool_call(tool_call, tools_map)
+                            tool_response = self.tool_response(tool_call, result)
+                        except Exception as e:
+                            print(f"Tool execution error: {str(e)}")
+                            tool_response = self.tool_error_response(tool_call, e)
+                        self.add_message(tool_response)
+                    else:
+                        print(f"Warning: Tool {tool_call.function.name} not found!")
+
+                tool_call_count += 1
+
+            await self.save_thread()
+            return self.overall_thread
+
+        except Exception as e:
+            print('Exception occurred:', e)
+            raise
+
+    async def save_thread(self):
+        async with self.redis_cache.pipeline() as pipe:
+            self.thread_store.write(pipe, self.name, self.session_id, self.new_messages)
+            for write in self.pending_writes:
+                write(pipe)
+        self.new_messages = []
+        self.pending_writes = []
+
+    async def run_pyd(self, query, pyd_model) -> dict:
+        "This method is to use pydantic models for getting structured outputs"
+
+        if self._thread is None:
+            await self.aload_thread()
+
+        self.add_message({"role":"user","content":query})
+
+        response = await self.client.beta.chat.completions.parse(
+                model=self.model,
+                messages=self.context_messages(),
+                response_format=pyd_model,
+                temperature=self.temp
+                )
+
+        return response.choices[0].message.parsed.model_dump()
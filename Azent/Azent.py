@@ -1,12 +1,49 @@
 import json, os
 import inspect
+from types import SimpleNamespace
 from opik.integrations.openai import track_openai
 from opik import track
-from openai import AzureOpenAI, OpenAI
+from Azent.clients import get_llm_client
 from tools.redis_cache import RedisCache
+from tools.thread_store import ThreadStore
+from Azent.context import ContextManager
 from dotenv import load_dotenv
 load_dotenv()
 
+# Tool results rendered by the frontend as itinerary cards / selectable buttons
+JSON_TOOLS = ['get_activities_by_group_type_or_travel_theme_and_number_of_days', 'get_hotels_by_destination', 'get_base_itinerary', 'update_itinerary']
+JSON_BUTTON_TOOLS = ['get_activities_by_activity_name', 'get_hotels']
+
+
+def parse_cursor(cursor):
+    """
+    Cursor sent by a chat client: None or a non-negative message count.
+    Raises ValueError otherwise so the request can be rejected before the agent runs.
+    """
+    if cursor is None:
+        return None
+    if isinstance(cursor, bool) or not isinstance(cursor, (int, str)):
+        raise ValueError("cursor must be a non-negative integer")
+    try:
+        cursor = int(cursor)
+    except ValueError:
+        raise ValueError("cursor must be a non-negative integer")
+    if cursor < 0:
+        raise ValueError("cursor must be a non-negative integer")
+    return cursor
+
+
+def visible_messages(thread, cursor=None):
+    """
+    Messages of a thread shown to the user (everything but the system prompt).
+    With a cursor (number of messages the client has already seen) only the newer ones are returned.
+    """
+    messages = [msg for msg in thread if msg['role'] != 'system']
+    if cursor is None:
+        return messages, len(messages)
+    return messages[max(int(cursor), 0):], len(messages)
+
+
 class Agent:
 
     def __init__(
@@ -20,23 +57,12 @@ class Agent:
             base_url=os.getenv("LLM_BASE_URL"),
             api_key=os.getenv('LLM_API_KEY'),
             client_type=os.getenv('LLM_CLIENT_TYPE'),
+            context_token_budget=None,
     ):
 
-        # Open AI client
-        self.client = OpenAI(
-            base_url=base_url,
-            api_key=api_key,
-        )
-
-        if client_type == "azure":
-            self.client = AzureOpenAI(
-                api_key=api_key,
-                azure_endpoint=base_url,
-                azure_deployment='gpt-4o-mvp-dev',
-                api_version='2024-02-15-preview'
-            )
-
-        self.redis_cache = RedisCache()
+        self.client = self.create_client(base_url, api_key, client_type)
+        self.redis_cache = self.create_cache()
+        self.thread_store = self.create_thread_store()
         self.name = name
         self.model = model
         self.instructions = instructions
@@ -49,14 +75,57 @@ class Agent:
         
         self.temp = temperature
 
-        self.thread = self.redis_cache.get(self.name + self.session_id)
-        self.overall_thread = self.redis_cache.get('conversation:' + self.session_id)
+        # keeps the prompt under the token budget, tokens_saved accumulates over the request
+        self.context = ContextManager(model, token_budget=context_token_budget)
+        self.tokens_saved = 0
+
+        # threads are read lazily from the thread store on first access
+        self._thread = None
+        self._overall_thread = None
+        # messages added during this turn, appended to the store by save_thread
+        self.new_messages = []
+        # redis writes tools deferred to save_thread (see defer_write)
+        self.pending_writes = []
+
+    def create_client(self, base_url, api_key, client_type):
+        return get_llm_client(client_type, base_url, api_key)
+
+    def create_cache(self):
+        return RedisCache()
+
+    def create_thread_store(self):
+        return ThreadStore(self.redis_cache.binary_client)
+
+    @property
+    def thread(self):
+        if self._thread is None:
+            self.load_thread()
+        return self._thread
+
+    @property
+    def overall_thread(self):
+        if self._overall_thread is None:
+            self.load_thread()
+        return self._overall_thread
+
+    def load_thread(self):
+        self.set_threads(*self.thread_store.load(self.name, self.session_id))
 
-        if self.thread == None:
-            self.thread = [{"role":"system","content": self.instructions}]
+    def set_threads(self, thread, overall_thread):
+        # the system prompt is not persisted, the agent's current instructions are used instead
+        self._thread = [{"role":"system","content": self.instructions}] + thread
+        self._overall_thread = overall_thread
 
-        if self.overall_thread == None:
-            self.overall_thread = [{"role":"system","content": self.instructions}]
+    def context_messages(self):
+        """Messages sent to the model: the thread, compacted to fit the context budget"""
+        messages, stats = self.context.compact(self.thread)
+        self.tokens_saved += stats['tokens_saved']
+        return messages
+
+    def add_message(self, message):
+        self.thread.append(message)
+        self.overall_thread.append(message)
+        self.new_messages.append(message)
 
     def function_to_schema(self,func) -> dict:
         type_map = {
@@ -115,6 +184,51 @@ class Agent:
 
     def tools_to_toolschema(self) -> list:
         return [self.function_to_schema(tool) for tool in self.tools]
+
+    def get_response_format(self, response_format):
+        return {'type': 'json_object'} if response_format == 'json' else None
+
+    def assistant_message(self, message) -> dict:
+        assistant_message = {
+            "role": "assistant",
+            "content": message.content if message.content else None,
+            "type": "text",
+            "agent_name": self.name,
+        }
+
+        if message.tool_calls:
+            assistant_message["tool_calls"] = [
+                {
+                    "id": tool_call.id,
+                    "type": tool_call.type,
+                    "function": {
+                        "name": tool_call.function.name,
+                        "arguments": tool_call.function.arguments
+                    }
+                }
+                for tool_call in message.tool_calls
+            ]
+
+        return assistant_message
+
+    def tool_response(self, tool_call, result) -> dict:
+        name = tool_call.function.name
+        return {
+            "role": "tool",
+            "tool_call_id": tool_call.id,
+            "name": name,
+            "content": json.dumps(result) if result is not None else "{}",
+            "agent_name": self.name,
+            "type": "json" if name in JSON_TOOLS else 'json-button' if name in JSON_BUTTON_TOOLS else 'text'
+        }
+
+    def tool_error_response(self, tool_call, error) -> dict:
+        return {
+            "role": "tool",
+            "tool_call_id": tool_call.id,
+            "name": tool_call.function.name,
+            "content": json.dumps({"error": str(error)})
+        }
     
     @track
     def run(self, query, response_format=None, max_tool_calls=1):
@@ -122,19 +236,17 @@ class Agent:
         Run the agent with fixed tool calling sequence
         """
         try:
-            self.thread.append({"role": "user", "content": str(query)})
-            self.overall_thread.append({"role": "user", "content": str(query)})
+            self.add_message({"role": "user", "content": str(query)})
             
             if not self.tools:
                 response = self.client.chat.completions.create(
                     model=self.model,
-                    messages=self.thread,
+                    messages=self.context_messages(),
                     temperature=self.temp,
-                    response_format={'type': 'json_object'} if response_format == 'json' else None
+                    response_format=self.get_response_format(response_format)
                 )
                 message = response.choices[0].message.content
-                self.thread.append({"role": "assistant", "content": str(message)})
-                self.overall_thread.append({"role": "assistant", "content": str(message)})
+                self.add_message({"role": "assistant", "content": str(message)})
                 self.save_thread()
                 return self.overall_thread
 
@@ -145,36 +257,16 @@ class Agent:
             while tool_call_count < max_tool_calls:
                 response = self.client.chat.completions.create(
                     model=self.model,
-                    messages=self.thread,
+                    messages=self.context_messages(),
                     tools=tool_schemas,
                     temperature=self.temp,
-                    response_format={'type': 'json_object'} if response_format == 'json' else None
+                    response_format=self.get_response_format(response_format)
                 )
                 
                 message = response.choices[0].message
+                assistant_message = self.assistant_message(message)
                 
-                assistant_message = {
-                    "role": "assistant",
-                    "content": message.content if message.content else None,
-                    "type": "text",
-                    "agent_name": self.name,
-                }
-                
-                if message.tool_calls:
-                    assistant_message["tool_calls"] = [
-                        {
-                            "id": tool_call.id,
-                            "type": tool_call.type,
-                            "function": {
-                                "name": tool_call.function.name,
-                                "arguments": tool_call.function.arguments
-                            }
-                        }
-                        for tool_call in message.tool_calls
-                    ]
-                
-                self.thread.append(assistant_message)
-                self.overall_thread.append(assistant_message)
+                self.add_message(assistant_message)
                 
                 if not message.tool_calls:
                     break
@@ -184,26 +276,11 @@ class Agent:
                         try:
                             print('calling tool: ', tool_call.function)
                             result = self.execute_tool_call(tool_call, tools_map)
-                            tool_response = {
-                                "role": "tool",
-                                "tool_call_id": tool_call.id,
-                                "name": tool_call.function.name,
-                                "content": json.dumps(result) if result is not None else "{}",
-                                "agent_name": self.name,
-                                "type": "json" if tool_call.function.name in ['get_activities_by_group_type_or_travel_theme_and_number_of_days', 'get_hotels_by_destination', 'get_base_itinerary', 'update_itinerary'] else 'json-button' if tool_call.function.name in ['get_activities_by_activity_name', 'get_hotels'] else 'text'
-                            }
-                            self.thread.append(tool_response)
-                            self.overall_thread.append(tool_response)
+                            tool_response = self.tool_response(tool_call, result)
                         except Exception as e:
                             print(f"Tool execution error: {str(e)}")
-                            tool_response = {
-                                "role": "tool",
-                                "tool_call_id": tool_call.id,
-                                "name": tool_call.function.name,
-                                "content": json.dumps({"error": str(e)})
-                            }
-                            self.thread.append(tool_response)
-                            self.overall_thread.append(tool_response)
+                            tool_response = self.tool_error_response(tool_call, e)
+                        self.add_message(tool_response)
                     else:
                         print(f"Warning: Tool {tool_call.function.name} not found!")
                 
@@ -215,10 +292,136 @@ class Agent:
         except Exception as e:
             print('Exception occurred:', e)
             raise
-    
+
+    def get_stream_tool(self, tool):
+        """Return the streaming variant of a tool (`<name>_stream` on the same object) if it has one"""
+        owner = getattr(tool, '__self__', None)
+        return getattr(owner, tool.__name__ + '_stream', None) if owner is not None else None
+
+    def stream_completion(self, **kwargs):
+        """
+        Stream a chat completion, yielding ('token', text) events.
+        The assembled message is returned as the generator's return value.
+        """
+        content = ''
+        tool_calls = {}
+
+        for chunk in self.client.chat.completions.create(stream=True, **kwargs):
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+
+            if delta.content:
+                content += delta.content
+                yield 'token', {'content': delta.content}
+
+            for tool_call_delta in delta.tool_calls or []:
+                tool_call = tool_calls.setdefault(tool_call_delta.index, SimpleNamespace(
+                    id=None,
+                    type='function',
+                    function=SimpleNamespace(name='', arguments='')
+                ))
+                if tool_call_delta.id:
+                    tool_call.id = tool_call_delta.id
+                if tool_call_delta.function:
+                    tool_call.function.name += tool_call_delta.function.name or ''
+                    tool_call.function.arguments += tool_call_delta.function.arguments or ''
+
+        return SimpleNamespace(
+            content=content,
+            tool_calls=[tool_calls[index] for index in sorted(tool_calls)] or None
+        )
+
+    def run_stream(self, query, response_format=None, max_tool_calls=1):
+        """
+        Streaming variant of run.
+
+        Yields (event, data) tuples: 'token' for assistant text, 'tool_call_start' and
+        'tool_call_end' around every tool call, 'tool_token' for text streamed by a tool
+        and a final 'done' once the thread has been saved.
+        """
+        self.add_message({"role": "user", "content": str(query)})
+
+        completion_args = {
+            "model": self.model,
+            "temperature": self.temp,
+            "response_format": self.get_response_format(response_format),
+        }
+
+        if not self.tools:
+            message = yield from self.stream_completion(messages=self.context_messages(), **completion_args)
+            self.add_message({"role": "assistant", "content": str(message.content)})
+            self.save_thread()
+            yield 'done', {}
+            return
+
+        completion_args["tools"] = self.tools_to_toolschema()
+        tools_map = {tool.__name__: tool for tool in self.tools}
+        tool_call_count = 0
+
+        while tool_call_count < max_tool_calls:
+            message = yield from self.stream_completion(messages=self.context_messages(), **completion_args)
+            assistant_message = self.assistant_message(message)
+
+            self.add_message(assistant_message)
+
+            if not message.tool_calls:
+                break
+
+            for tool_call in message.tool_calls:
+                name = tool_call.function.name
+                if name not in tools_map:
+                    print(f"Warning: Tool {name} not found!")
+                    continue
+
+                yield 'tool_call_start', {'id': tool_call.id, 'name': name, 'arguments': tool_call.function.arguments}
+                try:
+                    stream_tool = self.get_stream_tool(tools_map[name])
+                    if stream_tool is None:
+                        result = self.execute_tool_call(tool_call, tools_map)
+                    else:
+                        result = None
+                        for event, data in stream_tool(**json.loads(tool_call.function.arguments)):
+                            if event == 'result':
+                                result = data
+                            else:
+                                yield 'tool_token', {'id': tool_call.id, 'name': name, 'content': data}
+                    tool_response = self.tool_response(tool_call, result)
+                except Exception as e:
+                    print(f"Tool execution error: {str(e)}")
+                    result = {"error": str(e)}
+                    tool_response = self.tool_error_response(tool_call, e)
+                self.add_message(tool_response)
+                if self.pending_writes:
+                    # the client sees the itinerary (and its id) with this event and may
+                    # disconnect right after, so it must be stored before it is sent
+                    self.save_thread()
+                yield 'tool_call_end', {
+                    'id': tool_call.id,
+                    'name': name,
+                    'type': tool_response.get('type', 'text'),
+                    'content': result,
+                }
+
+            tool_call_count += 1
+
+        self.save_thread()
+        yield 'done', {}
+
+    def defer_write(self, write):
+        """
+        Queue write(pipe) to run in the pipeline that saves the thread, so a tool's redis
+        writes and the turn's messages are stored together in one round trip.
+        """
+        self.pending_writes.append(write)
+
     def save_thread(self):
-        self.redis_cache.set(self.name + self.session_id, self.thread)
-        self.redis_cache.set('conversation:' + self.session_id, self.overall_thread)
+        with self.redis_cache.pipeline() as pipe:
+            self.thread_store.write(pipe, self.name, self.session_id, self.new_messages)
+            for write in self.pending_writes:
+                write(pipe)
+        self.new_messages = []
+        self.pending_writes = []
 
     def call_function(self,resp):
         "This method is used to call the tool from the llms response"
@@ -236,12 +439,11 @@ class Agent:
     def run_pyd(self, query, pyd_model) -> dict:
         "This method is to use pydantic models for getting structured outputs"
 
-        self.thread.append({"role":"user","content":query})
-        self.overall_thread.append({"role":"user","content":query})
+        self.add_message({"role":"user","content":query})
 
         response = self.client.beta.chat.completions.parse(
                 model=self.model,
-                messages=self.thread,
+                messages=self.context_messages(),
                 response_format=pyd_model,
                 temperature=self.temp
                 )
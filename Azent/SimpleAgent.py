@@ -1,5 +1,5 @@
 from typing import Dict, Any
-from openai import OpenAI
+from Azent.clients import get_llm_client
 import os
 import json
 from dotenv import load_dotenv
@@ -35,7 +35,8 @@ class SimpleAgent:
         self.output_format = output_format
         self.temperature = temperature
 
-        self.client = OpenAI(
+        self.client = get_llm_client(
+            provider='openai',
             base_url=base_url or os.getenv('LLM_BASE_URL'),
             api_key=api_key or os.getenv('LLM_API_KEY')
         )
@@ -0,0 +1,78 @@
+import os
+import threading
+import httpx
+from openai import (
+    AsyncAzureOpenAI,
+    AsyncOpenAI,
+    AzureOpenAI,
+    DefaultAsyncHttpxClient,
+    DefaultHttpxClient,
+    OpenAI,
+)
+from dotenv import load_dotenv
+load_dotenv()
+
+AZURE_DEPLOYMENT = 'gpt-4o-mvp-dev'
+AZURE_API_VERSION = '2024-02-15-preview'
+
+# Process wide LLM clients. Each client owns an httpx connection pool, sharing them
+# keeps TLS connections alive across requests instead of handshaking on every agent/tool.
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(os.getenv('LLM_MAX_CONNECTIONS', 100)),
+        max_keepalive_connections=int(os.getenv('LLM_MAX_KEEPALIVE_CONNECTIONS', 20)),
+        keepalive_expiry=float(os.getenv('LLM_KEEPALIVE_EXPIRY', 30)),
+    )
+
+
+def create_llm_client(provider=None, base_url=None, api_key=None, deployment=None, asynchronous=False):
+    """Build a new (unshared) client, use get_llm_client unless you need a private pool"""
+    base_url = base_url or os.getenv('LLM_BASE_URL')
+    api_key = api_key or os.getenv('LLM_API_KEY')
+    if asynchronous:
+        http_client = DefaultAsyncHttpxClient(limits=get_limits())
+    else:
+        http_client = DefaultHttpxClient(limits=get_limits())
+
+    if provider == "azure":
+        client_cls = AsyncAzureOpenAI if asynchronous else AzureOpenAI
+        return client_cls(
+            api_key=api_key,
+            azure_endpoint=base_url,
+            azure_deployment=deployment or AZURE_DEPLOYMENT,
+            api_version=AZURE_API_VERSION,
+            http_client=http_client,
+        )
+
+    client_cls = AsyncOpenAI if asynchronous else OpenAI
+    return client_cls(
+        base_url=base_url,
+        api_key=api_key,
+        http_client=http_client,
+    )
+
+
+def get_llm_client(provider=None, base_url=None, api_key=None, deployment=None, asynchronous=False):
+    """
+    Shared LLM client for (provider, base_url, deployment).
+    Arguments default to the LLM_* environment variables.
+    """
+    provider = provider or os.getenv('LLM_CLIENT_TYPE') or 'openai'
+    base_url = base_url or os.getenv('LLM_BASE_URL')
+    api_key = api_key or os.getenv('LLM_API_KEY')
+    if provider == "azure":
+        deployment = deployment or AZURE_DEPLOYMENT
+
+    key = (provider, base_url, deployment, api_key, asynchronous)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = create_llm_client(provider, base_url, api_key, deployment, asynchronous)
+                _clients[key] = client
+    return client
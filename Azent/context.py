@@ -0,0 +1,109 @@
+import json
+import os
+import tiktoken
+from logger import logger
+
+# tools whose result is the full itinerary package
+ITINERARY_TOOLS = ['get_base_itinerary', 'update_itinerary']
+
+
+class ContextManager:
+    """
+    Keeps the messages sent to the model under a token budget.
+
+    The system prompt and the latest itinerary are always sent verbatim. When the
+    thread is over budget, older tool payloads are replaced by a compact reference
+    (oldest first), and if that is not enough the oldest turns are dropped.
+    The stored thread is never modified, only the copy sent to the model.
+    """
+
+    def __init__(self, model: str, token_budget: int = None, summary_chars: int = 200):
+        self.token_budget = token_budget or int(os.getenv('CONTEXT_TOKEN_BUDGET', 16000))
+        self.summary_chars = summary_chars
+        try:
+            self.encoding = tiktoken.encoding_for_model(model or '')
+        except KeyError:
+            # deployment names (azure) and unknown models
+            self.encoding = tiktoken.get_encoding('o200k_base')
+
+    def count_message(self, message: dict) -> int:
+        # ~4 tokens of per-message overhead in the chat format
+        tokens = 4 + len(self.encoding.encode(str(message.get('content') or '')))
+        for tool_call in message.get('tool_calls') or []:
+            tokens += len(self.encoding.encode(tool_call['function']['name'] + tool_call['function']['arguments']))
+        return tokens
+
+    def count(self, messages) -> int:
+        return sum(self.count_message(message) for message in messages)
+
+    def latest_itinerary_index(self, messages):
+        for index in range(len(messages) - 1, -1, -1):
+            message = messages[index]
+            if message['role'] == 'tool' and message.get('name') in ITINERARY_TOOLS and message.get('type') == 'json':
+                return index
+        return None
+
+    def summarize(self, message: dict) -> str:
+        """Compact reference that replaces an old tool payload"""
+        try:
+            content = json.loads(message.get('content') or 'null')
+        except (TypeError, json.JSONDecodeError):
+            content = message.get('content')
+
+        if isinstance(content, dict) and 'itinerary_detail' in content:
+            summary = f"itinerary '{content.get('name')}' ({content.get('duration')} days, id {content.get('id')})"
+        elif isinstance(content, list):
+            titles = [item.get('title', str(item)) if isinstance(item, dict) else str(item) for item in content]
+            summary = f"{len(content)} results: " + '; '.join(titles)
+        else:
+            summary = str(content)
+
+        return json.dumps({
+            'ref': message.get('tool_call_id'),
+            'tool': message.get('name'),
+            'summary': summary[:self.summary_chars],
+        })
+
+    def compact(self, messages):
+        """Return (messages to send, stats) for the thread"""
+        counts = [self.count_message(message) for message in messages]
+        tokens_before = sum(counts)
+        total = tokens_before
+        messages = list(messages)
+
+        if total > self.token_budget:
+            keep = self.latest_itinerary_index(messages)
+
+            for index, message in enumerate(messages):
+                if total <= self.token_budget:
+                    break
+                if message['role'] != 'tool' or index == keep:
+                    continue
+                compacted = dict(message, content=self.summarize(message))
+                compacted_count = self.count_message(compacted)
+                if compacted_count < counts[index]:
+                    total -= counts[index] - compacted_count
+                    messages[index], counts[index] = compacted, compacted_count
+
+            # still over budget: drop whole turns (a user message and everything up to the next one)
+            # after the system prompt, but never the latest turn or the latest itinerary
+            while total > self.token_budget:
+                user_indexes = [i for i, message in enumerate(messages) if message['role'] == 'user']
+                if len(user_indexes) < 2:
+                    break
+                start, end = user_indexes[0], user_indexes[1]
+                keep = self.latest_itinerary_index(messages)
+                if keep is not None and start <= keep < end:
+                    break
+                total -= sum(counts[start:end])
+                del messages[start:end]
+                del counts[start:end]
+
+        stats = {
+            'tokens_before': tokens_before,
+            'tokens_after': total,
+            'tokens_saved': tokens_before - total,
+        }
+        if stats['tokens_saved']:
+            logger.info(f"Context compacted from {tokens_before} to {total} tokens (budget {self.token_budget})")
+        return messages, stats
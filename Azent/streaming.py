@@ -0,0 +1,13 @@
+import json
+
+
+def to_sse(event: str, data) -> str:
+    """Format an agent event as a Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    # disable proxy buffering (nginx) so frames reach the client immediately
+    'X-Accel-Buffering': 'no',
+}
@@ -1,8 +1,10 @@
 from dotenv import load_dotenv
-from Azent.Azent import Agent
+from Azent.Azent import Agent, visible_messages
+from Azent.AsyncAgent import AsyncAgent
 from prompts.get_base_itinerary_editor_prompt import get_base_itinerary_prompt
 from tools.itinerary_tool import ItineraryTool
 from opik import track
+from logger import logger
 import os
 
 
@@ -12,38 +14,70 @@ class BaseItineraryAgent:
     def __init__(self):
         load_dotenv()
         self.name = 'base_itinerary'
+        self.message_count = None
 
     @track
-    def get_or_create_agent(self, session_id: str) -> Agent:
+    def get_or_create_agent(self, session_id: str, agent_cls=Agent) -> Agent:
         """Get existing agent or create new one for the user"""
         try:
-            new_agent = Agent(
+            itinerary_tool = ItineraryTool()
+            new_agent = agent_cls(
                 name=self.name,
                 model=os.getenv('BASE_ITINERARY_MODEL'),
                 instructions=get_base_itinerary_prompt(session_id),
                 session_id=session_id,
                 tools=[
-                    ItineraryTool().get_base_itinerary
+                    itinerary_tool.get_base_itinerary
                 ],
             )
+            # the new itinerary is stored with the turn's messages
+            itinerary_tool.defer_write = new_agent.defer_write
             return new_agent
         except Exception as e:
             print(e)
             raise e
 
     @track
-    def generate_response(self, session_id: str, user_input: str) -> str:
+    def generate_response(self, session_id: str, user_input: str, cursor: int = None) -> str:
         """Generate response using the manager agent"""
         agent = self.get_or_create_agent(session_id)
         print("agent", agent.name)
         try:
             thread = agent.run(user_input)
-            return [msg for msg in thread if msg['role'] != 'system']
+            messages, self.message_count = visible_messages(thread, cursor)
+            logger.info(f"Context compaction saved {agent.tokens_saved} tokens this turn ({agent.name}, session {session_id})")
+            return messages
 
         except Exception as e:
             print(f"Error generating response: {e}")
             return "I apologize, but I encountered an error processing your request. Please try again."
 
+    @track
+    async def agenerate_response(self, session_id: str, user_input: str, cursor: int = None) -> str:
+        """Generate response using the manager agent without blocking the event loop"""
+        agent = self.get_or_create_agent(session_id, agent_cls=AsyncAgent)
+        print("agent", agent.name)
+        try:
+            thread = await agent.run(user_input)
+            messages, self.message_count = visible_messages(thread, cursor)
+            logger.info(f"Context compaction saved {agent.tokens_saved} tokens this turn ({agent.name}, session {session_id})")
+            return messages
+
+        except Exception as e:
+            print(f"Error generating response: {e}")
+            return "I apologize, but I encountered an error processing your request. Please try again."
+
+    def generate_response_stream(self, session_id: str, user_input: str):
+        """Generate response using the manager agent, yielding (event, data) tuples as they are produced"""
+        agent = self.get_or_create_agent(session_id)
+        print("agent", agent.name)
+        try:
+            yield from agent.run_stream(user_input)
+
+        except Exception as e:
+            print(f"Error generating response: {e}")
+            yield 'error', {'error': "I apologize, but I encountered an error processing your request. Please try again."}
+
     def clear_conversation(self, user_id: str) -> None:
         """Clear user's conversation by removing their agent"""
         if user_id in self.active_sessions:
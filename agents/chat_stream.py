@@ -0,0 +1,37 @@
+from agents.base_itinerary_agent import BaseItineraryAgent
+from agents.itinerary_editor_agent import ItineraryEditorAgent
+from Azent.streaming import to_sse
+from logger import logger
+
+
+def stream_chat(chat_request):
+    """
+    Same as chat, but yields SSE frames while the agent is working
+    """
+    session_id = chat_request['session_id']
+    message = chat_request['message']
+    intent = chat_request.get('intent', None)
+    itinerary_id = chat_request.get('itinerary_id', None)
+
+    try:
+        if intent == 'base_itinerary':
+            logger.info("Streaming BaseItineraryAgent.")
+            events = BaseItineraryAgent().generate_response_stream(session_id, message)
+        elif intent == 'edit_itinerary':
+            if itinerary_id is None:
+                logger.error("Missing itinerary id in chat request.")
+                raise Exception("Missing itinerary id in chat request.")
+            logger.info("Streaming ItineraryEditorAgent.")
+            events = ItineraryEditorAgent(itinerary_id=itinerary_id).generate_response_stream(session_id, message)
+        else:
+            logger.warning("Missing intent in chat request.")
+            yield to_sse('error', {'error': 'Missing intent in request'})
+            return
+
+        for event, data in events:
+            if event == 'done':
+                data = {'session_id': session_id}
+            yield to_sse(event, data)
+    except Exception as e:
+        logger.error(f"Error streaming response: {str(e)}", exc_info=True)
+        yield to_sse('error', {'error': f'Internal server error: {str(e)}'})
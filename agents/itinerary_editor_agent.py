@@ -1,13 +1,16 @@
 from dotenv import load_dotenv
-from Azent.Azent import Agent
+from Azent.Azent import Agent, visible_messages
+from Azent.AsyncAgent import AsyncAgent
 from prompts.get_itinerary_editor_prompt import get_itinerary_editor_prompt
 from tools.get_activities_tool import get_activities_by_activity_name
 from tools.get_hotels_tool import get_hotels
 from opik import track
+from logger import logger
 import os
 
 from tools.itinerary_tool import ItineraryTool
-from tools.redis_cache import RedisCache
+from tools.redis_cache import AsyncRedisCache, RedisCache
+from tools.thread_store import ThreadStore
 
 
 class ItineraryEditorAgent:
@@ -16,43 +19,94 @@ class ItineraryEditorAgent:
     def __init__(self, itinerary_id: str):
         load_dotenv()
         self.redis_cache = RedisCache()
-        self.package = self.redis_cache.get(itinerary_id)
+        self.package = None
         self.itinerary_id = itinerary_id
         self.name = 'itinerary_editor_agent'
+        self.message_count = None
+
+    def load(self, session_id: str) -> list:
+        """Read the itinerary and the session's thread entries in one round trip"""
+        with self.redis_cache.pipeline(transaction=False) as pipe:
+            pipe.get(self.itinerary_id)
+            ThreadStore(self.redis_cache.binary_client).read(pipe, session_id)
+        self.package, entries = pipe.results
+        return entries
+
+    async def aload(self, session_id: str) -> list:
+        redis_cache = AsyncRedisCache()
+        async with redis_cache.pipeline(transaction=False) as pipe:
+            pipe.get(self.itinerary_id)
+            ThreadStore(redis_cache.binary_client).read(pipe, session_id)
+        self.package, entries = pipe.results
+        return entries
 
     @track
-    def get_or_create_agent(self, session_id: str) -> Agent:
-        """Get existing agent or create new one for the user"""
+    def get_or_create_agent(self, session_id: str, agent_cls=Agent, entries: list = None) -> Agent:
+        """Get existing agent or create new one for the user, entries are the thread read by load()"""
         try:
-            new_agent = Agent(
+            if entries is None:
+                entries = self.load(session_id)
+            itinerary_tool = ItineraryTool(itinerary_id=self.itinerary_id, package=self.package)
+            new_agent = agent_cls(
                 name=self.name,
                 model=os.getenv('ITINERARY_EDITOR_MODEL'),
                 instructions=get_itinerary_editor_prompt(self.package),
                 session_id=session_id,
                 tools=[
                     get_hotels,
-                    ItineraryTool(itinerary_id=self.itinerary_id).update_itinerary,
+                    itinerary_tool.update_itinerary,
                     get_activities_by_activity_name
                 ],
             )
+            new_agent.set_threads(*new_agent.thread_store.split(entries, new_agent.name))
+            # edits are stored with the turn's messages, one round trip for all the writes
+            itinerary_tool.defer_write = new_agent.defer_write
             return new_agent
         except Exception as e:
             print(e)
             raise e
 
     @track
-    def generate_response(self, session_id: str, user_input: str) -> str:
+    def generate_response(self, session_id: str, user_input: str, cursor: int = None) -> str:
         """Generate response using the itinerary agent"""
         agent = self.get_or_create_agent(session_id)
         print("agent", agent.name)
         try:
             thread = agent.run(user_input)
-            return [msg for msg in thread if msg['role'] != 'system']
+            messages, self.message_count = visible_messages(thread, cursor)
+            logger.info(f"Context compaction saved {agent.tokens_saved} tokens this turn ({agent.name}, session {session_id})")
+            return messages
 
         except Exception as e:
             print(f"Error generating response: {e}")
             return "I apologize, but I encountered an error processing your request. Please try again."
 
+    @track
+    async def agenerate_response(self, session_id: str, user_input: str, cursor: int = None) -> str:
+        """Generate response using the itinerary agent without blocking the event loop"""
+        agent = self.get_or_create_agent(session_id, agent_cls=AsyncAgent, entries=await self.aload(session_id))
+        print("agent", agent.name)
+        try:
+            thread = await agent.run(user_input)
+            messages, self.message_count = visible_messages(thread, cursor)
+            logger.info(f"Context compaction saved {agent.tokens_saved} tokens this turn ({agent.name}, session {session_id})")
+            return messages
+
+        except Exception as e:
+            print(f"Error generating response: {e}")
+            return "I apologize, but I encountered an error processing your request. Please try again."
+
+    def generate_response_stream(self, session_id: str, user_input: str):
+        """Generate response using the itinerary agent, yielding (event, data) tuples as they are produced"""
+        agent = self.get_or_create_agent(session_id)
+        print("agent", agent.name)
+        try:
+            yield from agent.run_stream(user_input)
+
+        except Exception as e:
+            print(f"Error generating response: {e}")
+            yield 'error', {'error': "I apologize, but I encountered an error processing your request. Please try again."}
+
     def clear_conversation(self, user_id: str) -> None:
         """Clear user's conversation by removing their agent"""
         if user_id in self.active_sessions:
@@ -0,0 +1,233 @@
+import asyncio
+import json
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from agents.base_itinerary_agent import BaseItineraryAgent
+from agents.itinerary_editor_agent import ItineraryEditorAgent
+from agents.chat_stream import stream_chat
+from logger import logger
+from Azent.Azent import parse_cursor
+from Azent.streaming import SSE_HEADERS
+from tools.redis_cache import AsyncRedisCache
+from tools.thread_store import AsyncThreadStore
+from tools.catalog_snapshot import catalog_snapshots
+
+# Async serving entry point, exposes the same /chat and /chat-history contracts as main.py
+# run with: uvicorn asgi:app --host 0.0.0.0 --port 5001
+app = FastAPI()
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=['*'],
+    allow_methods=['GET', 'POST', 'OPTIONS'],
+    allow_headers=['Content-Type'],
+)
+redis_cache = AsyncRedisCache()
+thread_store = AsyncThreadStore(redis_cache.binary_client)
+
+
+@app.on_event('startup')
+async def load_catalog_snapshot():
+    # warm the catalog snapshot so the first requests don't query the db for lookups
+    await asyncio.to_thread(catalog_snapshots.current)
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'POST, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type'
+}
+
+
+async def chat(chat_request):
+    """
+    Process chat request using the async agents and return response
+    """
+    try:
+        logger.info("Processing chat request.")
+        logger.debug(f"Received chat_request: {chat_request}")
+
+        message = chat_request['message']
+        session_id = chat_request['session_id']
+        itinerary_id = chat_request.get('itinerary_id', None)
+        intent = chat_request.get('intent', None)
+        cursor = chat_request.get('cursor', None)
+
+        if not intent:
+            logger.warning("Missing intent in chat request.")
+            return {
+                'statusCode': 400,
+                'headers': CORS_HEADERS,
+                'body': {'error': 'Missing intent in request'}
+            }
+
+        thread = []
+        message_count = None
+        logger.info(f"Intent detected: {intent}")
+
+        if intent == 'base_itinerary':
+            logger.info("Calling BaseItineraryAgent.")
+            manager_agent = BaseItineraryAgent()
+            thread = await manager_agent.agenerate_response(session_id, message, cursor)
+            message_count = manager_agent.message_count
+
+        elif intent == 'edit_itinerary':
+            if itinerary_id is None:
+                logger.error("Missing itinerary id in chat request.")
+                raise Exception("Missing itinerary id in chat request.")
+            logger.info("Calling ItineraryEditorAgent.")
+            itinerary_editor_agent = ItineraryEditorAgent(itinerary_id=itinerary_id)
+            thread = await itinerary_editor_agent.agenerate_response(session_id, message, cursor)
+            message_count = itinerary_editor_agent.message_count
+
+        final_response = {
+            'session_id': session_id,
+            'message': thread
+        }
+        if message_count is not None:
+            # clients send this back as `cursor` to only receive the messages of the next turn
+            final_response['cursor'] = message_count
+
+        logger.info("Response generated successfully.")
+        return {
+            'statusCode': 200,
+            'headers': CORS_HEADERS,
+            'body': final_response
+        }
+    except Exception as e:
+        logger.error(f"Error generating response: {str(e)}", exc_info=True)
+        return {
+            'statusCode': 500,
+            'headers': CORS_HEADERS,
+            'body': {
+                'error': f'Internal server error: {str(e)}'
+            }
+        }
+
+
+def parse_last_message(messages):
+    """Decode the JSON payload of the last tool message so the client receives an object"""
+    if not messages or not isinstance(messages, list):
+        return
+
+    last_message = messages[-1]
+    if last_message.get('type') in ("json", "json-button") and last_message.get('content'):
+        try:
+            last_message['content'] = json.loads(last_message['content'])
+        except json.JSONDecodeError as e:
+            logger.warning(f"JSON parsing error: {str(e)}")
+
+
+@app.options('/chat')
+async def handle_chat_options():
+    logger.info("Received OPTIONS request.")
+    return Response(status_code=204)
+
+
+@app.post('/chat')
+async def handle_chat(request: Request):
+    """
+    Handle chat endpoint requests
+    """
+    try:
+        try:
+            body = await request.json()
+        except json.JSONDecodeError:
+            logger.warning("Request is not in JSON format.")
+            return JSONResponse({'error': 'Request must be JSON'}, status_code=400)
+
+        logger.debug(f"Received request body: {body}")
+
+        session_id = body.get('sessionID')
+        msg_thread = body.get('msgThread')
+        intent = body.get('intent')
+        itinerary_id = body.get('itinerary_id', None)
+        cursor = body.get('cursor', None)
+
+        if not session_id or not msg_thread:
+            logger.warning("Missing required fields: sessionID or msgThread.")
+            return JSONResponse({
+                'error': 'Missing required fields: sessionID and msgthread'
+            }, status_code=400)
+
+        try:
+            cursor = parse_cursor(cursor)
+        except ValueError as e:
+            logger.warning(f"Invalid cursor in chat request: {cursor!r}")
+            return JSONResponse({'error': str(e)}, status_code=400)
+
+        chat_request = {
+            'message': msg_thread,
+            'session_id': session_id,
+            'intent': intent,
+            'itinerary_id': itinerary_id,
+            'cursor': cursor
+        }
+
+        result = await chat(chat_request)
+
+        response_body = result.get('body', {})
+        parse_last_message(response_body.get('message', []))
+
+        logger.info("Returning response to client.")
+        return JSONResponse(response_body, status_code=result['statusCode'], headers=result['headers'])
+
+    except Exception as e:
+        logger.error(f"Error processing request: {str(e)}", exc_info=True)
+        return JSONResponse({
+            'error': f'Internal server error: {str(e)}'
+        }, status_code=500)
+
+
+@app.post('/chat-stream')
+async def handle_chat_stream(request: Request):
+    """
+    Streaming variant of /chat, responds with Server-Sent Events.
+    The streaming agent is synchronous, starlette iterates it in its threadpool.
+    """
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        logger.warning("Request is not in JSON format.")
+        return JSONResponse({'error': 'Request must be JSON'}, status_code=400)
+
+    session_id = body.get('sessionID')
+    msg_thread = body.get('msgThread')
+
+    if not session_id or not msg_thread:
+        logger.warning("Missing required fields: sessionID or msgThread.")
+        return JSONResponse({
+            'error': 'Missing required fields: sessionID and msgthread'
+        }, status_code=400)
+
+    chat_request = {
+        'message': msg_thread,
+        'session_id': session_id,
+        'intent': body.get('intent'),
+        'itinerary_id': body.get('itinerary_id', None)
+    }
+
+    return StreamingResponse(stream_chat(chat_request), media_type='text/event-stream', headers=SSE_HEADERS)
+
+
+@app.get('/chat-history')
+async def get_chat_history(sessionID: str = None):
+    try:
+        if not sessionID:
+            return JSONResponse({'error': 'sessionID is required'}, status_code=400)
+
+        history = await thread_store.conversation(sessionID)
+
+        # remove system_prompt from history
+        history = [msg for msg in history if msg['role'] != 'system']
+
+        return JSONResponse({'session_id': sessionID, 'chat_history': history, 'cursor': len(history)}, status_code=200)
+    except Exception as e:
+        logger.error(f"Error getting chat history: {str(e)}", exc_info=True)
+        return JSONResponse({'error': f'Internal server error: {str(e)}'}, status_code=500)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    logger.info("Starting ASGI application.")
+    uvicorn.run(app, host='0.0.0.0', port=5001)
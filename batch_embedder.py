@@ -0,0 +1,115 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+import openai
+import tiktoken
+from tenacity import Retrying, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# embeddings.create limits: 2048 inputs per request, 8191 tokens per input
+MAX_BATCH_INPUTS = 2048
+MAX_INPUT_TOKENS = 8191
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+
+class BatchEmbedder:
+    """
+    Embeds many texts with as few requests as possible for the data pipeline.
+
+    Texts are deduplicated, grouped into batches bounded by input count and total tokens,
+    and a bounded number of batches run concurrently. Rate limit and transient errors are
+    retried with exponential backoff. embed() returns the vectors in input order.
+
+    With a store (tools.embedding_store.EmbeddingStore) texts embedded before are read from
+    disk and only the rest is sent to the API.
+    """
+
+    def __init__(
+            self,
+            client: openai.OpenAI,
+            model: str = EMBEDDING_MODEL,
+            batch_size: int = None,
+            max_batch_tokens: int = None,
+            max_concurrency: int = None,
+            max_attempts: int = None,
+            store=None,
+    ):
+        # retries are handled here so a batch isn't retried twice over
+        self.client = client.with_options(max_retries=0)
+        self.model = model
+        self.store = store
+        self.batch_size = min(batch_size or int(os.getenv('EMBEDDING_BATCH_SIZE', 512)), MAX_BATCH_INPUTS)
+        self.max_batch_tokens = max_batch_tokens or int(os.getenv('EMBEDDING_BATCH_MAX_TOKENS', 250000))
+        self.max_concurrency = max_concurrency or int(os.getenv('EMBEDDING_MAX_CONCURRENCY', 4))
+        self.max_attempts = max_attempts or int(os.getenv('EMBEDDING_MAX_ATTEMPTS', 6))
+        self.encoding = tiktoken.get_encoding("cl100k_base")
+        # the embedder is shared by table syncs running in parallel, this bounds requests across all of them
+        self.requests = threading.BoundedSemaphore(self.max_concurrency)
+
+    def truncate(self, text: str) -> Tuple[str, int]:
+        tokens = self.encoding.encode(text)
+        if len(tokens) > MAX_INPUT_TOKENS:
+            return self.encoding.decode(tokens[:MAX_INPUT_TOKENS]), MAX_INPUT_TOKENS
+        return text, len(tokens)
+
+    def batches(self, texts: List[str]) -> List[List[str]]:
+        batches, batch, batch_tokens = [], [], 0
+        for text in texts:
+            text, tokens = self.truncate(text)
+            if batch and (len(batch) >= self.batch_size or batch_tokens + tokens > self.max_batch_tokens):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def embed_batch(self, batch: List[str]) -> List[List[float]]:
+        for attempt in Retrying(
+            retry=retry_if_exception_type(RETRYABLE_ERRORS),
+            wait=wait_random_exponential(multiplier=1, max=60),
+            stop=stop_after_attempt(self.max_attempts),
+            reraise=True,
+        ):
+            with attempt:
+                if attempt.retry_state.attempt_number > 1:
+                    logger.warning(f"Retrying embedding batch of {len(batch)} (attempt {attempt.retry_state.attempt_number})")
+                with self.requests:
+                    response = self.client.embeddings.create(input=batch, model=self.model)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        unique = list(dict.fromkeys(texts))
+        if not unique:
+            return []
+
+        vectors = {}
+        if self.store is not None:
+            stored = self.store.get_many(unique, self.model)
+            vectors = {text: vector.tolist() for text, vector in zip(unique, stored) if vector is not None}
+        missing = [text for text in unique if text not in vectors]
+
+        batches = self.batches(missing)
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            results = [vector for batch in executor.map(self.embed_batch, batches) for vector in batch]
+        vectors.update(zip(missing, results))
+        if self.store is not None and missing:
+            self.store.put_many(missing, results, self.model)
+
+        logger.info(
+            f"Embedded {len(unique)} unique texts ({len(texts)} inputs): "
+            f"{len(unique) - len(missing)} from the store, {len(missing)} in {len(batches)} requests"
+        )
+        return [vectors[text] for text in texts]
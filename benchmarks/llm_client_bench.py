@@ -0,0 +1,51 @@
+"""
+Per-request latency of a fresh LLM client versus the shared pooled client.
+
+    python -m benchmarks.llm_client_bench --requests 20
+
+Uses the LLM_* environment variables and a cheap models.list() call, so the
+difference is the connection setup (TCP + TLS) paid by a fresh client.
+"""
+import argparse
+import statistics
+import time
+from Azent.clients import create_llm_client, get_llm_client
+
+
+def timed(fn, n):
+    durations = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def fresh_client_request():
+    client = create_llm_client(provider='openai')
+    client.models.list()
+    client.close()
+
+
+def shared_client_request():
+    get_llm_client(provider='openai').models.list()
+
+
+def report(name, durations):
+    print(f"{name:>8}: mean {statistics.mean(durations):7.1f} ms  p50 {statistics.median(durations):7.1f} ms  max {max(durations):7.1f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=20)
+    args = parser.parse_args()
+
+    # warm the shared pool so the first handshake is not counted
+    shared_client_request()
+
+    fresh = timed(fresh_client_request, args.requests)
+    shared = timed(shared_client_request, args.requests)
+
+    report('fresh', fresh)
+    report('shared', shared)
+    print(f"saved per request: {statistics.mean(fresh) - statistics.mean(shared):.1f} ms")
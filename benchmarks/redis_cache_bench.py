@@ -0,0 +1,91 @@
+"""
+Redis traffic of an itinerary edit turn: one command per round trip versus pipelined.
+
+    python -m benchmarks.redis_cache_bench --requests 200
+
+Runs against REDIS_HOST (use a local redis). The sequential variant issues the commands
+the editor used to send one by one (itinerary GET, thread LRANGE, itinerary SETEX, edit
+history and thread appends), the pipelined variant sends the same commands as one read
+and one write round trip through RedisCache.pipeline.
+"""
+import argparse
+import statistics
+import time
+import uuid
+from tools.redis_cache import RedisCache
+from tools.thread_store import ThreadStore
+
+
+def timed(fn, n):
+    durations = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def report(name, durations):
+    print(f"{name:>10}: mean {statistics.mean(durations):7.2f} ms  p50 {statistics.median(durations):7.2f} ms  max {max(durations):7.2f} ms")
+
+
+class EditTurn:
+    def __init__(self, cache: RedisCache, itinerary: dict):
+        self.cache = cache
+        self.thread_store = ThreadStore(cache.binary_client)
+        self.itinerary = itinerary
+        self.session_id = 'bench-' + uuid.uuid4().hex
+        self.messages = [{'role': 'user', 'content': 'swap the day 2 hotel'}, {'role': 'assistant', 'content': 'done'}]
+        cache.set(itinerary['id'], itinerary)
+
+    def sequential(self):
+        client = self.cache.client
+        client.get(self.itinerary['id'])
+        self.thread_store.load('itinerary_editor_agent', self.session_id)
+        self.cache.set(self.itinerary['id'], self.itinerary)
+        history = client.pipeline(transaction=True)
+        history.rpush('itinerary_history:' + self.itinerary['id'], '{}')
+        history.expire('itinerary_history:' + self.itinerary['id'], 3600)
+        history.execute()
+        self.thread_store.append('itinerary_editor_agent', self.session_id, self.messages)
+
+    def pipelined(self):
+        with self.cache.pipeline(transaction=False) as pipe:
+            pipe.get(self.itinerary['id'])
+            self.thread_store.read(pipe, self.session_id)
+        with self.cache.pipeline() as pipe:
+            pipe.set(self.itinerary['id'], self.itinerary)
+            pipe.rpush('itinerary_history:' + self.itinerary['id'], '{}')
+            pipe.expire('itinerary_history:' + self.itinerary['id'], 3600)
+            self.thread_store.write(pipe, 'itinerary_editor_agent', self.session_id, self.messages)
+
+    def cleanup(self):
+        self.cache.client.delete(
+            self.itinerary['id'],
+            'itinerary_history:' + self.itinerary['id'],
+            self.thread_store.key(self.session_id),
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    cache = RedisCache()
+    itinerary = {
+        'id': 'bench-' + uuid.uuid4().hex,
+        'itinerary_detail': [{'day': day, 'details': [{'id': str(uuid.uuid4()), 'title': 'activity'}] * 4} for day in range(5)],
+    }
+    turn = EditTurn(cache, itinerary)
+    try:
+        # warm the connection pool
+        cache.client.ping()
+        sequential = timed(turn.sequential, args.requests)
+        pipelined = timed(turn.pipelined, args.requests)
+    finally:
+        turn.cleanup()
+
+    report('sequential', sequential)
+    report('pipelined', pipelined)
+    print(f"saved per turn: {statistics.mean(sequential) - statistics.mean(pipelined):.2f} ms")
@@ -0,0 +1,77 @@
+"""
+Size and encode/decode time of each RedisCache codec on a large conversation thread.
+
+    python -m benchmarks.redis_codec_bench --messages 200 --iterations 200
+
+Runs offline. The thread mimics a long editing session: user and assistant turns plus
+tool results carrying whole itineraries, the largest values the cache stores.
+"""
+import argparse
+import statistics
+import time
+import uuid
+from tools.redis_codec import Codec, CodecError, decode
+
+CODECS = ['json', 'orjson', 'msgpack', 'orjson+zstd', 'msgpack+zstd']
+
+
+def sample_thread(messages):
+    itinerary = {
+        'id': str(uuid.uuid4()),
+        'name': 'Dubai Family Escape',
+        'itinerary_detail': [
+            {
+                'day': day,
+                'details': [
+                    {
+                        'id': str(uuid.uuid4()),
+                        'title': f'Activity {day}-{item}',
+                        'description': f'Guided visit number {item} of day {day}, transfers included. ' * 3,
+                        'duration': 2.5,
+                        'rating': 4.6,
+                    }
+                    for item in range(4)
+                ],
+            }
+            for day in range(1, 6)
+        ],
+    }
+    thread = []
+    for i in range(messages):
+        if i % 4 == 3:
+            thread.append({'agent': 'itinerary_editor_agent', 'message': {'role': 'tool', 'tool_call_id': str(uuid.uuid4()), 'content': itinerary}})
+        else:
+            thread.append({'agent': 'itinerary_editor_agent', 'message': {'role': 'user' if i % 2 == 0 else 'assistant', 'content': f'message {i} about changing the hotel on day {i % 5}'}})
+    return thread
+
+
+def measure(codec, thread, iterations):
+    encoded = [codec.encode(entry) for entry in thread]
+    encode_ms, decode_ms = [], []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        encoded = [codec.encode(entry) for entry in thread]
+        encode_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        for data in encoded:
+            decode(data)
+        decode_ms.append((time.perf_counter() - start) * 1000)
+    return sum(len(data) for data in encoded), statistics.median(encode_ms), statistics.median(decode_ms)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    thread = sample_thread(args.messages)
+    print(f"{'codec':>14} {'bytes':>10} {'encode':>10} {'decode':>10}")
+    for name in CODECS:
+        try:
+            codec = Codec(name)
+        except CodecError as e:
+            print(f"{name:>14} skipped: {str(e)}")
+            continue
+        size, encode_ms, decode_ms = measure(codec, thread, args.iterations)
+        print(f"{name:>14} {size:>10} {encode_ms:>8.2f}ms {decode_ms:>8.2f}ms")
@@ -1,4 +1,12 @@
-from sqlalchemy import create_engine, Column, String
+import argparse
+import hashlib
+import json
+import sys
+import time
+from contextlib import contextmanager
+from itertools import islice
+from sqlalchemy import create_engine, Column, String, text
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 from database_schema import Destination, Hotel, HotelMaster, Location, LocationGroupTheme, MustActivityGroupTheme, MustTravelActivity, MustTravelActivityMaster, Pair, RecommendActivityGroupTheme, RecommendedActivity, RecommendedActivityMaster, Region, TravelGroup, TravelGroupMaster, TravelTheme, TravelThemeMaster
 from openai import OpenAI
@@ -8,7 +16,13 @@ import os
 from datetime import datetime
 import logging
 from dotenv import load_dotenv
-from database_schema import Base
+from database_schema import Base, DestinationFallback, EMBEDDING_DIMENSIONS, SyncRowHash, SyncWatermark, VECTOR_INDEXES
+from tools.itinerary_catalog import bump_catalog_version
+from tools.vector_index import VECTOR_INDEX_DIR, VectorIndex
+from batch_embedder import BatchEmbedder
+from sync_dag import DagScheduler
+from tools.embedding_store import EMBEDDING_STORE_DIR, EmbeddingStore
+from tools.vector_queries import HOTEL_SEARCH_SQL, MUST_ACTIVITY_SEARCH_SQL, VECTOR_SEARCH_CANDIDATES, vector_search_settings
 
 load_dotenv()
 
@@ -16,357 +30,475 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# dependent tables before the tables they reference
+DELETE_ORDER = [
+    RecommendActivityGroupTheme,
+    MustActivityGroupTheme,
+    Hotel,
+    LocationGroupTheme,
+    RecommendedActivity,
+    MustTravelActivity,
+    Location,
+    Destination,
+    TravelTheme,
+    TravelGroup,
+    Pair,
+    Region,
+]
+
+
+# rows per master fetch and per INSERT ... ON CONFLICT statement
+SYNC_CHUNK_SIZE = int(os.getenv('SYNC_CHUNK_SIZE', 500))
+
+
+def chunks(iterable, size: int):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def content_hash(*values) -> str:
+    """Hash of the content a row is synced and embedded from"""
+    return hashlib.sha256(json.dumps(values, default=str).encode("utf-8")).hexdigest()
+
+
 class DatabaseSync:
     def __init__(self):
         self.master_engine = create_engine(os.getenv('MASTER_DB_URL'))
         self.chatbot_engine = create_engine(os.getenv('VECTOR_DB_URL'))
         self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        # texts embedded by earlier syncs (or other environments sharing the store) cost no API call
+        self.embedding_store = EmbeddingStore(EMBEDDING_STORE_DIR, EMBEDDING_DIMENSIONS)
+        self.embedder = BatchEmbedder(self.client, store=self.embedding_store)
+        # per table sync stats, filled by timed()
+        self.metrics = {}
         
     def get_embedding(self, text: str) -> List[float]:
-        response = self.client.embeddings.create(
-            input=[f"{text}"],
-            model="text-embedding-ada-002"
-        )
+        return self.embedder.embed([f"{text}"])[0]
 
-        embedding_vector = response.data[0].embedding
-        return embedding_vector
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Embeddings for all texts in input order, batched and run concurrently"""
+        return self.embedder.embed(texts)
 
     def initialize_chatbot_db(self):
         """Initialize all tables in chatbot database if they don't exist"""
         try:
+            with self.chatbot_engine.begin() as connection:
+                connection.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
             Base.metadata.create_all(self.chatbot_engine)
+            self.create_vector_indexes()
             print("Successfully initialized chatbot database tables")
         except Exception as e:
             print(f"Error initializing chatbot database: {str(e)}")
             raise
     
-    def sync_regions(self):
-        with Session(self.master_engine) as master_session, Session(self.chatbot_engine) as chatbot_session:
-            regions = master_session.query(Region).all()
-            
-            for region in regions:
-                # Using the region name for embedding since it's the main identifier
-                # embedding = self.get_embedding(region.region)
-                
-                chatbot_region = chatbot_session.query(Region).filter_by(id=region.id).first()
-                if not chatbot_region:
-                    chatbot_region = Region(
-                        id=region.id,
-                        region=region.region,
-                        # embedding=embedding
-                    )
-                    chatbot_session.add(chatbot_region)
-                else:
-                    # chatbot_region.embedding = embedding
-                    pass
-            
+    def create_vector_indexes(self):
+        """Convert embedding columns created as float arrays to vector and build their HNSW indexes"""
+        with self.chatbot_engine.begin() as connection:
+            for table, index_name, operator_class in VECTOR_INDEXES:
+                column_type = connection.execute(text("""
+                    SELECT udt_name FROM information_schema.columns
+                    WHERE table_name = :table AND column_name = 'embedding'
+                """), {"table": table}).scalar()
+                if column_type != "vector":
+                    logger.info(f"Converting {table}.embedding from {column_type} to vector({EMBEDDING_DIMENSIONS})")
+                    connection.execute(text(
+                        f"ALTER TABLE {table} ALTER COLUMN embedding "
+                        f"TYPE vector({EMBEDDING_DIMENSIONS}) USING embedding::vector({EMBEDDING_DIMENSIONS})"
+                    ))
+                connection.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} "
+                    f"USING hnsw (embedding {operator_class}) WITH (m = 16, ef_construction = 64)"
+                ))
+
+    @contextmanager
+    def timed(self, table: str):
+        """Log duration and row rate of a table sync, callers fill in rows/changed"""
+        stats = {'rows': 0, 'changed': None}
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            elapsed = time.perf_counter() - start
+            stats['seconds'] = elapsed
+            self.metrics[table] = stats
+            changed = f", {stats['changed']} changed" if stats['changed'] is not None else ""
+            logger.info(
+                f"{table}: {stats['rows']} rows in {elapsed:.2f}s "
+                f"({stats['rows'] / elapsed if elapsed else 0:.0f} rows/s){changed}"
+            )
+
+    def upsert(self, chatbot_session, model, rows: List[dict], index_elements: List[str] = None):
+        """INSERT ... ON CONFLICT DO UPDATE in chunks of SYNC_CHUNK_SIZE rows"""
+        index_elements = index_elements or ['id']
+        for chunk in chunks(rows, SYNC_CHUNK_SIZE):
+            statement = insert(model.__table__).values(chunk)
+            statement = statement.on_conflict_do_update(
+                index_elements=index_elements,
+                set_={column: statement.excluded[column] for column in chunk[0] if column not in index_elements},
+            )
+            chatbot_session.execute(statement)
+
+    def sync_table(self, model, columns: List[str]):
+        """Copy a table without embeddings, master rows are streamed in chunks and upserted"""
+        with Session(self.master_engine) as master_session, Session(self.chatbot_engine) as chatbot_session, \
+                self.timed(model.__tablename__) as stats:
+            query = master_session.query(*[getattr(model, column) for column in columns]).yield_per(SYNC_CHUNK_SIZE)
+            for chunk in chunks(query, SYNC_CHUNK_SIZE):
+                self.upsert(chatbot_session, model, [dict(zip(columns, row)) for row in chunk])
+                stats['rows'] += len(chunk)
             chatbot_session.commit()
-    
-    def sync_pairs(self):
-        with Session(self.master_engine) as master_session, Session(self.chatbot_engine) as chatbot_session:
-            pairs = master_session.query(Pair).all()
-            
-            for pair in pairs:
-                # Using the destination_pair field for embedding
-                # embedding = self.get_embedding(pair.destination_pair)
-                
-                chatbot_pair = chatbot_session.query(Pair).filter_by(id=pair.id).first()
-                if not chatbot_pair:
-                    chatbot_pair = Pair(
-                        id=pair.id,
-                        destination_pair=pair.destination_pair,
-                        # embedding=embedding
-                    )
-                    chatbot_session.add(chatbot_pair)
-                else:
-                    pass
-            
+
+    def sync_embedded_table(self, model, query, to_row, to_text, hash_values):
+        """
+        Copy a table with embeddings. Master rows are streamed in chunks, only rows that are new
+        or whose content hash changed are embedded and upserted.
+
+        to_row(record) -> column dict, to_text(record) -> embedded text,
+        hash_values(record) -> other synced values that go into the content hash
+        """
+        table = model.__tablename__
+        with Session(self.chatbot_engine) as chatbot_session, self.timed(table) as stats:
+            synced = self.synced_hashes(chatbot_session, model)
+            hashes = []
+            stats['changed'] = 0
+
+            for chunk in chunks(query.yield_per(SYNC_CHUNK_SIZE), SYNC_CHUNK_SIZE):
+                rows = [to_row(record) for record in chunk]
+                texts = [to_text(record) for record in chunk]
+                chunk_hashes = [content_hash(text, *hash_values(record)) for record, text in zip(chunk, texts)]
+                hashes += chunk_hashes
+                stats['rows'] += len(chunk)
+
+                changed = [i for i, (row, row_hash) in enumerate(zip(rows, chunk_hashes)) if synced.get(row['id']) != row_hash]
+                if not changed:
+                    continue
+                embeddings = self.get_embeddings([texts[i] for i in changed])
+
+                self.upsert(chatbot_session, model, [{**rows[i], 'embedding': embedding} for i, embedding in zip(changed, embeddings)])
+                self.upsert(
+                    chatbot_session,
+                    SyncRowHash,
+                    [{'table_name': table, 'row_id': rows[i]['id'], 'content_hash': chunk_hashes[i]} for i in changed],
+                    index_elements=['table_name', 'row_id'],
+                )
+                stats['changed'] += len(changed)
+
+            self.record_watermark(chatbot_session, model, hashes, stats['changed'])
             chatbot_session.commit()
 
+    def sync_regions(self):
+        self.sync_table(Region, ['id', 'region'])
+
+    def sync_pairs(self):
+        self.sync_table(Pair, ['id', 'destination_pair'])
+
     def sync_destinations(self):
-        with Session(self.master_engine) as master_session, Session(self.chatbot_engine) as chatbot_session:
-            destinations = master_session.query(Destination).all()
-            
-            for dest in destinations:
-                combined_text = f"{dest.name} {dest.description}"
-                # embedding = self.get_embedding(combined_text)
-                
-                chatbot_dest = chatbot_session.query(Destination).filter_by(id=dest.id).first()
-                if not chatbot_dest:
-                    chatbot_dest = Destination(
-                        id=dest.id,
-                        name=dest.name,
-                        code=dest.code,
-                        description=dest.description,
-                        region_id=dest.region_id,
-                        pair_id=dest.pair_id,
-                        # embedding=embedding
-                    )
-                    chatbot_session.add(chatbot_dest)
-                else:
-                    # chatbot_dest.embedding = embedding
-                    pass
-            
-            chatbot_session.commit()
+        self.sync_table(Destination, ['id', 'name', 'code', 'description', 'region_id', 'pair_id'])
 
     def sync_locations(self):
-        with Session(self.master_engine) as master_session, Session(self.chatbot_engine) as chatbot_session:
-            locations = master_session.query(Location).all()
-            
-            for loc in locations:
-                combined_text = f"{loc.name} {loc.description}"
-                # embedding = self.get_embedding(combined_text)
-                
-                chatbot_loc = chatbot_session.query(Location).filter_by(id=loc.id).first()
-                if not chatbot_loc:
-                    chatbot_loc = Location(
-                        id=loc.id,
-                        name=loc.name,
-                        description=loc.description,
-                        destination_id=loc.destination_id,
-                        # embedding=embedding
-                    )
-                    chatbot_session.add(chatbot_loc)
-                else:
-                    # chatbot_loc.embedding = embedding
-                    pass
-            
-            chatbot_session.commit()
+        self.sync_table(Location, ['id', 'name', 'description', 'destination_id'])
 
     def sync_travel_groups(self):
-        with Session(self.master_engine) as master_session, Session(self.chatbot_engine) as chatbot_session:
-            travel_groups = master_session.query(TravelGroupMaster).all()
-            
-            for group in travel_groups:
-                combined_text = f"{group.name}, {group.description}"
-                embedding = self.get_embedding(combined_text)
-                
-                chatbot_group = chatbot_session.query(TravelGroup).filter_by(id=group.id).first()
-                if not chatbot_group:
-                    chatbot_group = TravelGroup(
-                        id=group.id,
-                        name=group.name,
-                        code=group.code,
-                        description=group.description,
-                        embedding=embedding
-                    )
-                    chatbot_session.add(chatbot_group)
-                else:
-                    chatbot_group.embedding = embedding
-            
-            chatbot_session.commit()
+        with Session(self.master_engine) as master_session:
+            self.sync_embedded_table(
+                TravelGroup,
+                master_session.query(TravelGroupMaster),
+                to_row=lambda group: {
+                    'id': group.id,
+                    'name': group.name,
+                    'code': group.code,
+                    'description': group.description,
+                },
+                to_text=lambda group: f"{group.name}, {group.description}",
+                hash_values=lambda group: (group.code,),
+            )
 
     def sync_travel_themes(self):
-        with Session(self.master_engine) as master_session, Session(self.chatbot_engine) as chatbot_session:
-            themes = master_session.query(TravelThemeMaster).all()
-            
-            for theme in themes:
+        with Session(self.master_engine) as master_session:
+            self.sync_embedded_table(
+                TravelTheme,
+                master_session.query(TravelThemeMaster),
+                to_row=lambda theme: {
+                    'id': theme.id,
+                    'name': theme.name,
+                    'code': theme.code,
+                    'description': theme.description,
+                },
                 # Combine name and description for richer embedding
-                combined_text = f"{theme.name}, {theme.description}"
-                embedding = self.get_embedding(combined_text)
-                
-                chatbot_theme = chatbot_session.query(TravelTheme).filter_by(id=theme.id).first()
-                if not chatbot_theme:
-                    chatbot_theme = TravelTheme(
-                        id=theme.id,
-                        name=theme.name,
-                        code=theme.code,
-                        description=theme.description,
-                        embedding=embedding
-                    )
-                    chatbot_session.add(chatbot_theme)
-                else:
-                    chatbot_theme.embedding = embedding
-            
-            chatbot_session.commit()
+                to_text=lambda theme: f"{theme.name}, {theme.description}",
+                hash_values=lambda theme: (theme.code,),
+            )
 
     def sync_location_group_themes(self):
-        with Session(self.master_engine) as master_session, Session(self.chatbot_engine) as chatbot_session:
-            location_group_themes = master_session.query(LocationGroupTheme).all()
-            
-            for lgt in location_group_themes:
-                chatbot_lgt = chatbot_session.query(LocationGroupTheme).filter_by(
-                    location_id=lgt.location_id,
-                    travel_group_id=lgt.travel_group_id,
-                    travel_theme_id=lgt.travel_theme_id
-                ).first()
-                
-                if not chatbot_lgt:
-                    chatbot_lgt = LocationGroupTheme(
-                        id=lgt.id,
-                        location_id=lgt.location_id,
-                        travel_group_id=lgt.travel_group_id,
-                        travel_theme_id=lgt.travel_theme_id,
-                        rating=lgt.rating
-                    )
-                    chatbot_session.add(chatbot_lgt)
-                else:
-                    chatbot_lgt.rating = lgt.rating
-            
-            chatbot_session.commit()
-            
+        self.sync_table(LocationGroupTheme, ['id', 'location_id', 'travel_group_id', 'travel_theme_id', 'rating'])
+
     def sync_activities(self):
-        with Session(self.master_engine) as master_session, Session(self.chatbot_engine) as chatbot_session:
+        with Session(self.master_engine) as master_session:
             for Activity in [MustTravelActivityMaster, RecommendedActivityMaster]:
-                activities = (
+                ActivityNew = MustTravelActivity if Activity == MustTravelActivityMaster else RecommendedActivity
+                self.sync_embedded_table(
+                    ActivityNew,
                     master_session.query(
                         Activity,
                         Destination.name.label('destination_name')
                     )
-                    .join(Destination, Activity.destination_id == Destination.id)
-                    .all()
+                    .join(Destination, Activity.destination_id == Destination.id),
+                    to_row=lambda record: {
+                        'id': record[0].id,
+                        'name': record[0].name,
+                        'code': record[0].code,
+                        'description': record[0].description,
+                        'destination_id': record[0].destination_id,
+                        'activity_image_url': record[0].activity_image_url,
+                        'activity_duration': record[0].activity_duration,
+                    },
+                    to_text=lambda record: f"{record[0].name}, {record[0].description} in {record[1]}",
+                    hash_values=lambda record: (
+                        record[0].code,
+                        record[0].destination_id,
+                        record[0].activity_image_url,
+                        record[0].activity_duration,
+                    ),
                 )
-                
-                for act, destination_name in activities:
-                    combined_text = f"{act.name}, {act.description} in {destination_name}"
-                    embedding = self.get_embedding(combined_text)
-                    
-                    ActivityNew = MustTravelActivity if Activity == MustTravelActivityMaster else RecommendedActivity
-                    chatbot_act = chatbot_session.query(ActivityNew).filter_by(id=act.id).first()
-                    if not chatbot_act:
-                        chatbot_act = ActivityNew(
-                            id=act.id,
-                            name=act.name,
-                            code=act.code,
-                            description=act.description,
-                            destination_id=act.destination_id,
-                            embedding=embedding,
-                            activity_image_url=act.activity_image_url,
-                            activity_duration=act.activity_duration
-                        )
-                        chatbot_session.add(chatbot_act)
-                    else:
-                        chatbot_act.embedding = embedding
-                
-                chatbot_session.commit()
-   
+
     def sync_must_activity_group_themes(self):
-        with Session(self.master_engine) as master_session, Session(self.chatbot_engine) as chatbot_session:
-            must_activity_group_themes = master_session.query(MustActivityGroupTheme).all()
-            
-            for magt in must_activity_group_themes:
-                chatbot_magt = chatbot_session.query(MustActivityGroupTheme).filter_by(
-                    must_travel_activity_id=magt.must_travel_activity_id,
-                    travel_group_id=magt.travel_group_id,
-                    travel_theme_id=magt.travel_theme_id
-                ).first()
-                
-                if not chatbot_magt:
-                    chatbot_magt = MustActivityGroupTheme(
-                        id=magt.id,
-                        must_travel_activity_id=magt.must_travel_activity_id,
-                        travel_group_id=magt.travel_group_id,
-                        travel_theme_id=magt.travel_theme_id,
-                        rating=magt.rating,
-                    )
-                    chatbot_session.add(chatbot_magt)
-                else:
-                    chatbot_magt.rating = magt.rating
-            
-            chatbot_session.commit()
+        self.sync_table(MustActivityGroupTheme, ['id', 'must_travel_activity_id', 'travel_group_id', 'travel_theme_id', 'rating'])
 
     def sync_recommend_activity_group_themes(self):
-        with Session(self.master_engine) as master_session, Session(self.chatbot_engine) as chatbot_session:
-            recommend_activity_group_themes = master_session.query(RecommendActivityGroupTheme).all()
-            
-            for ragt in recommend_activity_group_themes:
-                chatbot_ragt = chatbot_session.query(RecommendActivityGroupTheme).filter_by(
-                    recommend_activity_id=ragt.recommend_activity_id,
-                    travel_group_id=ragt.travel_group_id,
-                    travel_theme_id=ragt.travel_theme_id
-                ).first()
-                
-                if not chatbot_ragt:
-                    chatbot_ragt = RecommendActivityGroupTheme(
-                        id=ragt.id,
-                        recommend_activity_id=ragt.recommend_activity_id,
-                        travel_group_id=ragt.travel_group_id,
-                        travel_theme_id=ragt.travel_theme_id,
-                        rating=ragt.rating
-                    )
-                    chatbot_session.add(chatbot_ragt)
-                else:
-                    chatbot_ragt.rating = ragt.rating
-            
-            chatbot_session.commit()
+        self.sync_table(RecommendActivityGroupTheme, ['id', 'recommend_activity_id', 'travel_group_id', 'travel_theme_id', 'rating'])
 
     def sync_hotels(self):
-        with Session(self.master_engine) as master_session, Session(self.chatbot_engine) as chatbot_session:
-            hotels = (
+        with Session(self.master_engine) as master_session:
+            self.sync_embedded_table(
+                Hotel,
                 master_session.query(
                     HotelMaster,
                     Location.name.label('location_name'),
                     Destination.name.label('destination_name')
                 )
                 .join(Location, Hotel.location_id == Location.id)
-                .join(Destination, Location.destination_id == Destination.id)
-                .all()
+                .join(Destination, Location.destination_id == Destination.id),
+                to_row=lambda record: {
+                    'id': record[0].id,
+                    'name': record[0].name,
+                    'description': record[0].description,
+                    'location': record[0].location,
+                    'location_id': record[0].location_id,
+                    'star': record[0].star,
+                    'rating': record[0].rating,
+                },
+                to_text=lambda record: (
+                    f"{record[0].name}, {record[0].description} in {record[1]}, {record[2]}. "
+                    f"{record[0].star} star hotel with rating {record[0].rating}"
+                ),
+                hash_values=lambda record: (record[0].location, record[0].location_id),
             )
-            
-            for hotel, location_name, destination_name in hotels:
-                combined_text = f"{hotel.name}, {hotel.description} in {location_name}, {destination_name}. {hotel.star} star hotel with rating {hotel.rating}"
-                embedding = self.get_embedding(combined_text)
-                
-                chatbot_hotel = chatbot_session.query(Hotel).filter_by(id=hotel.id).first()
-                if not chatbot_hotel:
-                    chatbot_hotel = Hotel(
-                        id=hotel.id,
-                        name=hotel.name,
-                        description=hotel.description,
-                        location=hotel.location,
-                        location_id=hotel.location_id,
-                        star=hotel.star,
-                        rating=hotel.rating,
-                        embedding=embedding
-                    )
-                    chatbot_session.add(chatbot_hotel)
-                else:
-                    chatbot_hotel.embedding = embedding
-            
+
+    def synced_hashes(self, chatbot_session, model) -> Dict[int, str]:
+        """Content hash per chatbot row id, rows missing from the table are left out so they get synced"""
+        table = model.__tablename__
+        hashes = dict(
+            chatbot_session.query(SyncRowHash.row_id, SyncRowHash.content_hash)
+            .filter(SyncRowHash.table_name == table)
+            .all()
+        )
+        present = {row_id for (row_id,) in chatbot_session.query(model.id).all()}
+        return {row_id: row_hash for row_id, row_hash in hashes.items() if row_id in present}
+
+    def record_watermark(self, chatbot_session, model, hashes: List[str], changed: int, deleted: int = 0):
+        chatbot_session.merge(SyncWatermark(
+            table_name=model.__tablename__,
+            content_hash=content_hash(*sorted(hashes)),
+            row_count=len(hashes),
+            changed_count=changed,
+            deleted_count=deleted,
+            synced_at=datetime.now(),
+        ))
+
+    def delete_removed_rows(self):
+        """Delete chatbot rows whose master row no longer exists, dependent tables first"""
+        with Session(self.master_engine) as master_session, Session(self.chatbot_engine) as chatbot_session:
+            for model in DELETE_ORDER:
+                master_ids = {row_id for (row_id,) in master_session.query(model.id).all()}
+                removed = [
+                    row_id for (row_id,) in chatbot_session.query(model.id).all()
+                    if row_id not in master_ids
+                ]
+                if not removed:
+                    continue
+
+                table = model.__tablename__
+                chatbot_session.query(model).filter(model.id.in_(removed)).delete(synchronize_session=False)
+                chatbot_session.query(SyncRowHash).filter(
+                    SyncRowHash.table_name == table, SyncRowHash.row_id.in_(removed)
+                ).delete(synchronize_session=False)
+                watermark = chatbot_session.get(SyncWatermark, table)
+                if watermark:
+                    watermark.deleted_count = len(removed)
+                logger.info(f"{table}: deleted {len(removed)} rows removed from master")
+
             chatbot_session.commit()
 
+    def promote_destination_fallbacks(self):
+        """
+        Promote staged LLM suggestions so the tools serve them from the db, and drop the ones
+        whose destination has been added to the catalog since (the real data wins).
+        """
+        with Session(self.chatbot_engine) as chatbot_session:
+            catalog_destinations = {name.lower() for (name,) in chatbot_session.query(Destination.name).all()}
+            dropped = 0
+            for fallback in chatbot_session.query(DestinationFallback).all():
+                if fallback.destination in catalog_destinations:
+                    chatbot_session.delete(fallback)
+                    dropped += 1
 
-def run_sync():
-    try:
-        logger.info(f"Starting database sync at {datetime.now()}")
-        sync = DatabaseSync()
+            promoted = chatbot_session.query(DestinationFallback).filter(
+                DestinationFallback.promoted_at.is_(None)
+            ).update({DestinationFallback.promoted_at: datetime.now()}, synchronize_session=False)
+            chatbot_session.commit()
+            logger.info(f"Destination fallbacks: promoted {promoted}, dropped {dropped} now in the catalog")
 
-        sync.initialize_chatbot_db()
-        
-        sync.sync_regions()
-        logger.info("Regions synced successfully")
+    def export_vector_indexes(self, directory: str = VECTOR_INDEX_DIR):
+        """Write the hotel and activity embeddings as memory mappable indexes for the tools"""
+        with self.chatbot_engine.connect() as connection:
+            hotels = connection.execute(text("""
+                SELECT h.id, h.name, h.star, l.id AS location_id, l.name AS location_name,
+                       d.id AS destination_id, d.name AS destination_name, h.embedding
+                FROM hotel h
+                JOIN location l ON h.location_id = l.id
+                JOIN destination d ON l.destination_id = d.id
+                WHERE h.embedding IS NOT NULL
+            """)).mappings().all()
+            activities = connection.execute(text("""
+                SELECT a.id, a.name, d.id AS destination_id, d.name AS destination_name, a.embedding
+                FROM must_travel_activity a
+                JOIN destination d ON a.destination_id = d.id
+                WHERE a.embedding IS NOT NULL
+            """)).mappings().all()
 
-        sync.sync_pairs()
-        logger.info("Pairs synced successfully")
-        
-        sync.sync_destinations()
-        logger.info("Destinations synced successfully")
-        
-        sync.sync_locations()
-        logger.info("Locations synced successfully")
+        VectorIndex.build([dict(row) for row in hotels], metric='ip').save(directory, 'hotels')
+        VectorIndex.build([dict(row) for row in activities], metric='cosine').save(directory, 'must_travel_activities')
+        logger.info(f"Exported vector indexes for {len(hotels)} hotels and {len(activities)} activities to {directory}")
 
-        sync.sync_travel_groups()  
-        logger.info("Travel groups synced successfully")
+    def explain_vector_search(self) -> bool:
+        """
+        EXPLAIN the nearest neighbour queries against the chatbot db and report whether the
+        planner uses the HNSW indexes. On very small tables a sequential scan is cheaper and
+        will be chosen, run this against a realistically sized catalog.
 
-        sync.sync_travel_themes()
-        logger.info("Travel themes synced successfully")
+        The filtered hotel and activity searches are also run once through the index (with the
+        iterative scan settings the tools use) and once as an exact sequential scan: fewer
+        results through the index means the filters are losing rows, see tools/vector_queries.py.
+        """
+        def index_names(plan):
+            names = [plan['Index Name']] if 'Index Name' in plan else []
+            for child in plan.get('Plans', []):
+                names += index_names(child)
+            return names
 
-        sync.sync_location_group_themes()
-        logger.info("Location group themes synced successfully")
-        
-        sync.sync_activities()
-        logger.info("Activities synced successfully")
+        def explain(connection, sql, params):
+            plan = connection.exec_driver_sql("EXPLAIN (FORMAT JSON) " + sql, params).scalar()
+            plan = plan if isinstance(plan, list) else json.loads(plan)
+            return index_names(plan[0]['Plan'])
 
-        
+        def filtered_search(name, sql, params):
+            # one transaction per run, the SET LOCAL settings end with it
+            with self.chatbot_engine.connect() as connection:
+                for statement in vector_search_settings():
+                    connection.exec_driver_sql(statement)
+                indexes = explain(connection, sql, params)
+                approximate = len(connection.exec_driver_sql(sql, params).fetchall())
+            with self.chatbot_engine.connect() as connection:
+                connection.exec_driver_sql("SET LOCAL enable_indexscan = off")
+                connection.exec_driver_sql("SET LOCAL enable_bitmapscan = off")
+                exact = len(connection.exec_driver_sql(sql, params).fetchall())
 
-        sync.sync_must_activity_group_themes()
-        logger.info("Must activity group themes synced successfully")
+            logger.info(f"{name} search uses indexes: {indexes}, {approximate} results ({exact} with a sequential scan)")
+            if approximate < exact:
+                logger.warning(f"{name} search loses results through the index, check VECTOR_SEARCH_ITERATIVE_SCAN and VECTOR_SEARCH_EF_SEARCH")
+            return approximate >= exact
 
-        sync.sync_recommend_activity_group_themes()
-        logger.info("Recommend activity group themes synced successfully")
-        
-        sync.sync_hotels()
-        logger.info("Hotels synced successfully")
+        all_used = True
+        with self.chatbot_engine.connect() as connection:
+            for table, index_name, operator_class in VECTOR_INDEXES:
+                embedding = connection.execute(text(
+                    f"SELECT embedding::text FROM {table} WHERE embedding IS NOT NULL LIMIT 1"
+                )).scalar()
+                if embedding is None:
+                    logger.warning(f"{table}: no embeddings, skipped")
+                    continue
+                operator = '<#>' if operator_class == 'vector_ip_ops' else '<=>'
+                used = index_name in explain(
+                    connection,
+                    f"SELECT id FROM {table} ORDER BY embedding {operator} %(embedding)s::vector LIMIT 5",
+                    {'embedding': embedding},
+                )
+                all_used = all_used and used
+                logger.info(f"{table}: nearest neighbour query {'uses' if used else 'does NOT use'} {index_name}")
+
+            hotel_sample = connection.execute(text("""
+                SELECT h.embedding::text, h.star, d.name FROM hotel h
+                JOIN location l ON h.location_id = l.id
+                JOIN destination d ON l.destination_id = d.id
+                WHERE h.embedding IS NOT NULL LIMIT 1
+            """)).first()
+            activity_sample = connection.execute(text(
+                "SELECT embedding::text, destination_id FROM must_travel_activity WHERE embedding IS NOT NULL LIMIT 1"
+            )).first()
+
+        if hotel_sample:
+            all_used = filtered_search('get_hotels', HOTEL_SEARCH_SQL, {
+                'embedding': hotel_sample[0], 'star': hotel_sample[1], 'destination': f"%{hotel_sample[2]}%",
+                'candidates': VECTOR_SEARCH_CANDIDATES, 'k': 5,
+            }) and all_used
+        if activity_sample:
+            all_used = filtered_search('get_activities_by_activity_name', MUST_ACTIVITY_SEARCH_SQL, {
+                'embedding': activity_sample[0], 'destination_id': activity_sample[1],
+                'candidates': VECTOR_SEARCH_CANDIDATES, 'k': 5,
+            }) and all_used
+
+        return all_used
+
+def build_sync_dag(sync: DatabaseSync, max_workers: int) -> DagScheduler:
+    """Table syncs with the tables they reference as dependencies"""
+    dag = DagScheduler(max_workers=max_workers)
+    dag.add("regions", sync.sync_regions)
+    dag.add("pairs", sync.sync_pairs)
+    dag.add("travel_groups", sync.sync_travel_groups)
+    dag.add("travel_themes", sync.sync_travel_themes)
+    dag.add("destinations", sync.sync_destinations, ["regions", "pairs"])
+    dag.add("locations", sync.sync_locations, ["destinations"])
+    dag.add("location_group_themes", sync.sync_location_group_themes, ["locations", "travel_groups", "travel_themes"])
+    dag.add("activities", sync.sync_activities, ["destinations"])
+    dag.add("must_activity_group_themes", sync.sync_must_activity_group_themes, ["activities", "travel_groups", "travel_themes"])
+    dag.add("recommend_activity_group_themes", sync.sync_recommend_activity_group_themes, ["activities", "travel_groups", "travel_themes"])
+    dag.add("hotels", sync.sync_hotels, ["locations"])
+
+    table_syncs = list(dag.nodes)
+    dag.add("delete_removed_rows", sync.delete_removed_rows, table_syncs)
+    dag.add("export_vector_indexes", sync.export_vector_indexes, ["delete_removed_rows"])
+    dag.add("promote_destination_fallbacks", sync.promote_destination_fallbacks, ["delete_removed_rows"])
+    return dag
+
+
+def run_sync(max_workers: int = None):
+    try:
+        logger.info(f"Starting database sync at {datetime.now()}")
+        sync = DatabaseSync()
+
+        sync.initialize_chatbot_db()
+
+        dag = build_sync_dag(sync, max_workers or int(os.getenv('SYNC_MAX_WORKERS', 4)))
+        dag.run()
+        logger.info("Sync summary\n" + dag.summary())
+
+        if dag.failed:
+            raise RuntimeError(f"Sync did not complete for: {', '.join(dag.failed)}")
+
+        # precomputed itineraries were built from the previous catalog
+        version = bump_catalog_version()
+        logger.info(f"Catalog version bumped to {version}")
 
         logger.info(f"Database sync completed at {datetime.now()}")
         
@@ -375,4 +507,11 @@ def run_sync():
         raise
 
 if __name__ == "__main__":
-    run_sync()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Sync the master db into the chatbot db")
+    parser.add_argument("--explain", action="store_true", help="only check that vector searches use the HNSW indexes without losing results")
+    parser.add_argument("--workers", type=int, default=None, help="table syncs run concurrently (default SYNC_MAX_WORKERS or 4)")
+    args = parser.parse_args()
+
+    if args.explain:
+        sys.exit(0 if DatabaseSync().explain_vector_search() else 1)
+    run_sync(args.workers)
\ No newline at end of file
@@ -1,12 +1,13 @@
 from sqlalchemy import (
-    ARRAY,
     Column,
+    DateTime,
     ForeignKey,
     Integer,
     String,
     Text,
     Float,
 )
+from sqlalchemy.types import UserDefinedType
 
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
@@ -14,6 +15,44 @@ from sqlalchemy.orm import Session
 
 Base = declarative_base()
 
+# text-embedding-ada-002
+EMBEDDING_DIMENSIONS = 1536
+
+# HNSW index per embedding column, the operator class matches the operator the tools query with
+# (<#> inner product, <=> cosine distance)
+VECTOR_INDEXES = [
+    ("hotel", "hotel_embedding_hnsw_idx", "vector_ip_ops"),
+    ("travel_group", "travel_group_embedding_hnsw_idx", "vector_ip_ops"),
+    ("travel_theme", "travel_theme_embedding_hnsw_idx", "vector_ip_ops"),
+    ("must_travel_activity", "must_travel_activity_embedding_hnsw_idx", "vector_cosine_ops"),
+    ("recommended_activity", "recommended_activity_embedding_hnsw_idx", "vector_cosine_ops"),
+]
+
+
+class Vector(UserDefinedType):
+    """pgvector column, values are lists of floats"""
+    cache_ok = True
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def get_col_spec(self, **kw):
+        return f"VECTOR({self.dimensions})"
+
+    def bind_processor(self, dialect):
+        def process(value):
+            if value is None or isinstance(value, str):
+                return value
+            return "[" + ",".join(str(float(x)) for x in value) + "]"
+        return process
+
+    def result_processor(self, dialect, coltype):
+        def process(value):
+            if value is None or not isinstance(value, str):
+                return value
+            return [float(x) for x in value.strip("[]").split(",")]
+        return process
+
 class Region(Base):
     __tablename__ = "region"
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -65,7 +104,7 @@ class TravelGroup(Base):
     name = Column(String(255), nullable=False)
     code = Column(String(50), nullable=False)
     description = Column(Text, nullable=True)
-    embedding = Column(ARRAY(Float), nullable=True)
+    embedding = Column(Vector(EMBEDDING_DIMENSIONS), nullable=True)
 
 
 
@@ -84,7 +123,7 @@ class TravelTheme(Base):
     name = Column(String(255), nullable=False)
     code = Column(String(50), nullable=False)
     description = Column(Text, nullable=True)
-    embedding = Column(ARRAY(Float), nullable=True)
+    embedding = Column(Vector(EMBEDDING_DIMENSIONS), nullable=True)
 
 
 class LocationGroupTheme(Base):
@@ -116,7 +155,7 @@ class Hotel(Base):
     location_id = Column(Integer, ForeignKey("location.id"), nullable=False)
     star = Column(Integer, nullable=False)
     rating = Column(Float, nullable=False)
-    embedding = Column(ARRAY(Float), nullable=True)
+    embedding = Column(Vector(EMBEDDING_DIMENSIONS), nullable=True)
 
 class MustTravelActivityMaster(Base):
     __tablename__ = "must_travel_activity"
@@ -137,7 +176,7 @@ class MustTravelActivity(Base):
     code = Column(String(50), nullable=False)
     description = Column(Text, nullable=True)
     destination_id = Column(Integer, ForeignKey("destination.id"), nullable=False)
-    embedding = Column(ARRAY(Float), nullable=True)
+    embedding = Column(Vector(EMBEDDING_DIMENSIONS), nullable=True)
     activity_image_url = Column(String(255), nullable=True)
     activity_duration = Column(Float, nullable=True)
 
@@ -160,7 +199,7 @@ class RecommendedActivity(Base):
     code = Column(String(50), nullable=False)
     description = Column(Text, nullable=True)
     destination_id = Column(Integer, ForeignKey("destination.id"), nullable=False)
-    embedding = Column(ARRAY(Float), nullable=True)
+    embedding = Column(Vector(EMBEDDING_DIMENSIONS), nullable=True)
     activity_image_url = Column(String(255), nullable=True)
     activity_duration = Column(Float, nullable=True)
 
@@ -184,4 +223,36 @@ class RecommendActivityGroupTheme(Base):
     )
     travel_group_id = Column(Integer, ForeignKey("travel_group.id"), nullable=False)
     travel_theme_id = Column(Integer, ForeignKey("travel_theme.id"), nullable=False)
-    rating = Column(Float, nullable=False)
\ No newline at end of file
+    rating = Column(Float, nullable=False)
+
+
+class SyncRowHash(Base):
+    """Hash of the master content a chatbot row was last synced and embedded from"""
+    __tablename__ = "sync_row_hash"
+    table_name = Column(String(100), primary_key=True)
+    row_id = Column(Integer, primary_key=True)
+    content_hash = Column(String(64), nullable=False)
+
+
+class SyncWatermark(Base):
+    """Outcome of the last sync of a table"""
+    __tablename__ = "sync_watermark"
+    table_name = Column(String(100), primary_key=True)
+    content_hash = Column(String(64), nullable=True)
+    row_count = Column(Integer, nullable=False, default=0)
+    changed_count = Column(Integer, nullable=False, default=0)
+    deleted_count = Column(Integer, nullable=False, default=0)
+    synced_at = Column(DateTime, nullable=True)
+
+
+class DestinationFallback(Base):
+    """LLM suggestions for a destination missing from the catalog, served once data-pipeline.py promotes them"""
+    __tablename__ = "destination_fallback"
+    kind = Column(String(20), primary_key=True)  # hotels or activities
+    destination = Column(String(255), primary_key=True)
+    group_type = Column(String(100), primary_key=True)
+    travel_theme = Column(String(100), primary_key=True)
+    number_of_days = Column(Float, primary_key=True)
+    result = Column(Text, nullable=False)  # json list, as returned by the tools
+    created_at = Column(DateTime, nullable=False)
+    promoted_at = Column(DateTime, nullable=True)
@@ -1,14 +1,22 @@
 from agents.base_itinerary_agent import BaseItineraryAgent
 from agents.itinerary_editor_agent import ItineraryEditorAgent
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 import json
 from flask_cors import CORS
 from logger import logger
+from Azent.Azent import parse_cursor
+from Azent.streaming import SSE_HEADERS
+from agents.chat_stream import stream_chat
 from tools.redis_cache import RedisCache
+from tools.thread_store import ThreadStore
+from tools.catalog_snapshot import catalog_snapshots
 
 app = Flask(__name__)
 CORS(app)
 redis_cache = RedisCache()
+thread_store = ThreadStore(redis_cache.binary_client)
+# warm the catalog snapshot so the first requests don't query the db for lookups
+catalog_snapshots.current()
 
 def chat(chat_request):
     """
@@ -24,6 +32,7 @@ def chat(chat_request):
         session_id = chat_request['session_id']
         itinerary_id = chat_request.get('itinerary_id', None)
         intent = chat_request.get('intent', None)
+        cursor = chat_request.get('cursor', None)
 
         if not intent:
             logger.warning("Missing intent in chat request.")
@@ -32,12 +41,14 @@ def chat(chat_request):
             })
 
         thread = []
+        message_count = None
         logger.info(f"Intent detected: {intent}")
 
         if intent == 'base_itinerary':
             logger.info("Calling BaseItineraryAgent.")
             manager_agent = BaseItineraryAgent()
-            thread = manager_agent.generate_response(session_id, message)
+            thread = manager_agent.generate_response(session_id, message, cursor)
+            message_count = manager_agent.message_count
 
         elif intent == 'edit_itinerary':
             if itinerary_id is None:
@@ -45,13 +56,17 @@ def chat(chat_request):
                 raise Exception("Missing itinerary id in chat request.")
             logger.info("Calling ItineraryEditorAgent.")
             itinerary_editor_agent = ItineraryEditorAgent(itinerary_id=itinerary_id)
-            thread = itinerary_editor_agent.generate_response(session_id, message)
+            thread = itinerary_editor_agent.generate_response(session_id, message, cursor)
+            message_count = itinerary_editor_agent.message_count
         
 
         final_response = {
             'session_id': session_id,
             'message': thread
         }
+        if message_count is not None:
+            # clients send this back as `cursor` to only receive the messages of the next turn
+            final_response['cursor'] = message_count
 
         logger.info("Response generated successfully.")
         return {
@@ -101,6 +116,7 @@ def handle_chat():
         msg_thread = body.get('msgThread')
         intent = body.get('intent')
         itinerary_id = body.get('itinerary_id', None)
+        cursor = body.get('cursor', None)
         
         if not session_id or not msg_thread:
             logger.warning("Missing required fields: sessionID or msgThread.")
@@ -108,11 +124,18 @@ def handle_chat():
                 'error': 'Missing required fields: sessionID and msgthread'
             }), 400
             
+        try:
+            cursor = parse_cursor(cursor)
+        except ValueError as e:
+            logger.warning(f"Invalid cursor in chat request: {cursor!r}")
+            return jsonify({'error': str(e)}), 400
+
         chat_request = {
             'message': msg_thread,
             'session_id': session_id,
             'intent': intent,
-            'itinerary_id': itinerary_id
+            'itinerary_id': itinerary_id,
+            'cursor': cursor
         }
         
         result = chat(chat_request)
@@ -157,6 +180,44 @@ def handle_chat():
         }), 500
 
 
+@app.route('/chat-stream', methods=['POST', 'OPTIONS'])
+def handle_chat_stream():
+    """
+    Streaming variant of /chat, responds with Server-Sent Events
+    """
+    if request.method == 'OPTIONS':
+        return '', 204
+
+    if not request.is_json:
+        logger.warning("Request is not in JSON format.")
+        return jsonify({
+            'error': 'Request must be JSON'
+        }), 400
+
+    body = request.get_json()
+    session_id = body.get('sessionID')
+    msg_thread = body.get('msgThread')
+
+    if not session_id or not msg_thread:
+        logger.warning("Missing required fields: sessionID or msgThread.")
+        return jsonify({
+            'error': 'Missing required fields: sessionID and msgthread'
+        }), 400
+
+    chat_request = {
+        'message': msg_thread,
+        'session_id': session_id,
+        'intent': body.get('intent'),
+        'itinerary_id': body.get('itinerary_id', None)
+    }
+
+    return Response(
+        stream_with_context(stream_chat(chat_request)),
+        mimetype='text/event-stream',
+        headers=SSE_HEADERS
+    )
+
+
 @app.route('/chat-history', methods=['GET'])
 def get_chat_history():
     
@@ -166,15 +227,12 @@ def get_chat_history():
         if not session_id:
             return jsonify({'error': 'sessionID is required'}), 400
 
-        history = redis_cache.get('conversation:' + session_id)
-
-        if history is None:
-            return jsonify({'session_id': session_id, 'chat_history': []}), 200
+        history = thread_store.conversation(session_id)
 
         # remove system_prompt from history
         history = [msg for msg in history if msg['role'] != 'system']
 
-        return jsonify({'session_id': session_id, 'chat_history': history}), 200
+        return jsonify({'session_id': session_id, 'chat_history': history, 'cursor': len(history)}), 200
     except Exception as e:
         logger.error(f"Error getting chat history: {str(e)}", exc_info=True)
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
@@ -0,0 +1,92 @@
+import argparse
+import json
+import logging
+from datetime import datetime
+from dotenv import load_dotenv
+from tools.itinerary_catalog import ItineraryCatalog, normalize_params
+from tools.itinerary_tool import ItineraryTool
+
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+PARAM_KEYS = ['destination', 'group_type', 'travel_theme', 'hotel_star', 'number_of_days']
+
+
+def load_combinations(combinations_file: str) -> list:
+    """
+    Parameter combinations of a json file, normalized like the online lookups so they are
+    stored under the keys requests read. Invalid entries are skipped.
+    """
+    with open(combinations_file) as file:
+        entries = json.load(file)
+
+    combinations = []
+    for entry in entries:
+        missing = [key for key in PARAM_KEYS if not isinstance(entry, dict) or key not in entry]
+        if missing:
+            logger.warning(f"Skipping {entry}: missing {', '.join(missing)}")
+            continue
+        try:
+            combinations.append(normalize_params(**{key: entry[key] for key in PARAM_KEYS}))
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Skipping {entry}: {str(e)}")
+    return combinations
+
+
+def precompute(top_n: int, combinations_file: str = None):
+    """
+    Generate and store canonical base itineraries for the most requested parameter combinations.
+    The online tool serves copies of them and falls back to live generation on a miss.
+    """
+    catalog = ItineraryCatalog()
+    # entries are stored under the version they were built from, a catalog sync that
+    # happens while this job runs invalidates them instead of mixing old and new data
+    version = catalog.version()
+    tool = ItineraryTool()
+
+    combinations = catalog.top_combinations(top_n)
+    if combinations_file:
+        combinations += load_combinations(combinations_file)
+    # a file entry may repeat one of the most requested combinations
+    combinations = list({json.dumps(params, sort_keys=True): params for params in combinations}.values())
+
+    stored = 0
+    for params in combinations:
+        try:
+            def build():
+                package = tool.build_base_itinerary(
+                    params['destination'],
+                    params['group_type'],
+                    params['travel_theme'],
+                    params['hotel_star'],
+                    params['number_of_days'],
+                    save=False,
+                )
+                if not isinstance(package, dict):
+                    logger.warning(f"Skipping {params}: {package}")
+                    return None
+                return package
+
+            # an entry already built for this version (or being built by a request) is reused
+            if catalog.get_or_build(params, build, version=version) is None:
+                continue
+            stored += 1
+            logger.info(f"Precomputed itinerary for {params}")
+        except Exception as e:
+            logger.error(f"Error precomputing itinerary for {params}: {str(e)}")
+
+    logger.info(f"Stored {stored}/{len(combinations)} itineraries for catalog version {version}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--top', type=int, default=100, help='number of most requested combinations to precompute')
+    parser.add_argument('--combinations', help='json file with an extra list of parameter combinations')
+    args = parser.parse_args()
+
+    logger.info(f"Starting itinerary precompute at {datetime.now()}")
+    precompute(args.top, args.combinations)
@@ -0,0 +1,145 @@
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Node:
+    name: str
+    run: Callable[[], object]
+    depends_on: List[str] = field(default_factory=list)
+    status: str = 'pending'  # pending, running, done, failed, skipped
+    started: float = None
+    finished: float = None
+    error: Exception = None
+
+    @property
+    def duration(self) -> float:
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+
+class DagScheduler:
+    """
+    Runs callables as soon as their dependencies are done, independent ones concurrently.
+
+    A failing node does not stop the run: the nodes that (transitively) depend on it are
+    skipped and everything else still runs.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self.nodes: Dict[str, Node] = {}
+        self.started = None
+        self.finished = None
+
+    def add(self, name: str, run: Callable[[], object], depends_on: List[str] = None) -> None:
+        self.nodes[name] = Node(name, run, list(depends_on or []))
+
+    def validate(self) -> None:
+        for node in self.nodes.values():
+            missing = [dependency for dependency in node.depends_on if dependency not in self.nodes]
+            if missing:
+                raise ValueError(f"{node.name} depends on unknown nodes {missing}")
+
+        visiting, visited = set(), set()
+
+        def visit(name):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependency cycle through {name}")
+            visiting.add(name)
+            for dependency in self.nodes[name].depends_on:
+                visit(dependency)
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in self.nodes:
+            visit(name)
+
+    def ready(self) -> List[Node]:
+        return [
+            node for node in self.nodes.values()
+            if node.status == 'pending' and all(self.nodes[d].status == 'done' for d in node.depends_on)
+        ]
+
+    def skip_dependents(self) -> None:
+        changed = True
+        while changed:
+            changed = False
+            for node in self.nodes.values():
+                if node.status == 'pending' and any(self.nodes[d].status in ('failed', 'skipped') for d in node.depends_on):
+                    node.status = 'skipped'
+                    logger.warning(f"Skipping {node.name}, a dependency did not complete")
+                    changed = True
+
+    def execute(self, node: Node) -> None:
+        node.started = time.perf_counter()
+        try:
+            node.run()
+        finally:
+            node.finished = time.perf_counter()
+
+    def run(self) -> Dict[str, Node]:
+        self.validate()
+        self.started = time.perf_counter()
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                for node in self.ready():
+                    node.status = 'running'
+                    logger.info(f"Starting {node.name}")
+                    running[executor.submit(self.execute, node)] = node
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    node = running.pop(future)
+                    try:
+                        future.result()
+                        node.status = 'done'
+                        logger.info(f"{node.name} done in {node.duration:.2f}s")
+                    except Exception as e:
+                        node.status = 'failed'
+                        node.error = e
+                        logger.error(f"{node.name} failed after {node.duration:.2f}s: {str(e)}", exc_info=True)
+                self.skip_dependents()
+
+        self.finished = time.perf_counter()
+        return self.nodes
+
+    def critical_path(self) -> List[Node]:
+        """Chain of nodes, each one the latest finishing dependency of the next, ending at the last node to finish"""
+        completed = [node for node in self.nodes.values() if node.finished is not None]
+        if not completed:
+            return []
+        path = [max(completed, key=lambda node: node.finished)]
+        while True:
+            dependencies = [self.nodes[d] for d in path[-1].depends_on if self.nodes[d].finished is not None]
+            if not dependencies:
+                break
+            path.append(max(dependencies, key=lambda node: node.finished))
+        return list(reversed(path))
+
+    def summary(self) -> str:
+        lines = [f"{'node':<40} {'status':<8} {'start':>8} {'duration':>9}"]
+        for node in sorted(self.nodes.values(), key=lambda node: (node.started is None, node.started or 0)):
+            start = f"{node.started - self.started:.2f}s" if node.started is not None else '-'
+            lines.append(f"{node.name:<40} {node.status:<8} {start:>8} {node.duration:>8.2f}s")
+
+        path = self.critical_path()
+        lines.append(f"total {self.finished - self.started:.2f}s")
+        lines.append("critical path: " + " -> ".join(f"{node.name} ({node.duration:.2f}s)" for node in path))
+        return "\n".join(lines)
+
+    @property
+    def failed(self) -> List[str]:
+        return [node.name for node in self.nodes.values() if node.status in ('failed', 'skipped')]
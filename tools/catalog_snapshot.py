@@ -0,0 +1,195 @@
+import os
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+from logger import logger
+from tools.db_pool import db_pool
+from tools.itinerary_catalog import CATALOG_VERSION_KEY
+from tools.redis_cache import RedisCache
+
+load_dotenv()
+
+
+@dataclass(frozen=True)
+class HotelRow:
+    id: int
+    name: str
+    description: str
+    star: int
+    rating: float
+    location_name: str
+    location_rating: float
+
+
+@dataclass(frozen=True)
+class ActivityRow:
+    title: str
+    description: str
+    rating: float
+    activity_type: str
+    image: str
+    duration: float
+
+
+class CatalogSnapshot:
+    """
+    Read-only in-memory copy of the catalog tables the tools filter and rank on.
+
+    Answers the same queries as the SQL in get_hotels_tool / get_activities_tool
+    (name lookups, hotels by destination, activities by destination) without a db round trip.
+    """
+
+    def __init__(self, version: str, tables: Dict[str, list]):
+        self.version = version
+        self.loaded_at = time.time()
+
+        self.destination_ids = {name.lower(): id_ for id_, name in tables['destination']}
+        self.travel_group_ids = {name.lower(): id_ for id_, name in tables['travel_group']}
+        self.travel_theme_ids = {name.lower(): id_ for id_, name in tables['travel_theme']}
+        locations = {id_: (name, destination_id) for id_, name, destination_id in tables['location']}
+
+        location_ratings = defaultdict(list)
+        for location_id, group_id, theme_id, rating in tables['location_group_theme']:
+            location_ratings[location_id].append((group_id, theme_id, rating))
+
+        # one row per (hotel, location_group_theme) like the sql join
+        self.hotel_rows = defaultdict(list)
+        for id_, name, description, star, rating, location_id in tables['hotel']:
+            if location_id not in locations:
+                continue
+            location_name, destination_id = locations[location_id]
+            for group_id, theme_id, location_rating in location_ratings[location_id]:
+                self.hotel_rows[destination_id].append((
+                    group_id,
+                    theme_id,
+                    HotelRow(id_, name, description, star, rating, location_name, location_rating),
+                ))
+
+        self.activity_rows = defaultdict(list)
+        for table, group_table, activity_type in [
+            ('must_travel_activity', 'must_activity_group_theme', 'must'),
+            ('recommended_activity', 'recommend_activity_group_theme', 'recommended'),
+        ]:
+            ratings = defaultdict(list)
+            for activity_id, group_id, theme_id, rating in tables[group_table]:
+                ratings[activity_id].append((group_id, theme_id, rating))
+            rows = []
+            for id_, name, description, destination_id, image, duration in tables[table]:
+                for group_id, theme_id, rating in ratings[id_]:
+                    rows.append((destination_id, group_id, theme_id, ActivityRow(
+                        name, description, rating, activity_type, image, duration,
+                    )))
+            self.activity_rows[activity_type] = rows
+
+    def destination_id(self, name: str) -> Optional[int]:
+        return self.destination_ids.get(str(name or '').lower())
+
+    def travel_group_id(self, name: str) -> Optional[int]:
+        return self.travel_group_ids.get(str(name or '').lower()) if name else None
+
+    def travel_theme_id(self, name: str) -> Optional[int]:
+        return self.travel_theme_ids.get(str(name or '').lower()) if name else None
+
+    def hotels(self, destination_id: int, travel_group_id=None, travel_theme_id=None, star_rating=None) -> List[HotelRow]:
+        """Matching hotel rows ordered by location rating then hotel rating"""
+        rows = [
+            row for group_id, theme_id, row in self.hotel_rows.get(destination_id, [])
+            if (not travel_group_id or group_id == travel_group_id)
+            and (not travel_theme_id or theme_id == travel_theme_id)
+            and (not star_rating or row.star == star_rating)
+        ]
+        return sorted(rows, key=lambda row: (-(row.location_rating or 0), -(row.rating or 0)))
+
+    def distinct_hotels(self, destination_id: int, travel_group_id=None, travel_theme_id=None, star_rating=None) -> List[HotelRow]:
+        """Best row per hotel ordered by hotel id (SELECT DISTINCT ON (h.id) in get_hotels)"""
+        best = {}
+        for row in self.hotels(destination_id, travel_group_id, travel_theme_id, star_rating):
+            best.setdefault(row.id, row)
+        return [best[id_] for id_ in sorted(best)]
+
+    def activities(self, activity_type: str, destination_id: int, travel_group_id=None, travel_theme_id=None) -> List[ActivityRow]:
+        """Matching activity rows ordered by group/theme rating"""
+        rows = [
+            row for row_destination_id, group_id, theme_id, row in self.activity_rows[activity_type]
+            if row_destination_id == destination_id
+            and (not travel_group_id or group_id == travel_group_id)
+            and (not travel_theme_id or theme_id == travel_theme_id)
+        ]
+        return sorted(rows, key=lambda row: -(row.rating or 0))
+
+
+SNAPSHOT_QUERIES = {
+    'destination': "SELECT id, name FROM destination",
+    'location': "SELECT id, name, destination_id FROM location",
+    'travel_group': "SELECT id, name FROM travel_group",
+    'travel_theme': "SELECT id, name FROM travel_theme",
+    'location_group_theme': "SELECT location_id, travel_group_id, travel_theme_id, rating FROM location_group_theme",
+    'hotel': "SELECT id, name, description, star, rating, location_id FROM hotel",
+    'must_travel_activity': "SELECT id, name, description, destination_id, activity_image_url, activity_duration FROM must_travel_activity",
+    'recommended_activity': "SELECT id, name, description, destination_id, activity_image_url, activity_duration FROM recommended_activity",
+    'must_activity_group_theme': "SELECT must_travel_activity_id, travel_group_id, travel_theme_id, rating FROM must_activity_group_theme",
+    'recommend_activity_group_theme': "SELECT recommend_activity_id, travel_group_id, travel_theme_id, rating FROM recommend_activity_group_theme",
+}
+
+
+class CatalogSnapshotManager:
+    """
+    Holds the current CatalogSnapshot and swaps it atomically when the catalog version
+    in redis (bumped by data-pipeline.py) changes. The version is checked at most every
+    check_interval seconds; readers keep using the previous snapshot while a new one loads.
+    """
+
+    def __init__(self, check_interval: float = 30):
+        self.check_interval = check_interval
+        self.snapshot: Optional[CatalogSnapshot] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def catalog_version(self) -> str:
+        return RedisCache().client.get(CATALOG_VERSION_KEY) or '0'
+
+    def load(self, version: str = None) -> CatalogSnapshot:
+        version = version or self.catalog_version()
+        tables = {}
+        conn = db_pool.getconn()
+        try:
+            with conn.cursor() as cursor:
+                for table, sql in SNAPSHOT_QUERIES.items():
+                    cursor.execute(sql)
+                    tables[table] = cursor.fetchall()
+        finally:
+            db_pool.putconn(conn)
+
+        snapshot = CatalogSnapshot(version, tables)
+        self.snapshot = snapshot
+        self._checked_at = time.monotonic()
+        logger.info(f"Loaded catalog snapshot version {version}")
+        return snapshot
+
+    def current(self) -> Optional[CatalogSnapshot]:
+        """The current snapshot, None if it could not be loaded (callers then query the db)"""
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return self.snapshot
+
+        if not self._lock.acquire(blocking=self.snapshot is None):
+            # another thread is checking/refreshing
+            return self.snapshot
+        try:
+            if time.monotonic() - self._checked_at >= self.check_interval:
+                self._checked_at = time.monotonic()
+                version = self.catalog_version()
+                if self.snapshot is None or self.snapshot.version != version:
+                    self.load(version)
+        except Exception as e:
+            logger.error(f"Error refreshing catalog snapshot: {str(e)}", exc_info=True)
+        finally:
+            self._lock.release()
+        return self.snapshot
+
+
+catalog_snapshots = CatalogSnapshotManager(
+    check_interval=float(os.getenv('CATALOG_SNAPSHOT_CHECK_INTERVAL', 30))
+)
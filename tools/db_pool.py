@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+from collections import deque
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from dotenv import load_dotenv
+from logger import logger
+
+load_dotenv()
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections to the vector db shared by all tools.
+
+    Connections are opened lazily up to max_connections, run in autocommit mode with a
+    statement timeout, and are health checked when they sat idle for longer than
+    health_check_interval. Callers block (up to acquire_timeout) when the pool is saturated.
+    """
+
+    def __init__(
+            self,
+            dsn: str,
+            max_connections: int = 10,
+            statement_timeout_ms: int = 10000,
+            health_check_interval: float = 30,
+            acquire_timeout: float = 10,
+    ):
+        self.dsn = dsn
+        self.max_connections = max_connections
+        self.statement_timeout_ms = statement_timeout_ms
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._in_use = 0
+        self._stats = {
+            'acquired': 0,
+            'created': 0,
+            'discarded': 0,
+            'health_check_failures': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'timeouts': 0,
+            'peak_in_use': 0,
+        }
+
+    def connect(self):
+        conn = psycopg2.connect(self.dsn, options=f"-c statement_timeout={self.statement_timeout_ms}")
+        conn.autocommit = True
+        with self._lock:
+            self._stats['created'] += 1
+        return conn
+
+    def is_healthy(self, conn) -> bool:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        if not self._slots.acquire(blocking=False):
+            logger.warning(f"DB pool saturated ({self.max_connections} connections in use), waiting")
+            start = time.monotonic()
+            acquired = self._slots.acquire(timeout=self.acquire_timeout)
+            with self._lock:
+                self._stats['waits'] += 1
+                self._stats['wait_time'] += time.monotonic() - start
+                if not acquired:
+                    self._stats['timeouts'] += 1
+            if not acquired:
+                raise TimeoutError(f"Timed out waiting for a database connection after {self.acquire_timeout}s")
+
+        try:
+            conn = None
+            while conn is None:
+                with self._lock:
+                    idle = self._idle.pop() if self._idle else None
+                if idle is None:
+                    conn = self.connect()
+                    break
+                conn, released_at = idle
+                if conn.closed or (
+                        time.monotonic() - released_at > self.health_check_interval and not self.is_healthy(conn)
+                ):
+                    with self._lock:
+                        self._stats['health_check_failures'] += 1
+                    self.close(conn)
+                    conn = None
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+            self._stats['acquired'] += 1
+            self._stats['peak_in_use'] = max(self._stats['peak_in_use'], self._in_use)
+        return conn
+
+    def putconn(self, conn) -> None:
+        if conn is None:
+            return
+        with self._lock:
+            self._in_use -= 1
+            if not conn.closed and conn.info.transaction_status == TRANSACTION_STATUS_IDLE:
+                self._idle.append((conn, time.monotonic()))
+                conn = None
+        if conn is not None:
+            self.close(conn)
+        self._slots.release()
+
+    def close(self, conn) -> None:
+        with self._lock:
+            self._stats['discarded'] += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                'max_connections': self.max_connections,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'saturation': self._in_use / self.max_connections,
+                **self._stats,
+            }
+
+
+db_pool = ConnectionPool(
+    os.getenv("VECTOR_DB_URL"),
+    max_connections=int(os.getenv("DB_POOL_MAX_CONNECTIONS", 10)),
+    statement_timeout_ms=int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 10000)),
+    health_check_interval=float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", 30)),
+    acquire_timeout=float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", 10)),
+)
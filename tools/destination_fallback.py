@@ -0,0 +1,189 @@
+import json
+import os
+from datetime import datetime
+from typing import Callable, List, Optional
+import psycopg2
+from dotenv import load_dotenv
+from redis.exceptions import RedisError
+from Azent.SimpleAgent import SimpleAgent
+from logger import logger
+from tools.db_pool import db_pool
+from tools.redis_cache import RedisCache
+
+load_dotenv()
+
+# LLM suggestions for destinations missing from the catalog are memoized in redis and, with
+# DESTINATION_FALLBACK_STAGING=true, staged in the destination_fallback table. data-pipeline.py
+# promotes staged rows (and drops the ones whose destination has since been added to the
+# catalog), promoted rows are served straight from the db.
+FALLBACK_TTL = int(os.getenv('DESTINATION_FALLBACK_TTL', 7 * 24 * 3600))
+# how long a request waits for another worker generating the same suggestions before
+# generating them itself, well below the lock lease so a stuck generation doesn't pile up callers
+FALLBACK_WAIT = float(os.getenv('DESTINATION_FALLBACK_WAIT', 10))
+
+HOTELS_PROMPT = """You are world class trip itinerary builder,
+                                                Your task is to suggest hotels for the group_type, travel_theme and destination provided to you.
+
+                                                suggest concise but efficient hotels suggestion for a user and give user a would class experience.
+                                                return the response in given JSON format:
+                                                {{
+                                                    "hotels": [
+                                                        {{
+                                                            "title": <title>,
+                                                            "description": <description>,
+                                                            "rating": <rating>,
+                                                            "hotel_rating": <hotel_rating>,
+                                                            "location": <location>
+                                                        }}
+                                                    ]
+                                                }}
+                                                """
+
+ACTIVITIES_PROMPT = """You are world class trip itinerary builder,
+                            Your task is to suggest activities for the group_type, travel_theme and destination provided to you.
+                            Each activity should have an estimated duration (0.5 for half day, 1 for full day).
+                            Total duration of all activities should not exceed the number_of_days provided.
+                            Create concise but efficient activities suggestion for a user and give user a world class experience.
+                            Return output in given JSON format:
+                            {{
+                                "activities": [
+                                    {{
+                                         "title": <title>,
+                                        "description": <description>,
+                                        "rating": <rating>,
+                                        "activity_type": <activity_type>,
+                                        "image": <image>,
+                                        "duration":<duration>
+                                    }}
+                                ]
+                            }}
+                            """
+
+PROMOTED_SQL = """
+    SELECT result FROM destination_fallback
+    WHERE kind = %(kind)s AND destination = %(destination)s AND group_type = %(group_type)s
+      AND travel_theme = %(travel_theme)s AND number_of_days = %(number_of_days)s
+      AND promoted_at IS NOT NULL
+"""
+
+STAGE_SQL = """
+    INSERT INTO destination_fallback (kind, destination, group_type, travel_theme, number_of_days, result, created_at)
+    VALUES (%(kind)s, %(destination)s, %(group_type)s, %(travel_theme)s, %(number_of_days)s, %(result)s, %(created_at)s)
+    ON CONFLICT DO NOTHING
+"""
+
+
+def staging_enabled() -> bool:
+    return os.getenv('DESTINATION_FALLBACK_STAGING', 'false').lower() == 'true'
+
+
+def fallback_params(kind, destination, group_type, travel_theme, number_of_days=None) -> dict:
+    return {
+        'kind': kind,
+        'destination': str(destination or '').strip().lower(),
+        'group_type': str(group_type or '').strip().lower(),
+        'travel_theme': str(travel_theme or '').strip().lower(),
+        'number_of_days': float(number_of_days or 0),
+    }
+
+
+def fallback_key(params: dict) -> str:
+    return 'destination_fallback:' + json.dumps(params, sort_keys=True)
+
+
+def get_promoted(params: dict) -> Optional[list]:
+    conn = None
+    try:
+        conn = db_pool.getconn()
+        with conn.cursor() as cursor:
+            cursor.execute(PROMOTED_SQL, params)
+            row = cursor.fetchone()
+        return json.loads(row[0]) if row else None
+    except (psycopg2.Error, TimeoutError) as e:
+        logger.warning(f"Promoted destination fallback lookup failed: {str(e)}")
+        return None
+    finally:
+        db_pool.putconn(conn)
+
+
+def stage(params: dict, result: list) -> None:
+    conn = None
+    try:
+        conn = db_pool.getconn()
+        with conn.cursor() as cursor:
+            cursor.execute(STAGE_SQL, {**params, 'result': json.dumps(result), 'created_at': datetime.now()})
+    except (psycopg2.Error, TimeoutError) as e:
+        logger.warning(f"Staging destination fallback failed: {str(e)}")
+    finally:
+        db_pool.putconn(conn)
+
+
+def get_fallback(params: dict, generate: Callable[[], list]) -> list:
+    """
+    Suggestions for a destination missing from the catalog: a promoted staged row, else the
+    memoized LLM result, else generate() (run by a single worker, see RedisCache.get_or_compute).
+    generate() raises on failure so errors are not memoized.
+
+    Callers must not hold a pooled connection: waiting on another worker's generation can take
+    up to FALLBACK_WAIT, so the db is only touched briefly for the lookup and the staging insert.
+    """
+    if staging_enabled():
+        promoted = get_promoted(params)
+        if promoted is not None:
+            logger.info(f"Serving promoted destination fallback for {params}")
+            return promoted
+
+    def compute():
+        result = generate()
+        if staging_enabled():
+            stage(params, result)
+        return result
+
+    try:
+        return RedisCache().get_or_compute(
+            fallback_key(params), compute, expire_time=FALLBACK_TTL, wait_timeout=FALLBACK_WAIT
+        )
+    except RedisError as e:
+        logger.warning(f"Destination fallback cache unavailable, generating: {str(e)}")
+        return generate()
+
+
+def suggest_hotels(destination, group_type, travel_theme) -> List[dict]:
+    def generate():
+        trip_agent = SimpleAgent(
+            base_url=os.getenv("LLM_API_URL"),
+            api_key=os.getenv("LLM_API_KEY"),
+            system_prompt=HOTELS_PROMPT,
+            output_format={"type": "json_object"}
+        )
+        response = trip_agent.execute(
+            f"""suggest hotels for a user based on this information,
+                destination: {destination.lower()},
+                group_type: {str(group_type)},
+                travel_theme: {str(travel_theme)}
+                """
+        )
+        return response['hotels']
+
+    return get_fallback(fallback_params('hotels', destination, group_type, travel_theme), generate)
+
+
+def suggest_activities(destination, group_type, travel_theme, number_of_days) -> List[dict]:
+    def generate():
+        trip_agent = SimpleAgent(
+            base_url=os.getenv("LLM_API_URL"),
+            api_key=os.getenv("LLM_API_KEY"),
+            system_prompt=ACTIVITIES_PROMPT,
+            output_format={"type": "json_object"}
+        )
+        response = trip_agent.execute(
+            f"""create activities for a user based on this information,
+            "destination": {destination.lower()},
+            "group_type": "{group_type or 'any'}",
+            "travel_theme": "{travel_theme or 'any'}",
+            "number_of_days": {number_of_days}"""
+        )
+        return response['activities']
+
+    params = fallback_params('activities', destination, group_type, travel_theme, number_of_days)
+    return get_fallback(params, generate)
@@ -0,0 +1,135 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import List
+import numpy as np
+from Azent.clients import get_llm_client
+from logger import logger
+from tools.embedding_store import embedding_store, normalize_text
+from tools.redis_cache import RedisCache
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+
+class EmbeddingCache:
+    """
+    Two tier cache for query embeddings: an in-process LRU in front of redis, warmed from
+    the on-disk embedding store (tools/embedding_store.py) before calling the API.
+
+    Entries are keyed by model and normalized text, redis stores the vector as
+    float32 bytes (6 KB for ada-002 instead of ~30 KB of JSON).
+    """
+
+    def __init__(self, max_size: int = 1024, expire_time: int = 7 * 24 * 3600, store=None, write_store: bool = False):
+        self.max_size = max_size
+        self.expire_time = expire_time
+        self.store = store
+        # off by default so arbitrary user queries don't grow the shared file
+        self.write_store = write_store
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'redis_hits': 0, 'store_hits': 0, 'misses': 0, 'errors': 0}
+
+    def key(self, text: str, model: str) -> str:
+        return f"embedding:{model}:{hashlib.sha1(text.encode('utf-8')).hexdigest()}"
+
+    def get_embedding(self, text: str, model: str = EMBEDDING_MODEL) -> List[float]:
+        # only the key is normalized, the API embeds the text as the user wrote it
+        key = self.key(normalize_text(text), model)
+
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return vector
+
+        vector = self.get_from_redis(key)
+        if vector is not None:
+            self._count('redis_hits')
+        else:
+            vector = self.get_from_store(text, model)
+            if vector is not None:
+                self._count('store_hits')
+            else:
+                self._count('misses')
+                vector = self.create_embedding(text, model)
+                self.set_in_store(text, model, vector)
+            self.set_in_redis(key, vector)
+
+        self.remember(key, vector)
+        return vector
+
+    def create_embedding(self, text: str, model: str) -> List[float]:
+        response = get_llm_client(provider='openai').embeddings.create(input=[text], model=model)
+        return response.data[0].embedding
+
+    def get_from_redis(self, key: str):
+        try:
+            data = RedisCache().binary_client.get(key)
+            return np.frombuffer(data, dtype=np.float32).tolist() if data else None
+        except Exception as e:
+            self._count('errors')
+            logger.warning(f"Embedding cache read failed: {str(e)}")
+            return None
+
+    def set_in_redis(self, key: str, vector: List[float]) -> None:
+        try:
+            RedisCache().binary_client.setex(key, self.expire_time, np.asarray(vector, dtype=np.float32).tobytes())
+        except Exception as e:
+            self._count('errors')
+            logger.warning(f"Embedding cache write failed: {str(e)}")
+
+    def get_from_store(self, text: str, model: str):
+        if self.store is None:
+            return None
+        try:
+            vector = self.store.get(text, model)
+            return vector.tolist() if vector is not None else None
+        except Exception as e:
+            self._count('errors')
+            logger.warning(f"Embedding store read failed: {str(e)}")
+            return None
+
+    def set_in_store(self, text: str, model: str, vector: List[float]) -> None:
+        if self.store is None or not self.write_store:
+            return
+        try:
+            self.store.put(text, vector, model)
+        except Exception as e:
+            self._count('errors')
+            logger.warning(f"Embedding store write failed: {str(e)}")
+
+    def remember(self, key: str, vector: List[float]) -> None:
+        with self._lock:
+            self._lru[key] = vector
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_size:
+                self._lru.popitem(last=False)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self._stats['memory_hits'] + self._stats['redis_hits'] + self._stats['store_hits']
+            lookups = hits + self._stats['misses']
+            return {
+                **self._stats,
+                'size': len(self._lru),
+                'hit_rate': hits / lookups if lookups else 0.0,
+            }
+
+
+embedding_cache = EmbeddingCache(
+    max_size=int(os.getenv('EMBEDDING_CACHE_SIZE', 1024)),
+    expire_time=int(os.getenv('EMBEDDING_CACHE_TTL', 7 * 24 * 3600)),
+    store=embedding_store,
+    write_store=os.getenv('EMBEDDING_STORE_WRITE_QUERIES', 'false').lower() == 'true',
+)
+
+
+def get_query_embedding(text: str, model: str = EMBEDDING_MODEL) -> List[float]:
+    return embedding_cache.get_embedding(text, model)
@@ -0,0 +1,148 @@
+import argparse
+import fcntl
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EMBEDDING_STORE_DIR = os.getenv('EMBEDDING_STORE_DIR', 'data/embedding_store')
+KEY_BYTES = 32
+# bumped when the key derivation changes, records keyed the old way are left in the old file
+KEY_VERSION = 2
+
+
+def normalize_text(text: str) -> str:
+    """Key normalization shared by every reader and writer of embedding caches"""
+    return ' '.join(str(text).lower().split())
+
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive lock shared by every process appending to the store"""
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class EmbeddingStore:
+    """
+    Content addressed embedding store on disk: sha256(model + normalized text) -> float32 vector.
+
+    Records (32 byte key + vector) are appended to a single file which readers memory map,
+    so every process on the host shares the same pages. Appends take a file lock and skip
+    keys already stored, so every key has exactly one record; readers pick up appended
+    records (and a replaced file, new inode) when they refresh. Texts are keyed with
+    normalize_text, the data pipeline and query lookups share entries.
+    """
+
+    def __init__(self, directory: str = EMBEDDING_STORE_DIR, dimensions: int = 1536, check_interval: float = 1.0):
+        self.directory = directory
+        self.dimensions = dimensions
+        self.check_interval = check_interval
+        self.path = os.path.join(directory, f"vectors-{dimensions}.v{KEY_VERSION}.bin")
+        self.lock_path = self.path + '.lock'
+        self.dtype = np.dtype([('key', 'u1', (KEY_BYTES,)), ('vector', '<f4', (dimensions,))])
+
+        self._lock = threading.RLock()
+        self._map = None
+        self._index: Dict[bytes, int] = {}
+        self._rows = 0
+        self._inode = None
+        self._checked_at = 0.0
+
+    @staticmethod
+    def key(text: str, model: str) -> bytes:
+        return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode('utf-8')).digest()
+
+    def refresh(self, force: bool = False) -> None:
+        """Map records appended (or a file replaced) by any process since the last refresh"""
+        with self._lock:
+            if not force and time.monotonic() - self._checked_at < self.check_interval:
+                return
+            self._checked_at = time.monotonic()
+
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                self._map, self._index, self._rows, self._inode = None, {}, 0, None
+                return
+
+            if stat.st_ino != self._inode:
+                # replaced, or first open
+                self._map, self._index, self._rows, self._inode = None, {}, 0, stat.st_ino
+
+            # a torn last record (writer crashed mid append) is ignored
+            rows = stat.st_size // self.dtype.itemsize
+            if rows <= self._rows:
+                return
+
+            self._map = np.memmap(self.path, dtype=self.dtype, mode='r', shape=(rows,))
+            keys = self._map['key'][self._rows:rows].tobytes()
+            for i in range(rows - self._rows):
+                self._index[keys[i * KEY_BYTES:(i + 1) * KEY_BYTES]] = self._rows + i
+            self._rows = rows
+
+    def get(self, text: str, model: str) -> Optional[np.ndarray]:
+        return self.get_many([text], model)[0]
+
+    def get_many(self, texts: List[str], model: str) -> List[Optional[np.ndarray]]:
+        self.refresh()
+        with self._lock:
+            rows = [self._index.get(self.key(text, model)) for text in texts]
+            return [np.array(self._map[row]['vector']) if row is not None else None for row in rows]
+
+    def put(self, text: str, vector: List[float], model: str) -> None:
+        self.put_many([text], [vector], model)
+
+    def put_many(self, texts: List[str], vectors: List[List[float]], model: str) -> int:
+        """Append the vectors of texts not stored yet, returns the number of records written"""
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock, file_lock(self.lock_path):
+            self.refresh(force=True)
+
+            new = {}
+            for text, vector in zip(texts, vectors):
+                key = self.key(text, model)
+                if key not in self._index:
+                    new[key] = vector
+            if not new:
+                return 0
+
+            records = np.zeros(len(new), dtype=self.dtype)
+            records['key'] = np.frombuffer(b''.join(new), dtype=np.uint8).reshape(len(new), KEY_BYTES)
+            records['vector'] = np.asarray(list(new.values()), dtype=np.float32)
+
+            if os.path.exists(self.path) and os.path.getsize(self.path) != self._rows * self.dtype.itemsize:
+                os.truncate(self.path, self._rows * self.dtype.itemsize)
+            with open(self.path, 'ab') as f:
+                f.write(records.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            self.refresh(force=True)
+            return len(new)
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self._index)
+
+
+embedding_store = EmbeddingStore(
+    check_interval=float(os.getenv('EMBEDDING_STORE_CHECK_INTERVAL', 1.0))
+) if os.getenv('EMBEDDING_STORE_ENABLED', 'true').lower() == 'true' else None
+
+
+if __name__ == "__main__":
+    argparse.ArgumentParser(description="Inspect the on-disk embedding store").parse_args()
+
+    store = EmbeddingStore()
+    print(f"{len(store)} embeddings in {store.path}")
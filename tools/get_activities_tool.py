@@ -1,39 +1,83 @@
-import psycopg2
-from Azent.SimpleAgent import SimpleAgent
+from tools.db_pool import db_pool
 from typing import List
 from dotenv import load_dotenv
-from openai import OpenAI
 import os
 from opik.integrations.openai import track_openai
 from opik import track
 from logger import logger
+from tools.catalog_snapshot import catalog_snapshots
+from tools.destination_fallback import suggest_activities
+from tools.embedding_cache import get_query_embedding
+from tools.vector_index import search_activities
+from tools.vector_queries import MUST_ACTIVITY_SEARCH_SQL, VECTOR_SEARCH_CANDIDATES, fetch_nearest, vector_literal
 
 
 load_dotenv()
 
 
+def get_activities_from_snapshot(group_type, travel_theme, destination):
+    """Must and recommended activity rows from the in-process catalog snapshot, None when the db has to be queried instead"""
+    snapshot = catalog_snapshots.current()
+    if snapshot is None:
+        return None
+    destination_id = snapshot.destination_id(destination)
+    if destination_id is None:
+        return None
+
+    travel_group_id = snapshot.travel_group_id(group_type)
+    travel_theme_id = snapshot.travel_theme_id(travel_theme)
+    return (
+        snapshot.activities('must', destination_id, travel_group_id, travel_theme_id)
+        + snapshot.activities('recommended', destination_id, travel_group_id, travel_theme_id)
+    )
+
+
+def get_activities_from_index(query_embedding, location):
+    """Semantic activity search on the in-process vector index, None when the db has to be queried instead"""
+    try:
+        return search_activities(query_embedding, location)
+    except Exception as e:
+        logger.error(f"Vector index search failed, querying the database: {str(e)}", exc_info=True)
+        return None
+
+
+def select_activities(activities, number_of_days):
+    """Must activities first then by rating, as many as fit in number_of_days (at most 5)"""
+    sorted_activities = sorted(
+        activities,
+        key=lambda x: (x["activity_type"] != "must", -x["rating"])
+    )
+
+    selected_activities = []
+    total_duration = 0.0
+
+    for activity in sorted_activities:
+        if total_duration + activity["duration"] <= number_of_days:
+            selected_activities.append(activity)
+            total_duration += activity["duration"]
+
+        if total_duration >= number_of_days or len(selected_activities) >= 5:
+            break
+
+    return selected_activities
+
+
 @track
 def get_activities_by_activity_name(acitivity: str, location: str) -> List[str]:
     logger.info(f"Getting activities for activity: {acitivity} in location: {location}")
+    query_embedding = get_query_embedding(f"{acitivity} in {location}")
+    activities = get_activities_from_index(query_embedding, location)
+    if activities is not None:
+        logger.info(f"Retrieved {len(activities)} activities from the vector index")
+        return activities
+
+    conn = None
     try:
-        conn = psycopg2.connect(os.getenv("VECTOR_DB_URL"))
+        conn = db_pool.getconn()
         logger.debug("Database connection established")
         cursor = conn.cursor()
 
         logger.debug(f"Processing location: {location}")
-        openai_client = OpenAI(
-            api_key=os.getenv('LLM_API_KEY'),
-            base_url=os.getenv('LLM_BASE_URL'),
-        )
-
-        logger.debug("Generating embeddings for activity and location")
-        response = openai_client.embeddings.create(
-            input=[f"{acitivity} in {location}"],
-            model="text-embedding-ada-002"
-        )
-
-        query_embedding = response.data[0].embedding
-        query_vector_str = "[" + ",".join(str(x) for x in query_embedding) + "]"
 
         cursor.execute(f"SELECT id FROM destination WHERE name ILIKE '{location}'")
         row = cursor.fetchone()
@@ -41,53 +85,38 @@ def get_activities_by_activity_name(acitivity: str, location: str) -> List[str]:
 
         logger.debug(f"Retrieved location_id: {location_id}")
 
-        sql = """
-                SELECT 
-                    id, 
-                    name, 
-                    description,
-                    activity_image_url,
-                    activity_duration,
-                    embedding <=> %s::vector as similarity  -- Using cosine distance operator
-                FROM must_travel_activity 
-                WHERE 
-                    destination_id = %s 
-                    AND embedding <=> %s::vector < 0.3  -- Cosine distance threshold (lower is better)
-                ORDER BY similarity ASC  -- Changed to ASC since we're using distance
-                LIMIT 5;
-            """
-
-        cursor.execute(sql, (
-            query_vector_str,
-            location_id,
-            query_vector_str
-        ))
-
-        rows = cursor.fetchall()
+        rows = fetch_nearest(cursor, MUST_ACTIVITY_SEARCH_SQL, {
+            'embedding': vector_literal(query_embedding),
+            'destination_id': location_id,
+            'candidates': VECTOR_SEARCH_CANDIDATES,
+            'k': 5,
+        })
         activities = []
 
         for row in rows:
             activity_id = row[0]
             activity_name = row[1]
             activity_desc = row[2]
-            distance = row[3]
+            distance = row[5]
             logger.debug(f"Found activity: {activity_name}, Distance: {distance}")
             activities.append(activity_name)
 
         cursor.close()
-        conn.close()
         logger.info(f"Successfully retrieved {len(activities)} activities")
         return activities
     except Exception as e:
         logger.error(f"Error in get_activities_by_activity_name: {str(e)}", exc_info=True)
         raise
+    finally:
+        db_pool.putconn(conn)
 
 
 @track
 def get_activities_by_group_type(group_type: str, location: str) -> List[str]:
     logger.info(f"Getting activities for group type: {group_type} in location: {location}")
+    conn = None
     try:
-        conn = psycopg2.connect(os.getenv("VECTOR_DB_URL"))
+        conn = db_pool.getconn()
         logger.debug("Database connection established")
         cursor = conn.cursor()
 
@@ -116,14 +145,17 @@ def get_activities_by_group_type(group_type: str, location: str) -> List[str]:
 
         sql = """
             WITH matching_groups AS (
-                SELECT 
-                    id,
-                    name,
-                    -(embedding <#> %s::vector) as similarity
-                FROM travel_group
-                WHERE -(embedding <#> %s::vector) > 0.85
-                ORDER BY similarity DESC
-                LIMIT 3
+                SELECT id, name, similarity
+                FROM (
+                    SELECT 
+                        id,
+                        name,
+                        -(embedding <#> %s::vector) as similarity
+                    FROM travel_group
+                    ORDER BY embedding <#> %s::vector
+                    LIMIT 3
+                ) nearest
+                WHERE similarity > 0.85
             )
             SELECT 
                 mta.id,
@@ -163,12 +195,13 @@ def get_activities_by_group_type(group_type: str, location: str) -> List[str]:
             activities.append(f"Activity: {activity_name}, Activity Description: {activity_desc}, Rating: {rating}, Activity Image URL: {activity_image_url}, Duration: {activity_duration}")
 
         cursor.close()
-        conn.close()
         logger.info(f"Successfully retrieved {len(activities)} activities")
         return activities
     except Exception as e:
         logger.error(f"Error in get_activities_by_group_type: {str(e)}", exc_info=True)
         raise
+    finally:
+        db_pool.putconn(conn)
 
 
 @track
@@ -179,19 +212,42 @@ def get_activities_by_group_type_or_travel_theme_and_number_of_days(
     number_of_days: float
     ) -> List[str]:
     logger.info(f"Getting activities for group type: {group_type}, travel theme: {travel_theme}, destination: {destination}, days: {number_of_days}")
+    if not destination:
+        logger.warning("Destination is required but not provided")
+        return {"error": "Destination is required"}
+
+    if number_of_days <= 0:
+        logger.warning("Number of days must be greater than 0")
+        return {"error": "Number of days must be greater than 0"}
+
+    try:
+        rows = get_activities_from_snapshot(group_type, travel_theme, destination)
+        if rows is not None:
+            selected_activities = select_activities(
+                [
+                    {
+                        "title": row.title,
+                        "description": row.description,
+                        "rating": row.rating,
+                        "activity_type": row.activity_type,
+                        "image": row.image,
+                        "duration": float(row.duration)
+                    }
+                    for row in rows
+                ],
+                number_of_days
+            )
+            logger.info(f"Retrieved {len(selected_activities)} activities within {number_of_days} days from the catalog snapshot")
+            return selected_activities
+    except Exception as e:
+        logger.error(f"Catalog snapshot lookup failed, querying the database: {str(e)}", exc_info=True)
+
+    conn = None
     try:
-        conn = psycopg2.connect(os.getenv('VECTOR_DB_URL'))
+        conn = db_pool.getconn()
         logger.debug("Database connection established")
         cursor = conn.cursor()
 
-        if not destination:
-            logger.warning("Destination is required but not provided")
-            return {"error": "Destination is required"}
-        
-        if number_of_days <= 0:
-            logger.warning("Number of days must be greater than 0")
-            return {"error": "Number of days must be greater than 0"}
-
         travel_group_id = None
         if group_type:
             cursor.execute("SELECT id FROM travel_group WHERE name ILIKE %s", (group_type,))
@@ -211,42 +267,14 @@ def get_activities_by_group_type_or_travel_theme_and_number_of_days(
 
         if not destination_id:
             logger.info("Destination not found in database, falling back to LLM")
+            # the fallback can wait on another worker's LLM call, don't hold the connection
+            cursor.close()
+            db_pool.putconn(conn)
+            conn = None
             try:
-                destination = destination.lower()
-                trip_agent = SimpleAgent(
-                    base_url=os.getenv("LLM_API_URL"),
-                    api_key=os.getenv("LLM_API_KEY"),
-                    system_prompt="""You are world class trip itinerary builder, 
-                            Your task is to suggest activities for the group_type, travel_theme and destination provided to you.
-                            Each activity should have an estimated duration (0.5 for half day, 1 for full day).
-                            Total duration of all activities should not exceed the number_of_days provided.
-                            Create concise but efficient activities suggestion for a user and give user a world class experience.
-                            Return output in given JSON format:
-                            {{
-                                "activities": [
-                                    {{
-                                         "title": <title>,
-                                        "description": <description>,
-                                        "rating": <rating>,
-                                        "activity_type": <activity_type>,
-                                        "image": <image>,
-                                        "duration":<duration>
-                                    }}
-                                ]
-                            }}
-                            """,
-                    output_format={"type": "json_object"}
-                )
-
-                trip_response = trip_agent.execute(
-                    f"""create activities for a user based on this information,
-                    "destination": {destination},
-                    "group_type": "couple",
-                    "travel_theme": "culture",
-                    "number_of_days": 3"""
-                )
-                logger.info("Successfully generated activities using LLM")
-                return trip_response['activities']
+                activities = suggest_activities(destination, group_type, travel_theme, number_of_days)
+                logger.info(f"Serving {len(activities)} LLM suggested activities for {destination}")
+                return activities
             except Exception as e:
                 logger.error(f"Error generating activities with LLM: {str(e)}", exc_info=True)
                 return []
@@ -317,24 +345,9 @@ def get_activities_by_group_type_or_travel_theme_and_number_of_days(
             for act in must_travel_activities + recommended_activities
         ]
 
-        sorted_activities = sorted(
-            all_activities,
-            key=lambda x: (x["activity_type"] != "must", -x["rating"])
-        )
-
-        selected_activities = []
-        total_duration = 0.0
-
-        for activity in sorted_activities:
-            if total_duration + activity["duration"] <= number_of_days:
-                selected_activities.append(activity)
-                total_duration += activity["duration"]
-            
-            if total_duration >= number_of_days or len(selected_activities) >= 5:
-                break
+        selected_activities = select_activities(all_activities, number_of_days)
 
         cursor.close()
-        conn.close()
 
         logger.info(f"Successfully retrieved {len(selected_activities)} activities within {number_of_days} days")
         return selected_activities
@@ -342,6 +355,8 @@ def get_activities_by_group_type_or_travel_theme_and_number_of_days(
     except Exception as e:
         logger.error(f"Error in get_activities_by_group_type_or_travel_theme_and_number_of_days: {str(e)}", exc_info=True)
         return {"error": str(e)}
+    finally:
+        db_pool.putconn(conn)
 
 
 def get_confirm_button() -> str:
@@ -1,21 +1,49 @@
 from typing import List
 from dotenv import load_dotenv
-import psycopg2
+from tools.db_pool import db_pool
 import openai
 import os
 
-from openai import OpenAI
 from opik.integrations.openai import track_openai
 from opik import track
 
-from Azent.SimpleAgent import SimpleAgent
 from logger import logger
+from tools.catalog_snapshot import catalog_snapshots
+from tools.destination_fallback import suggest_hotels
+from tools.embedding_cache import get_query_embedding
+from tools.vector_index import search_hotels
+from tools.vector_queries import HOTEL_SEARCH_SQL, VECTOR_SEARCH_CANDIDATES, fetch_nearest, vector_literal
 
 load_dotenv()
-openai_client = OpenAI(
-    api_key=os.getenv("LLM_API_KEY"),
-    base_url=os.getenv("LLM_BASE_URL")
-)
+
+
+def get_hotels_from_snapshot(destination, group_type, travel_theme, star_rating, distinct=False):
+    """Hotel rows from the in-process catalog snapshot, None when the db has to be queried instead"""
+    snapshot = catalog_snapshots.current()
+    if snapshot is None:
+        return None
+    destination_id = snapshot.destination_id(destination)
+    if destination_id is None:
+        return None
+
+    lookup = snapshot.distinct_hotels if distinct else snapshot.hotels
+    return lookup(
+        destination_id,
+        snapshot.travel_group_id(group_type),
+        snapshot.travel_theme_id(travel_theme),
+        star_rating,
+    )[:5]
+
+
+def get_hotels_from_index(hotel_description, destination, star_rating):
+    """Semantic hotel search on the in-process vector index, None when the db has to be queried instead"""
+    try:
+        # the embedding is cached, so a sql fallback does not pay for it twice
+        return search_hotels(get_query_embedding(hotel_description), destination, star_rating)
+    except Exception as e:
+        logger.error(f"Vector index search failed, querying the database: {str(e)}", exc_info=True)
+        return None
+
 
 @track
 def get_hotels_by_destination(
@@ -35,50 +63,40 @@ def get_hotels_by_destination(
         star_rating: Star rating
         group_type: Group type
     """
+    if hotel_description:
+        hotels = get_hotels_from_index(hotel_description, destination, star_rating)
+        if hotels is not None:
+            return hotels
+    else:
+        hotels = get_hotels_from_snapshot(destination, group_type, travel_theme, star_rating)
+        if hotels is not None:
+            return [
+                {
+                    "title": hotel.name,
+                    "description": hotel.description,
+                    "rating": hotel.star if hotel.star else 0,
+                    "hotel_rating": hotel.rating if hotel.rating else 0,
+                    "location": hotel.location_name,
+                }
+                for hotel in hotels[:1]
+            ]
+
+    conn = None
     try:
-        conn = psycopg2.connect(os.getenv("VECTOR_DB_URL"))
+        conn = db_pool.getconn()
         cursor = conn.cursor()
 
         print("Searching hotels for:", destination)
 
         if hotel_description:
-            response = openai_client.embeddings.create(
-                input=[hotel_description],
-                model="text-embedding-ada-002"
-            )
-            query_embedding = response.data[0].embedding
-            query_vector_str = "[" + ",".join(str(x) for x in query_embedding) + "]"
-
-            sql = """
-                SELECT 
-                    h.id,
-                    h.name,
-                    l.name as location_name,
-                    d.name as destination_name,
-                    -(h.embedding <#> %s) as similarity
-                FROM hotel h
-                JOIN location l ON h.location_id = l.id
-                JOIN destination d ON l.destination_id = d.id
-                WHERE 
-                    h.star = %s
-                    AND (l.name ILIKE %s OR d.name ILIKE %s)
-                    AND -(h.embedding <#> %s) > 0.30
-                ORDER BY similarity DESC
-                LIMIT 5;
-            """
-
-            # Create tuple of parameters in the correct order
-            params = (
-                query_vector_str,  # For first vector comparison
-                star_rating,
-                f"%{destination}%",
-                f"%{destination}%",
-                query_vector_str  # For second vector comparison
-            )
-
-            cursor.execute(sql, params)  # Pass params directly, not as a tuple of a list
-
-            hotels = cursor.fetchall()
+            query_embedding = get_query_embedding(hotel_description)
+            hotels = fetch_nearest(cursor, HOTEL_SEARCH_SQL, {
+                'embedding': vector_literal(query_embedding),
+                'star': star_rating,
+                'destination': f"%{destination}%",
+                'candidates': VECTOR_SEARCH_CANDIDATES,
+                'k': 5,
+            })
 
             hotel_list = [
                 f'{row[1]} at {row[2]}, {row[3]}'
@@ -87,7 +105,6 @@ def get_hotels_by_destination(
 
             # Close the connection
             cursor.close()
-            conn.close()
             return hotel_list
 
         else:
@@ -108,41 +125,14 @@ def get_hotels_by_destination(
             cursor.execute("SELECT id FROM destination WHERE name ILIKE %s", (destination,))
             destination_id = cursor.fetchone()
             if not destination_id:
+                # the fallback can wait on another worker's LLM call, don't hold the connection
+                cursor.close()
+                db_pool.putconn(conn)
+                conn = None
                 try:
-                    destination = destination.lower()
-                    trip_agent = SimpleAgent(
-                        base_url=os.getenv("LLM_API_URL"),
-                        api_key=os.getenv("LLM_API_KEY"),
-                        system_prompt="""You are world class trip itinerary builder, 
-                                                Your task is to suggest hotels for the group_type, travel_theme and destination provided to you.
-
-                                                suggest concise but efficient hotels suggestion for a user and give user a would class experience.
-                                                return the response in given JSON format:
-                                                {{
-                                                    "hotels": [
-                                                        {{
-                                                            "title": <title>,
-                                                            "description": <description>,
-                                                            "rating": <rating>,
-                                                            "hotel_rating": <hotel_rating>,
-                                                            "location": <location>  
-                                                        }}
-                                                    ]
-                                                }}
-                                                """,
-                        output_format={"type": "json_object"}
-                    )
-
-                    response = trip_agent.execute(
-                        f"""suggest hotels for a user based on this information,
-                            destination: {destination},
-                            group_type: {str(group_type)},
-                            travel_theme: {str(travel_theme)}
-                            """
-                    )
-
-                    return response['hotels']
+                    return suggest_hotels(destination, group_type, travel_theme)
                 except Exception as e:
+                    logger.error(f"Error suggesting hotels with LLM: {str(e)}")
                     return []
 
             destination_id = destination_id[0]
@@ -204,12 +194,13 @@ def get_hotels_by_destination(
 
             # Close the connection
             cursor.close()
-            conn.close()
 
             return [hotel_list[0]] if hotel_list else []
     except Exception as e:
         print(e)
         logger.error(e)
+    finally:
+        db_pool.putconn(conn)
 
 
 @track
@@ -230,50 +221,31 @@ def get_hotels(
         star_rating: Star rating
         group_type: Group type
     """
+    if hotel_description:
+        hotels = get_hotels_from_index(hotel_description, destination, star_rating)
+        if hotels is not None:
+            return hotels
+    else:
+        hotels = get_hotels_from_snapshot(destination, group_type, travel_theme, star_rating, distinct=True)
+        if hotels is not None:
+            return [f'{hotel.name}, rating {hotel.star}' for hotel in hotels]
+
+    conn = None
     try:
-        conn = psycopg2.connect(os.getenv("VECTOR_DB_URL"))
+        conn = db_pool.getconn()
         cursor = conn.cursor()
 
         print("Searching hotels for:", destination)
 
         if hotel_description:
-            response = openai_client.embeddings.create(
-                input=[hotel_description],
-                model="text-embedding-ada-002"
-            )
-            query_embedding = response.data[0].embedding
-            query_vector_str = "[" + ",".join(str(x) for x in query_embedding) + "]"
-
-            sql = """
-                SELECT 
-                    h.id,
-                    h.name,
-                    l.name as location_name,
-                    d.name as destination_name,
-                    -(h.embedding <#> %s) as similarity
-                FROM hotel h
-                JOIN location l ON h.location_id = l.id
-                JOIN destination d ON l.destination_id = d.id
-                WHERE 
-                    h.star = %s
-                    AND (l.name ILIKE %s OR d.name ILIKE %s)
-                    AND -(h.embedding <#> %s) > 0.30
-                ORDER BY similarity DESC
-                LIMIT 5;
-            """
-
-            # Create tuple of parameters in the correct order
-            params = (
-                query_vector_str,  # For first vector comparison
-                star_rating,
-                f"%{destination}%",
-                f"%{destination}%",
-                query_vector_str  # For second vector comparison
-            )
-
-            cursor.execute(sql, params)  # Pass params directly, not as a tuple of a list
-
-            hotels = cursor.fetchall()
+            query_embedding = get_query_embedding(hotel_description)
+            hotels = fetch_nearest(cursor, HOTEL_SEARCH_SQL, {
+                'embedding': vector_literal(query_embedding),
+                'star': star_rating,
+                'destination': f"%{destination}%",
+                'candidates': VECTOR_SEARCH_CANDIDATES,
+                'k': 5,
+            })
 
             hotel_list = [
                 f'{row[1]} at {row[2]}, {row[3]}'
@@ -282,7 +254,6 @@ def get_hotels(
 
             # Close the connection
             cursor.close()
-            conn.close()
             return hotel_list
 
         else:
@@ -303,41 +274,14 @@ def get_hotels(
             cursor.execute("SELECT id FROM destination WHERE name ILIKE %s", (destination,))
             destination_id = cursor.fetchone()
             if not destination_id:
+                # the fallback can wait on another worker's LLM call, don't hold the connection
+                cursor.close()
+                db_pool.putconn(conn)
+                conn = None
                 try:
-                    destination = destination.lower()
-                    trip_agent = SimpleAgent(
-                        base_url=os.getenv("LLM_API_URL"),
-                        api_key=os.getenv("LLM_API_KEY"),
-                        system_prompt="""You are world class trip itinerary builder, 
-                                                Your task is to suggest hotels for the group_type, travel_theme and destination provided to you.
-
-                                                suggest concise but efficient hotels suggestion for a user and give user a would class experience.
-                                                return the response in given JSON format:
-                                                {{
-                                                    "hotels": [
-                                                        {{
-                                                            "title": <title>,
-                                                            "description": <description>,
-                                                            "rating": <rating>,
-                                                            "hotel_rating": <hotel_rating>,
-                                                            "location": <location>  
-                                                        }}
-                                                    ]
-                                                }}
-                                                """,
-                        output_format={"type": "json_object"}
-                    )
-
-                    response = trip_agent.execute(
-                        f"""suggest hotels for a user based on this information,
-                            destination: {destination},
-                            group_type: {str(group_type)},
-                            travel_theme: {str(travel_theme)}
-                            """
-                    )
-
-                    return response['hotels']
+                    return suggest_hotels(destination, group_type, travel_theme)
                 except Exception as e:
+                    logger.error(f"Error suggesting hotels with LLM: {str(e)}")
                     return []
 
             destination_id = destination_id[0]
@@ -393,9 +337,10 @@ def get_hotels(
 
             # Close the connection
             cursor.close()
-            conn.close()
 
             return hotel_list if hotel_list else []
     except Exception as e:
         print(e)
-        logger.error(e)
\ No newline at end of file
+        logger.error(e)
+    finally:
+        db_pool.putconn(conn)
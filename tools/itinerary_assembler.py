@@ -0,0 +1,135 @@
+import math
+import uuid
+from typing import List, Tuple
+from tools.pyd_models import TravelPackage
+
+# activities without a usable duration are planned as half a day
+DEFAULT_ACTIVITY_DURATION = 0.5
+
+
+def activity_duration(activity: dict) -> float:
+    """Duration of an activity in days, capped to one day"""
+    try:
+        duration = float(activity.get('duration'))
+    except (TypeError, ValueError):
+        duration = DEFAULT_ACTIVITY_DURATION
+    if duration <= 0:
+        duration = DEFAULT_ACTIVITY_DURATION
+    return min(duration, 1.0)
+
+
+def format_duration(days: float) -> str:
+    if days == 0.5:
+        return "Half day"
+    if days == 1:
+        return "Full day"
+    hours = round(days * 24)
+    return f"{hours} hours"
+
+
+def day_capacities(number_of_days: float) -> List[float]:
+    """1 day of capacity per full day, the remainder (e.g. 2.5 days) becomes a shorter last day"""
+    number_of_days = max(float(number_of_days), 0.5)
+    full_days = math.floor(number_of_days)
+    capacities = [1.0] * full_days
+    if number_of_days - full_days > 0:
+        capacities.append(number_of_days - full_days)
+    return capacities
+
+
+def pack_days(activities: List[dict], number_of_days: float) -> Tuple[List[List[dict]], List[dict]]:
+    """
+    Bin packing of activities into days, longest activity first, each one going to the
+    day with the most free time so the trip is evenly spread.
+    Returns the activities per day (in their original ranking order) and the ones that did not fit.
+    """
+    capacities = day_capacities(number_of_days)
+    remaining = list(capacities)
+    days = [[] for _ in capacities]
+    excluded = []
+
+    ranked = list(enumerate(activities))
+    for rank, activity in sorted(ranked, key=lambda item: -activity_duration(item[1])):
+        duration = activity_duration(activity)
+        # least loaded day that fits, so activities spread over the trip
+        candidates = [i for i, free in enumerate(remaining) if free + 1e-9 >= duration]
+        if not candidates:
+            excluded.append((rank, activity))
+            continue
+        day = max(candidates, key=lambda i: (remaining[i], -i))
+        remaining[day] -= duration
+        days[day].append((rank, activity))
+
+    return (
+        [[activity for _, activity in sorted(day)] for day in days],
+        [activity for _, activity in sorted(excluded)],
+    )
+
+
+def activity_detail(activity: dict) -> dict:
+    return {
+        "type": "activity",
+        "id": str(uuid.uuid4()),
+        "title": activity.get('title') or '',
+        "description": activity.get('description') or '',
+        "duration": format_duration(activity_duration(activity)),
+        "image": activity.get('image') or '',
+    }
+
+
+def hotel_detail(hotel: dict) -> dict:
+    rating = hotel.get('hotel_rating') or hotel.get('rating') or 0
+    try:
+        rating = min(max(float(rating), 0), 5)
+    except (TypeError, ValueError):
+        rating = 0
+    return {
+        "type": "hotel",
+        "id": str(uuid.uuid4()),
+        "title": hotel.get('title') or '',
+        "description": hotel.get('description') or '',
+        "rating": rating,
+        "image": hotel.get('image') or '',
+    }
+
+
+def assemble_itinerary(
+        destination: str,
+        activities: List[dict],
+        hotels: List[dict],
+        number_of_days: float,
+        name: str = None,
+        subtitle: str = None,
+) -> dict:
+    """
+    Build a TravelPackage dict without the LLM: activities are packed into days by duration
+    and the top ranked hotel is attached to every day.
+    """
+    days, excluded = pack_days(activities, number_of_days)
+    hotel = next((h for h in hotels or [] if isinstance(h, dict)), None)
+    destination_name = destination.title()
+
+    itinerary_detail = []
+    for number, day in enumerate(days, start=1):
+        titles = [activity.get('title') for activity in day if activity.get('title')]
+        details = [activity_detail(activity) for activity in day]
+        if hotel:
+            details.append(hotel_detail(hotel))
+        itinerary_detail.append({
+            "active": number == 1,
+            "description": f"Day {number}: " + (" & ".join(titles) if titles else f"Leisure time in {destination_name}"),
+            "details": details,
+        })
+
+    package = {
+        "id": str(uuid.uuid4()),
+        "name": name or f"{destination_name} Getaway",
+        "subtitle": subtitle or f"Experience the best of {destination_name} in {len(days)} days",
+        "image": next((activity.get('image') for activity in activities if activity.get('image')), ''),
+        "duration": len(days),
+        "itinerary_detail": itinerary_detail,
+        "exclusions": [activity.get('title') for activity in excluded],
+    }
+
+    TravelPackage.model_validate(package)
+    return package
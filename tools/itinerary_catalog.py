@@ -0,0 +1,82 @@
+import copy
+import json
+import os
+import uuid
+from typing import Callable, List, Optional, Tuple
+from tools.redis_cache import RedisCache
+
+# bumped by data-pipeline.py whenever the catalog in the vector db changes,
+# precomputed itineraries are stored under the version they were built from
+CATALOG_VERSION_KEY = 'catalog:version'
+POPULARITY_KEY = 'itinerary_catalog:popularity'
+
+
+def normalize_params(destination, group_type, travel_theme, hotel_star, number_of_days) -> dict:
+    days = float(number_of_days)
+    return {
+        'destination': str(destination or '').strip().lower(),
+        'group_type': str(group_type or '').strip().lower(),
+        'travel_theme': str(travel_theme or '').strip().lower(),
+        'hotel_star': int(hotel_star) if hotel_star else 0,
+        'number_of_days': int(days) if days.is_integer() else days,
+    }
+
+
+def refresh_ids(package: dict) -> dict:
+    """Copy of a package with new ids for the package and every item, so each user edits their own copy"""
+    package = copy.deepcopy(package)
+    package['id'] = str(uuid.uuid4())
+    for day in package.get('itinerary_detail', []):
+        for item in day.get('details', []):
+            item['id'] = str(uuid.uuid4())
+    return package
+
+
+class ItineraryCatalog:
+    """Canonical base itineraries precomputed for the most requested parameter combinations"""
+
+    def __init__(self, cache: RedisCache = None, expire_time: int = None):
+        self.cache = cache or RedisCache()
+        self.expire_time = expire_time or int(os.getenv('ITINERARY_CATALOG_TTL', 7 * 24 * 3600))
+
+    def version(self) -> str:
+        return self.cache.client.get(CATALOG_VERSION_KEY) or '0'
+
+    def key(self, params: dict, version: str = None) -> str:
+        return f"itinerary_catalog:{version or self.version()}:{json.dumps(params, sort_keys=True)}"
+
+    def record_request(self, params: dict) -> None:
+        self.cache.client.zincrby(POPULARITY_KEY, 1, json.dumps(params, sort_keys=True))
+
+    def get(self, params: dict) -> Optional[dict]:
+        """Fresh copy of the precomputed itinerary for params, None on a miss"""
+        package = self.cache.get(self.key(params))
+        return refresh_ids(package) if package else None
+
+    def lookup(self, params: dict) -> Tuple[Optional[dict], float]:
+        """
+        record_request + get in two round trips: the version is read with the popularity increment.
+        Returns (fresh copy of the precomputed itinerary or None, number of requests for params).
+        """
+        pipe = self.cache.client.pipeline(transaction=False)
+        pipe.get(CATALOG_VERSION_KEY)
+        pipe.zincrby(POPULARITY_KEY, 1, json.dumps(params, sort_keys=True))
+        version, requests = pipe.execute()
+        package = self.cache.get(self.key(params, version or '0'))
+        return (refresh_ids(package) if package else None), float(requests)
+
+    def get_or_build(self, params: dict, build: Callable[[], Optional[dict]], version: str = None) -> Optional[dict]:
+        """Fresh copy of the itinerary for params, built once by a single worker when it is missing"""
+        package = self.cache.get_or_compute(self.key(params, version), build, expire_time=self.expire_time)
+        return refresh_ids(package) if package else None
+
+    def put(self, params: dict, package: dict, version: str = None) -> None:
+        self.cache.set(self.key(params, version), package, expire_time=self.expire_time)
+
+    def top_combinations(self, n: int) -> List[dict]:
+        return [json.loads(member) for member in self.cache.client.zrevrange(POPULARITY_KEY, 0, n - 1)]
+
+
+def bump_catalog_version(cache: RedisCache = None) -> int:
+    """Invalidate every precomputed itinerary, called after the catalog has been synced"""
+    return (cache or RedisCache()).client.incr(CATALOG_VERSION_KEY)
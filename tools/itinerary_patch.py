@@ -0,0 +1,142 @@
+import copy
+import uuid
+from typing import List
+from tools.pyd_models import TravelPackage
+
+# package level fields the model may change with a "set" operation
+PACKAGE_FIELDS = ['name', 'subtitle', 'image', 'duration']
+DAY_FIELDS = ['description', 'active']
+
+
+class PatchError(ValueError):
+    """Raised when an edit operation can not be applied to an itinerary"""
+
+
+def ensure_ids(package: dict) -> dict:
+    """Give every detail item a unique id (base itineraries may contain placeholder or repeated ids)"""
+    seen = set()
+    for day in package.get('itinerary_detail', []):
+        for item in day.get('details', []):
+            item_id = str(item.get('id') or '')
+            if not item_id or item_id in seen or item_id.startswith('<'):
+                item['id'] = str(uuid.uuid4())
+            seen.add(str(item['id']))
+    return package
+
+
+def find_item(package: dict, item_id: str):
+    for day in package['itinerary_detail']:
+        for index, item in enumerate(day['details']):
+            if str(item.get('id')) == str(item_id):
+                return day, index
+    raise PatchError(f"No itinerary item with id {item_id}")
+
+
+def get_day(package: dict, day_number) -> dict:
+    days = package['itinerary_detail']
+    try:
+        day_number = int(day_number)
+    except (TypeError, ValueError):
+        raise PatchError(f"Invalid day {day_number}")
+    if not 1 <= day_number <= len(days):
+        raise PatchError(f"Day {day_number} does not exist, the itinerary has {len(days)} days")
+    return days[day_number - 1]
+
+
+def get_position(day: dict, position) -> int:
+    try:
+        position = int(position)
+    except (TypeError, ValueError):
+        raise PatchError(f"Invalid position {position}")
+    if not 0 <= position <= len(day['details']):
+        raise PatchError(f"Position {position} is out of range, the day has {len(day['details'])} items")
+    return position
+
+
+def new_item(item: dict) -> dict:
+    if not isinstance(item, dict):
+        raise PatchError("Operation item must be an object")
+    return {**item, 'id': str(uuid.uuid4())}
+
+
+def apply_operation(package: dict, operation: dict) -> None:
+    op = operation.get('op')
+
+    if op == 'remove':
+        day, index = find_item(package, operation.get('id'))
+        del day['details'][index]
+
+    elif op == 'replace':
+        day, index = find_item(package, operation.get('id'))
+        day['details'][index] = new_item(operation.get('item'))
+
+    elif op == 'add':
+        day = get_day(package, operation.get('day'))
+        position = operation.get('position')
+        item = new_item(operation.get('item'))
+        if position is None:
+            # keep the hotel as the last entry of the day
+            position = next(
+                (i for i, detail in enumerate(day['details']) if detail.get('type') == 'hotel'),
+                len(day['details'])
+            )
+        day['details'].insert(get_position(day, position), item)
+
+    elif op == 'replace_hotel':
+        item = operation.get('item')
+        if not isinstance(item, dict):
+            raise PatchError("Operation item must be an object")
+        replaced = False
+        for day in package['itinerary_detail']:
+            for index, detail in enumerate(day['details']):
+                if detail.get('type') == 'hotel':
+                    day['details'][index] = new_item({**item, 'type': 'hotel'})
+                    replaced = True
+        if not replaced:
+            raise PatchError("The itinerary has no hotel to replace")
+
+    elif op == 'set':
+        field = operation.get('field')
+        if field not in PACKAGE_FIELDS:
+            raise PatchError(f"Field {field} can not be set, allowed: {PACKAGE_FIELDS}")
+        package[field] = operation.get('value')
+
+    elif op == 'set_day':
+        field = operation.get('field')
+        if field not in DAY_FIELDS:
+            raise PatchError(f"Day field {field} can not be set, allowed: {DAY_FIELDS}")
+        get_day(package, operation.get('day'))[field] = operation.get('value')
+
+    elif op == 'add_day':
+        day = operation.get('value')
+        if not isinstance(day, dict):
+            raise PatchError("add_day value must be a day object")
+        day = {**day, 'details': [new_item(item) for item in day.get('details', [])]}
+        package['itinerary_detail'].append(day)
+        package['duration'] = len(package['itinerary_detail'])
+
+    elif op == 'remove_day':
+        days = package['itinerary_detail']
+        days.remove(get_day(package, operation.get('day')))
+        package['duration'] = len(days)
+
+    else:
+        raise PatchError(f"Unknown operation {op}")
+
+
+def apply_operations(package: dict, operations: List[dict]) -> dict:
+    """
+    Apply edit operations to a copy of the package and validate the result against TravelPackage.
+    The input package is left untouched.
+    """
+    if not isinstance(operations, list):
+        raise PatchError("operations must be a list")
+
+    patched = ensure_ids(copy.deepcopy(package))
+    for operation in operations:
+        if not isinstance(operation, dict):
+            raise PatchError(f"Invalid operation {operation}")
+        apply_operation(patched, operation)
+
+    TravelPackage.model_validate(patched)
+    return patched
@@ -1,4 +1,5 @@
-from openai import AzureOpenAI, OpenAI
+import copy
+from Azent.clients import get_llm_client
 from opik.integrations.openai import track_openai
 from opik import track
 import json
@@ -6,32 +7,128 @@ import os
 from dotenv import load_dotenv
 
 from prompts import get_update_itinerary_prompt
+from prompts.get_patch_itinerary_prompt import get_patch_itinerary_prompt
 from tools.get_activities_tool import get_activities_by_group_type_or_travel_theme_and_number_of_days
 from tools.get_hotels_tool import get_hotels_by_destination
 from tools.redis_cache import RedisCache
+from tools.itinerary_patch import PatchError, apply_operations, ensure_ids
+from tools.itinerary_assembler import assemble_itinerary
+from tools.itinerary_catalog import ItineraryCatalog, normalize_params
+from pydantic import ValidationError
 import uuid
 import inspect
 import re
+import concurrent.futures
+import contextvars
+import functools
+import time
+from logger import logger
 load_dotenv()
 
+# activities and hotels for a base itinerary are fetched in parallel
+lookup_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=int(os.getenv('ITINERARY_LOOKUP_WORKERS', 16)),
+    thread_name_prefix='itinerary-lookup'
+)
+LOOKUP_TIMEOUT = float(os.getenv('ITINERARY_LOOKUP_TIMEOUT', 20))
+
+BASE_ITINERARY_SYSTEM_PROMPT = """You are world class trip itinerary builder, 
+            Your task is to create customized itinerary for a user based on the information provided to you about the destination,
+            activities, hotels and number of days. Make sure to arrange hotels and activities based on number of days.
+            activities will have duration as well, so adjust the itinerary accordingly. Make sure, not to distribute same activities in different days. If you think something can not be accomodated, then add it to the exclusions.
+            It is strictly important not to include another information part from what is provided to you about activities, hotel. Add nothing else.
+            Don't include information like breakfast, lunch, dinner, etc. in the itinerary. Add activities only.
+            Use only one hotel for all the days. Don't add any extra information.
+            Create concise but efficient trip itinerary for a user and give user a would class experience.
+            keep id as <uuid>
+            
+            it should be json in the following format:
+            {{
+                "id": <uuid>
+                "name": "Paris Adventure Package",
+                "subtitle": "Experience the magic of Paris in 5 days",
+                "image": "https://example.com/paris-skyline.jpg",
+                "duration": 5,
+                "itinerary_detail": [
+                {{
+            "active": true,
+                    "description": "Day 1: Historical Paris Tour",
+                    "details": [
+                    {{
+            "type": "activity",
+                        "id": <uuid>,
+                        "title": "Eiffel Tower Visit",
+                        "description": "Skip-the-line access to Paris's most iconic monument",
+                        "duration": "3 hours",
+                        "image": "<image_url>"
+                    }},
+                    {{
+            "type": "hotel",
+                        "id": <uuid>,
+                        "title": "Louvre Museum Tour",
+                        "description": "Guided tour of world's largest art museum",
+                        "rating": 4.9,
+                        "image": "https://example.com/louvre.jpg"
+                    }}
+                    ]
+                }},
+                {{
+            "active": false,
+                    "description": "Day 2: Artistic Montmartre",
+                    "details": [
+                    {{
+            "type": "activity",
+                        "id": <uuid>,
+                        "title": "Sacré-Cœur Basilica",
+                        "description": "Visit the iconic white church with panoramic city views",
+                        "duration": "2 hours",
+                        "image": "<image_url>"
+                    }},
+                    {{
+            "type": "activity",
+                        "id": <uuid>,
+                        "title": "Place du Tertre",
+                        "description": "Experience the artist square and get your portrait drawn",
+                        "rating": 4.6,
+                        "image": "<image_url>"
+                    }},
+                    {{
+            "type": "hotel",
+                        "id": <uuid>,
+                        "title": "Louvre Museum Tour",
+                        "description": "Guided tour of world's largest art museum",
+                        "rating": 4.9,
+                        "image": "https://example.com/louvre.jpg"
+                    }}
+                    ]
+                }}
+                ]
+            }}
+            """
+
 
 class ItineraryTool:
-    def __init__(self, itinerary_id=None, client_type="openai"):
+    def __init__(self, itinerary_id=None, client_type="openai", package=None, defer_write=None):
         self.cache = RedisCache()
+        self.catalog = ItineraryCatalog(self.cache)
         self.base_url = os.getenv("LLM_BASE_URL")
         self.api_key = os.getenv('LLM_API_KEY')
         self.client_type = os.getenv('LLM_CLIENT_TYPE')
         self.itinerary_id = itinerary_id
+        # itinerary already read by the caller, saves update_itinerary a GET
+        self.package = package
+        # Agent.defer_write: edits are stored together with the agent's thread
+        self.defer_write = defer_write
 
         if self.client_type == "azure":
-            self.client = AzureOpenAI(
+            self.client = get_llm_client(
+                provider='azure',
+                base_url=os.getenv('OPENAI_BASE_URL'),
                 api_key=os.getenv('OPENAI_API_KEY'),
-                azure_endpoint=os.getenv('OPENAI_BASE_URL'),
-                azure_deployment='gpt-4o-mvp-dev',
-                api_version='2024-02-15-preview'
             )
         else:
-            self.client = OpenAI(
+            self.client = get_llm_client(
+                provider='openai',
                 base_url=self.base_url,
                 api_key=self.api_key,
             )
@@ -116,139 +213,274 @@ class ItineraryTool:
             list: Object of day-wise itinerary items if found, empty object otherwise
         """
 
-        # get activities
-        activities = get_activities_by_group_type_or_travel_theme_and_number_of_days(
-            group_type=group_type,
-            travel_theme=travel_theme,
-            number_of_days=number_of_days,
-            destination=destination
+        precomputed, requests = self.get_precomputed_itinerary(destination, group_type, travel_theme, hote_star_rating, number_of_days)
+        if precomputed:
+            return precomputed
+
+        if self.should_fill_catalog(requests):
+            return self.build_catalog_itinerary(destination, group_type, travel_theme, hote_star_rating, number_of_days)
+        return self.build_base_itinerary(destination, group_type, travel_theme, hote_star_rating, number_of_days)
+
+    def should_fill_catalog(self, requests):
+        """Popular combinations missing from the catalog are built once for everybody, the others live"""
+        return (
+            os.getenv('ITINERARY_CATALOG_FILL', 'true').lower() == 'true'
+            and requests >= float(os.getenv('ITINERARY_CATALOG_FILL_MIN_REQUESTS', 5))
         )
 
-        # get hotels
-        hotels = get_hotels_by_destination(
-            destination=destination,
-            travel_theme=travel_theme,
-            group_type=group_type,
-            star_rating=hote_star_rating,
+    def build_catalog_itinerary(self, destination, group_type, travel_theme, hote_star_rating, number_of_days):
+        """
+        Build a missing combination once and add it to the catalog: concurrent requests for
+        the same parameters wait for the worker building it instead of calling the LLM too.
+        Only the copy returned to the user is saved, the canonical package lives in the catalog.
+        """
+        built = {}
+
+        def build():
+            built['result'] = self.build_base_itinerary(
+                destination, group_type, travel_theme, hote_star_rating, number_of_days, save=False
+            )
+            return built['result'] if isinstance(built['result'], dict) else None
+
+        try:
+            params = normalize_params(destination, group_type, travel_theme, hote_star_rating, number_of_days)
+            package = self.catalog.get_or_build(params, build)
+        except Exception as e:
+            logger.warning(f"Itinerary catalog build failed: {str(e)}")
+            package = None
+
+        if package:
+            self.save_itinerary(package)
+            return package
+        if isinstance(built.get('result'), dict):
+            # built, but storing it in the catalog failed
+            self.save_itinerary(built['result'])
+            return built['result']
+        if 'result' in built:
+            # the build failed, return its error
+            return built['result']
+        return self.build_base_itinerary(destination, group_type, travel_theme, hote_star_rating, number_of_days)
+
+    def build_base_itinerary(self, destination, group_type, travel_theme, hote_star_rating, number_of_days, save=True):
+        """
+        Generate a base itinerary from the catalog (live path, also used by the precompute job).
+        With save=False the package is only returned, not stored under its id.
+        """
+        activities, hotels = self.get_base_itinerary_inputs(
+            destination, group_type, travel_theme, hote_star_rating, number_of_days
         )
 
+        if self.can_assemble(activities):
+            return self.assemble_base_itinerary(destination, group_type, travel_theme, activities, hotels, number_of_days, save=save)
+
         try:
-            system_prompt = """You are world class trip itinerary builder, 
-            Your task is to create customized itinerary for a user based on the information provided to you about the destination,
-            activities, hotels and number of days. Make sure to arrange hotels and activities based on number of days.
-            activities will have duration as well, so adjust the itinerary accordingly. Make sure, not to distribute same activities in different days. If you think something can not be accomodated, then add it to the exclusions.
-            It is strictly important not to include another information part from what is provided to you about activities, hotel. Add nothing else.
-            Don't include information like breakfast, lunch, dinner, etc. in the itinerary. Add activities only.
-            Use only one hotel for all the days. Don't add any extra information.
-            Create concise but efficient trip itinerary for a user and give user a would class experience.
-            keep id as <uuid>
-            
-            it should be json in the following format:
-            {{
-                "id": <uuid>
-                "name": "Paris Adventure Package",
-                "subtitle": "Experience the magic of Paris in 5 days",
-                "image": "https://example.com/paris-skyline.jpg",
-                "duration": 5,
-                "itinerary_detail": [
-                {{
-            "active": true,
-                    "description": "Day 1: Historical Paris Tour",
-                    "details": [
-                    {{
-            "type": "activity",
-                        "id": <uuid>,
-                        "title": "Eiffel Tower Visit",
-                        "description": "Skip-the-line access to Paris's most iconic monument",
-                        "duration": "3 hours",
-                        "image": "<image_url>"
-                    }},
-                    {{
-            "type": "hotel",
-                        "id": <uuid>,
-                        "title": "Louvre Museum Tour",
-                        "description": "Guided tour of world's largest art museum",
-                        "rating": 4.9,
-                        "image": "https://example.com/louvre.jpg"
-                    }}
-                    ]
-                }},
-                {{
-            "active": false,
-                    "description": "Day 2: Artistic Montmartre",
-                    "details": [
-                    {{
-            "type": "activity",
-                        "id": <uuid>,
-                        "title": "Sacré-Cœur Basilica",
-                        "description": "Visit the iconic white church with panoramic city views",
-                        "duration": "2 hours",
-                        "image": "<image_url>"
-                    }},
-                    {{
-            "type": "activity",
-                        "id": <uuid>,
-                        "title": "Place du Tertre",
-                        "description": "Experience the artist square and get your portrait drawn",
-                        "rating": 4.6,
-                        "image": "<image_url>"
-                    }},
-                    {{
-            "type": "hotel",
-                        "id": <uuid>,
-                        "title": "Louvre Museum Tour",
-                        "description": "Guided tour of world's largest art museum",
-                        "rating": 4.9,
-                        "image": "https://example.com/louvre.jpg"
-                    }}
-                    ]
-                }}
-                ]
-            }}
-            """
+            response = self.client.chat.completions.create(
+                model=os.getenv('ITINERARY_MODEL'),
+                messages=self.get_base_itinerary_messages(destination, activities, hotels, number_of_days),
+                temperature=0.6,
+                response_format={"type": "json_object"},
+            )
+            message = response.choices[0].message.content
+            if not save:
+                return self.parse_base_itinerary(message)
+            return self.save_base_itinerary(message)
+        except Exception as e:
+            print(f"Error getting itinerary: {str(e)}")
+            return 'Error getting itinerary'
+
+    def get_base_itinerary_stream(
+            self,
+            destination: str,
+            group_type: str,
+            travel_theme: str,
+            hote_star_rating: int,
+            number_of_days: float,
+    ):
+        """
+        Streaming variant of get_base_itinerary used by Agent.run_stream.
+        Yields ('token', text) while the model writes the package and ('result', itinerary) at the end.
+        """
+        precomputed, requests = self.get_precomputed_itinerary(destination, group_type, travel_theme, hote_star_rating, number_of_days)
+        if precomputed:
+            yield 'result', precomputed
+            return
+
+        if self.should_fill_catalog(requests):
+            # built (or waited for) in one piece, so streaming and non streaming requests share the catalog entry
+            yield 'result', self.build_catalog_itinerary(destination, group_type, travel_theme, hote_star_rating, number_of_days)
+            return
+
+        activities, hotels = self.get_base_itinerary_inputs(
+            destination, group_type, travel_theme, hote_star_rating, number_of_days
+        )
+
+        if self.can_assemble(activities):
+            yield 'result', self.assemble_base_itinerary(destination, group_type, travel_theme, activities, hotels, number_of_days)
+            return
+
+        try:
+            stream = self.client.chat.completions.create(
+                model=os.getenv('ITINERARY_MODEL'),
+                messages=self.get_base_itinerary_messages(destination, activities, hotels, number_of_days),
+                temperature=0.6,
+                response_format={"type": "json_object"},
+                stream=True,
+            )
+            message = ''
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    message += chunk.choices[0].delta.content
+                    yield 'token', chunk.choices[0].delta.content
+
+            yield 'result', self.save_base_itinerary(message)
+        except Exception as e:
+            print(f"Error getting itinerary: {str(e)}")
+            yield 'result', 'Error getting itinerary'
+
+    def get_precomputed_itinerary(self, destination, group_type, travel_theme, hote_star_rating, number_of_days):
+        """
+        (copy of the precomputed itinerary for these parameters with fresh ids or None on a miss,
+        number of requests for these parameters)
+        """
+        try:
+            params = normalize_params(destination, group_type, travel_theme, hote_star_rating, number_of_days)
+            package, requests = self.catalog.lookup(params)
+            if package:
+                logger.info(f"Serving precomputed itinerary for {params}")
+                self.save_itinerary(package)
+            return package, requests
+        except Exception as e:
+            logger.warning(f"Itinerary catalog lookup failed: {str(e)}")
+            return None, 0
+
+    def can_assemble(self, activities):
+        """The deterministic assembler needs a list of activity dicts (not an error or an empty result)"""
+        return (
+            os.getenv('ITINERARY_ASSEMBLER', 'true').lower() == 'true'
+            and isinstance(activities, list)
+            and len(activities) > 0
+            and all(isinstance(activity, dict) for activity in activities)
+        )
+
+    def assemble_base_itinerary(self, destination, group_type, travel_theme, activities, hotels, number_of_days, save=True):
+        """Fast path: lay out the itinerary without the LLM, optionally letting the model name it"""
+        try:
+            name, subtitle = None, None
+            if os.getenv('ITINERARY_LLM_NAMES', 'false').lower() == 'true':
+                name, subtitle = self.get_package_names(destination, group_type, travel_theme, activities, number_of_days)
+
+            json_response = assemble_itinerary(destination, activities, hotels, number_of_days, name=name, subtitle=subtitle)
+            if save:
+                self.save_itinerary(json_response)
+            return json_response
+        except Exception as e:
+            print(f"Error getting itinerary: {str(e)}")
+            return 'Error getting itinerary'
 
+    def get_package_names(self, destination, group_type, travel_theme, activities, number_of_days):
+        try:
             response = self.client.chat.completions.create(
                 model=os.getenv('ITINERARY_MODEL'),
                 messages=[
                     {
                         "role": "system",
-                        "content": system_prompt,
+                        "content": """You name travel packages. Return json: {"name": <short catchy package name>, "subtitle": <one line subtitle>}""",
                     },
                     {
                         "role": "user",
-                        "content": f"""create itinerary for a user based on this information,
-                        "destination": {destination},
-                        "activities": {str(activities)},
-                        "hotels": {str(hotels)},
-                        "number_of_days": {str(number_of_days)}
-                        """
+                        "content": f"""destination: {destination}, group_type: {group_type}, travel_theme: {travel_theme}, number_of_days: {number_of_days},
+                        activities: {', '.join(str(activity.get('title')) for activity in activities)}"""
                     }
                 ],
                 temperature=0.6,
+                max_tokens=100,
                 response_format={"type": "json_object"},
             )
-            message = response.choices[0].message.content
+            names = json.loads(response.choices[0].message.content)
+            return names.get('name'), names.get('subtitle')
+        except Exception as e:
+            logger.warning(f"Could not generate package names, using defaults: {str(e)}")
+            return None, None
 
-            response = message.replace("```json\n", "").replace("\n```", "")
-            response = self.replace_with_uuid(response)
-            json_response = json.loads(response)
+    def get_base_itinerary_inputs(self, destination, group_type, travel_theme, hote_star_rating, number_of_days):
+        """Fetch activities and hotels concurrently, a branch that fails or times out contributes an empty list"""
+        # get activities
+        activities_future = self.submit(
+            get_activities_by_group_type_or_travel_theme_and_number_of_days,
+            group_type=group_type,
+            travel_theme=travel_theme,
+            number_of_days=number_of_days,
+            destination=destination
+        )
 
-            if isinstance(json_response, list):
-                json_response = json_response[0]
-            
-            if 'id' not in json_response:
-                json_response['id'] = str(uuid.uuid4())
-            
-            self.cache.set(json_response['id'], json_response)
-            return json_response
+        # get hotels
+        hotels_future = self.submit(
+            get_hotels_by_destination,
+            destination=destination,
+            travel_theme=travel_theme,
+            group_type=group_type,
+            star_rating=hote_star_rating,
+        )
+
+        activities = self.get_lookup_result('activities', activities_future)
+        hotels = self.get_lookup_result('hotels', hotels_future)
+        return activities, hotels
+
+    def submit(self, fn, **kwargs):
+        # run in a copy of the current context so opik traces keep their parent span
+        context = contextvars.copy_context()
+        return lookup_executor.submit(context.run, functools.partial(fn, **kwargs))
+
+    def get_lookup_result(self, name, future):
+        try:
+            result = future.result(timeout=LOOKUP_TIMEOUT)
+            return result if result is not None else []
+        except concurrent.futures.TimeoutError:
+            logger.warning(f"Base itinerary {name} lookup timed out after {LOOKUP_TIMEOUT}s, continuing without it")
         except Exception as e:
-            print(f"Error getting itinerary: {str(e)}")
-            return 'Error getting itinerary'
+            logger.error(f"Base itinerary {name} lookup failed: {str(e)}", exc_info=True)
+        return []
+
+    def get_base_itinerary_messages(self, destination, activities, hotels, number_of_days):
+        return [
+            {
+                "role": "system",
+                "content": BASE_ITINERARY_SYSTEM_PROMPT,
+            },
+            {
+                "role": "user",
+                "content": f"""create itinerary for a user based on this information,
+                "destination": {destination},
+                "activities": {str(activities)},
+                "hotels": {str(hotels)},
+                "number_of_days": {str(number_of_days)}
+                """
+            }
+        ]
+
+    def save_base_itinerary(self, message):
+        json_response = self.parse_base_itinerary(message)
+        self.save_itinerary(json_response)
+        return json_response
+
+    def parse_base_itinerary(self, message):
+        response = message.replace("```json\n", "").replace("\n```", "")
+        response = self.replace_with_uuid(response)
+        json_response = json.loads(response)
+
+        if isinstance(json_response, list):
+            json_response = json_response[0]
+
+        if 'id' not in json_response:
+            json_response['id'] = str(uuid.uuid4())
+
+        ensure_ids(json_response)
+        return json_response
 
     @track
     def replace_with_uuid(self, text):
         try:
-            return re.sub(r"<id>", lambda _: str(uuid.uuid4()), text)
+            return re.sub(r"<u?u?id>", lambda _: str(uuid.uuid4()), text)
         except Exception as e:
             print(f"Error replacing itinerary: {str(e)}")
 
@@ -272,39 +504,107 @@ class ItineraryTool:
                          user_changes,
     ):
         try:
-            base_itinerary = self.cache.get(self.itinerary_id)
+            base_itinerary = self.package if self.package is not None else self.cache.get(self.itinerary_id)
 
-            response = self.client.chat.completions.create(
-                model=os.getenv('UPDATE_ITINERARY_MODEL'),
-                messages=[
-                    {
-                        "role": "system",
-                        "content": self.get_update_itinerary_prompt(json.dumps(base_itinerary, indent=2)),
-                    },
-                    {
-                        "role": "user",
-                        "content": f"""create itinerary for a user based on this information,
-                        {user_changes}
-                        """
-                    }
-                ],
-                temperature=0.6,
-                response_format={"type": "json_object"},
-            )
-
-            message = response.choices[0].message.content
+            if os.getenv('ITINERARY_EDIT_MODE', 'patch') == 'patch':
+                try:
+                    return self.patch_itinerary(base_itinerary, user_changes)
+                except (PatchError, ValidationError, json.JSONDecodeError) as e:
+                    logger.warning(f"Itinerary patch failed, regenerating the full itinerary: {str(e)}")
 
-            response = message.replace("```json\n", "").replace("\n```", "")
-            json_response = json.loads(response)
-
-            if isinstance(json_response, list):
-                json_response = json_response[0]
-            
-            if 'id' not in json_response:
-                json_response['id'] = str(uuid.uuid4())
-            
-            self.cache.set(json_response['id'], json_response)
-            return json_response
+            return self.regenerate_itinerary(base_itinerary, user_changes)
         except Exception as e:
             print(f"Error getting itinerary: {str(e)}")
-            return 'Error getting itinerary'
\ No newline at end of file
+            return 'Error getting itinerary'
+
+    def patch_itinerary(self, base_itinerary, user_changes):
+        """Ask the model for edit operations only and apply them to the cached itinerary"""
+        # the cached itinerary may be shared (near cache), work on a copy
+        base_itinerary = ensure_ids(copy.deepcopy(base_itinerary))
+
+        response = self.client.chat.completions.create(
+            model=os.getenv('UPDATE_ITINERARY_MODEL'),
+            messages=[
+                {
+                    "role": "system",
+                    "content": get_patch_itinerary_prompt(json.dumps(base_itinerary)),
+                },
+                {
+                    "role": "user",
+                    "content": f"""update the itinerary for a user based on this information,
+                    {user_changes}
+                    """
+                }
+            ],
+            temperature=0.2,
+            response_format={"type": "json_object"},
+        )
+
+        message = response.choices[0].message.content
+        edit = json.loads(message.replace("```json\n", "").replace("\n```", ""))
+        if not isinstance(edit, dict):
+            raise PatchError("The edit response must be a JSON object with an operations list")
+        operations = edit.get('operations', [])
+
+        json_response = apply_operations(base_itinerary, operations)
+        json_response['version'] = json_response.get('version', 0) + 1
+
+        self.save_itinerary(json_response, operations)
+        return json_response
+
+    def save_itinerary(self, itinerary, operations=None):
+        """Store an itinerary (and the edit history) in one round trip, or defer it to the agent's thread save"""
+        def write(pipe):
+            pipe.set(itinerary['id'], itinerary)
+            if operations is not None:
+                self.record_version(pipe, itinerary['id'], itinerary['version'], operations)
+
+        # a second edit in the same turn starts from this one
+        self.package = itinerary
+        if self.defer_write is not None:
+            self.defer_write(write)
+            return
+        with self.cache.pipeline() as pipe:
+            write(pipe)
+
+    def record_version(self, pipe, itinerary_id, version, operations):
+        """Queue the append of the applied operations to the itinerary's edit history"""
+        key = 'itinerary_history:' + itinerary_id
+        pipe.rpush(key, json.dumps({'version': version, 'operations': operations, 'created_at': time.time()}))
+        pipe.expire(key, 3600)
+
+    def regenerate_itinerary(self, base_itinerary, user_changes):
+        response = self.client.chat.completions.create(
+            model=os.getenv('UPDATE_ITINERARY_MODEL'),
+            messages=[
+                {
+                    "role": "system",
+                    "content": self.get_update_itinerary_prompt(json.dumps(base_itinerary, indent=2)),
+                },
+                {
+                    "role": "user",
+                    "content": f"""create itinerary for a user based on this information,
+                    {user_changes}
+                    """
+                }
+            ],
+            temperature=0.6,
+            response_format={"type": "json_object"},
+        )
+
+        message = response.choices[0].message.content
+
+        response = message.replace("```json\n", "").replace("\n```", "")
+        json_response = json.loads(response)
+
+        if isinstance(json_response, list):
+            json_response = json_response[0]
+
+        base_itinerary = base_itinerary or {}
+        if 'id' not in json_response:
+            json_response['id'] = base_itinerary.get('id') or str(uuid.uuid4())
+        # a full regeneration is still a new version in the itinerary's edit history
+        json_response['version'] = base_itinerary.get('version', 0) + 1
+
+        self.save_itinerary(json_response, [{'op': 'regenerate', 'changes': user_changes}])
+        return json_response
@@ -0,0 +1,150 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, List, Tuple
+from logger import logger
+
+INVALIDATION_CHANNEL = 'near_cache:invalidate'
+
+
+def new_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def invalidation_message(worker_id: str, keys: List[str]) -> str:
+    return json.dumps({'worker': worker_id, 'keys': keys})
+
+
+class NearCache:
+    """
+    In-process LRU of decoded values in front of redis, with a TTL per entry.
+
+    Writes through RedisCache invalidate the local entry and publish the key on
+    INVALIDATION_CHANNEL, every other worker drops it when the message arrives (messages
+    from this worker are skipped by worker id). The TTL bounds staleness for writes that
+    bypass RedisCache or invalidations lost while the subscription was down.
+
+    Values are shared between callers: treat objects returned from the cache as read-only.
+    """
+
+    def __init__(self, client, max_size: int = 1024, ttl: float = 30):
+        self.client = client
+        self.max_size = max_size
+        self.ttl = ttl
+        self.worker_id = new_worker_id()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # bumped on every invalidation, a fill started before an invalidation is dropped
+        self._generation = 0
+        self._stats = {
+            'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0,
+            'invalidations': 0, 'remote_invalidations': 0,
+        }
+        self._subscriber = None
+        self._subscriber_pid = None
+
+    @classmethod
+    def from_env(cls, client):
+        """None unless REDIS_NEAR_CACHE is enabled"""
+        if os.getenv('REDIS_NEAR_CACHE', 'false').lower() != 'true':
+            return None
+        return cls(
+            client,
+            max_size=int(os.getenv('REDIS_NEAR_CACHE_SIZE', 1024)),
+            ttl=float(os.getenv('REDIS_NEAR_CACHE_TTL', 30)),
+        )
+
+    def get(self, key: str) -> Tuple[bool, Any, int]:
+        """(hit, value, generation), pass generation to set() when filling after a miss"""
+        self.subscribe()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return True, value, self._generation
+                del self._entries[key]
+                self._stats['expirations'] += 1
+            self._stats['misses'] += 1
+            return False, None, self._generation
+
+    def set(self, key: str, value: Any, generation: int, ttl: float = None) -> None:
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (value, time.monotonic() + min(ttl or self.ttl, self.ttl))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, keys: List[str], publish: bool = True) -> None:
+        self.drop(keys)
+        if publish:
+            try:
+                self.client.publish(INVALIDATION_CHANNEL, invalidation_message(self.worker_id, keys))
+            except Exception as e:
+                logger.warning(f"Near cache invalidation publish failed: {str(e)}")
+
+    def drop(self, keys: List[str], remote: bool = False) -> None:
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+            self._stats['remote_invalidations' if remote else 'invalidations'] += len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def subscribe(self) -> None:
+        """Start the invalidation listener, once per process (a forked worker starts its own)"""
+        if self._subscriber_pid == os.getpid():
+            return
+        with self._lock:
+            if self._subscriber_pid == os.getpid():
+                return
+            self._subscriber_pid = os.getpid()
+            self.worker_id = new_worker_id()
+            self._entries.clear()
+        try:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{INVALIDATION_CHANNEL: self.on_message})
+            self._subscriber = pubsub.run_in_thread(
+                sleep_time=1, daemon=True, exception_handler=self.on_subscriber_error
+            )
+        except Exception as e:
+            # without invalidations entries could be stale for up to ttl, don't cache at all
+            logger.error(f"Near cache subscription failed, disabling it: {str(e)}")
+            self.max_size = 0
+            self.clear()
+
+    def on_message(self, message) -> None:
+        try:
+            data = json.loads(message['data'])
+        except (TypeError, ValueError):
+            return
+        if data.get('worker') != self.worker_id:
+            self.drop(data.get('keys', []), remote=True)
+
+    def on_subscriber_error(self, error, pubsub, thread) -> None:
+        # invalidations may have been missed while disconnected
+        logger.warning(f"Near cache subscription error, clearing: {str(error)}")
+        self.clear()
+        time.sleep(1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'size': len(self._entries),
+                'hit_rate': self._stats['hits'] / lookups if lookups else 0.0,
+            }
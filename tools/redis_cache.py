@@ -1,11 +1,79 @@
 from redis import Redis
-from typing import Optional, Any
-import json
+from redis.asyncio import Redis as AsyncRedis
+from typing import Optional, Any, Callable, Dict, List, Tuple
+from contextlib import contextmanager, asynccontextmanager
 from functools import wraps
+import math
 import os
+import random
+import time
+import uuid
 from dotenv import load_dotenv
+from logger import logger
+from tools.near_cache import NearCache, new_worker_id, invalidation_message, INVALIDATION_CHANNEL
+from tools.redis_codec import Codec, decode
 
 load_dotenv()
+
+# deletes the lock only if it still holds our token, a lease that expired may belong to another worker
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class CachePipeline:
+    """
+    Commands queued for a single round trip, see RedisCache.pipeline.
+
+    get/set/delete encode and decode values like RedisCache, any other redis command
+    (rpush, expire, lrange...) is queued on the underlying pipeline as is. The replies are
+    in `results` once the pipeline has been executed (raw replies are bytes).
+    """
+
+    def __init__(self, pipe, codec: Codec):
+        self.pipe = pipe
+        self.codec = codec
+        self.decoded = set()
+        self.written = []
+        self.results = None
+
+    def __getattr__(self, name):
+        return getattr(self.pipe, name)
+
+    def get(self, key: str) -> 'CachePipeline':
+        self.pipe.get(key)
+        self.decoded.add(len(self.pipe) - 1)
+        return self
+
+    def set(self, key: str, data: dict, expire_time: int = 3600) -> 'CachePipeline':
+        self.pipe.setex(key, expire_time, self.codec.encode(data))
+        self.written.append(key)
+        return self
+
+    def delete(self, key: str) -> 'CachePipeline':
+        self.pipe.delete(key)
+        self.written.append(key)
+        return self
+
+    def finish(self, results: list) -> list:
+        self.results = [
+            decode(result) if i in self.decoded else result
+            for i, result in enumerate(results)
+        ]
+        return self.results
+
+    def execute(self) -> list:
+        return self.finish(self.pipe.execute())
+
+
+class AsyncCachePipeline(CachePipeline):
+    async def execute(self) -> list:
+        return self.finish(await self.pipe.execute())
+
+
 class RedisCache:
     _instance = None
     
@@ -24,23 +92,199 @@ class RedisCache:
                 socket_timeout=10 
             )
             print("Redis client initialized", self.client)
+            # optional in-process cache of decoded values (REDIS_NEAR_CACHE=true)
+            self.near_cache = NearCache.from_env(self.client)
+            # serialization of stored values (REDIS_CODEC), every format is readable
+            self.codec = Codec.from_env()
+
+    @property
+    def binary_client(self) -> Redis:
+        """Client without response decoding, for values stored as bytes (every codec encoded value)"""
+        if not hasattr(self, '_binary_client'):
+            self._binary_client = Redis(
+                host=os.getenv('REDIS_HOST'),
+                port=6379,
+                db=0,
+                decode_responses=False,
+                socket_timeout=10
+            )
+        return self._binary_client
 
     def set(self, key: str, data: dict, expire_time: int = 3600) -> None:
         """Store itinerary data with expiration time"""
-        self.client.setex(
+        self.binary_client.setex(
             key,
             expire_time,
-            json.dumps(data)
+            self.codec.encode(data)
         )
+        if self.near_cache:
+            self.near_cache.invalidate([key])
 
     def get(self, key: str) -> Optional[dict]:
-        """Retrieve itinerary data"""
-        data = self.client.get(key)
-        return json.loads(data) if data else None
+        """Retrieve itinerary data, values served from the near cache are shared and must not be mutated"""
+        if self.near_cache:
+            hit, value, generation = self.near_cache.get(key)
+            if hit:
+                return value
+
+        value = decode(self.binary_client.get(key))
+        if self.near_cache and value is not None:
+            self.near_cache.set(key, value, generation)
+        return value
 
     def delete(self, key: str) -> None:
         """Delete itinerary data"""
         self.client.delete(key)
+        if self.near_cache:
+            self.near_cache.invalidate([key])
+
+    def get_many(self, keys: List[str]) -> List[Optional[dict]]:
+        """Values of keys in one round trip (MGET of the keys missing from the near cache)"""
+        values = [None] * len(keys)
+        missing = []
+        generation = None
+        for i, key in enumerate(keys):
+            if self.near_cache:
+                hit, value, key_generation = self.near_cache.get(key)
+                if generation is None:
+                    generation = key_generation
+                if hit:
+                    values[i] = value
+                    continue
+            missing.append(i)
+
+        if missing:
+            for i, data in zip(missing, self.binary_client.mget([keys[i] for i in missing])):
+                values[i] = decode(data)
+                if self.near_cache and values[i] is not None:
+                    self.near_cache.set(keys[i], values[i], generation)
+        return values
+
+    def set_many(self, mapping: Dict[str, dict], expire_time: int = 3600) -> None:
+        """Store several values with the same expiration time in one round trip"""
+        with self.pipeline() as pipe:
+            for key, data in mapping.items():
+                pipe.set(key, data, expire_time)
+
+    @contextmanager
+    def pipeline(self, transaction: bool = True):
+        """
+        Queue commands on the yielded CachePipeline, they are sent in one round trip
+        (MULTI/EXEC with transaction=True) when the block exits without an exception.
+        Keys written through the pipeline's set/delete are invalidated in the near cache.
+        """
+        pipe = CachePipeline(self.binary_client.pipeline(transaction=transaction), self.codec)
+        try:
+            yield pipe
+            pipe.execute()
+        finally:
+            pipe.reset()
+        if self.near_cache and pipe.written:
+            self.near_cache.invalidate(pipe.written)
+
+    def acquire_lock(self, key: str, lease: float) -> Optional[str]:
+        """Token of the lock on key held for lease seconds, None if another worker holds it"""
+        token = uuid.uuid4().hex
+        if self.client.set('lock:' + key, token, nx=True, px=int(lease * 1000)):
+            return token
+        return None
+
+    def release_lock(self, key: str, token: str) -> None:
+        if not hasattr(self, '_release_lock'):
+            self._release_lock = self.client.register_script(RELEASE_LOCK_SCRIPT)
+        try:
+            self._release_lock(keys=['lock:' + key], args=[token])
+        except Exception as e:
+            # the lease expires on its own
+            logger.warning(f"Releasing the lock on {key} failed: {str(e)}")
+
+    def read_with_ttl(self, key: str) -> Tuple[Any, float, Optional[float]]:
+        """(value, seconds to expiry, duration of the computation that stored it) in one round trip"""
+        with self.pipeline(transaction=False) as pipe:
+            pipe.get(key)
+            pipe.pttl(key)
+            pipe.get('compute_time:' + key)
+        value, ttl, delta = pipe.results
+        return value, ttl / 1000, float(delta) if delta is not None else None
+
+    def should_refresh(self, ttl: float, delta: Optional[float], beta: float) -> bool:
+        """XFetch: recompute before expiry with a probability growing as ttl shrinks relative to delta"""
+        if beta <= 0 or delta is None or ttl <= 0:
+            return False
+        return delta * beta * -math.log(1.0 - random.random()) >= ttl
+
+    def compute_and_set(self, key: str, compute: Callable[[], Any], expire_time: int, token: Optional[str]) -> Any:
+        try:
+            start = time.monotonic()
+            value = compute()
+            if value is not None:
+                with self.pipeline() as pipe:
+                    pipe.set(key, value, expire_time)
+                    pipe.setex('compute_time:' + key, expire_time, f"{time.monotonic() - start:.6f}")
+            return value
+        finally:
+            if token is not None:
+                self.release_lock(key, token)
+
+    def get_or_compute(
+            self,
+            key: str,
+            compute: Callable[[], Any],
+            expire_time: int = 3600,
+            lease: float = None,
+            wait_timeout: float = None,
+            beta: float = 1.0,
+    ) -> Any:
+        """
+        Value of key, computed by a single worker when it is missing.
+
+        The worker that gets the lock (SET NX with a lease, released only by its owner) runs
+        compute() and stores the result, the others poll until the value appears. A waiter
+        that gives up after wait_timeout, or sees the lock released without a value, computes
+        it itself. With beta > 0 a hit is refreshed early by one worker with a probability
+        that grows as the key nears expiry (scaled by how long compute took), everybody else
+        keeps getting the current value. A None result is returned but not stored.
+        """
+        lease = lease or float(os.getenv('REDIS_LOCK_LEASE', 60))
+        wait_timeout = lease if wait_timeout is None else wait_timeout
+
+        value, ttl, delta = self.read_with_ttl(key)
+        if value is not None:
+            if not self.should_refresh(ttl, delta, beta):
+                return value
+            token = self.acquire_lock(key, lease)
+            if token is None:
+                return value
+            logger.info(f"Refreshing {key} early, {ttl:.1f}s before expiry")
+            try:
+                return self.compute_and_set(key, compute, expire_time, token) or value
+            except Exception as e:
+                logger.warning(f"Early refresh of {key} failed, serving the current value: {str(e)}")
+                return value
+
+        deadline = time.monotonic() + wait_timeout
+        delay = 0.05
+        token = self.acquire_lock(key, lease)
+        while token is None:
+            time.sleep(delay)
+            delay = min(delay * 1.5, 1.0)
+            value = decode(self.binary_client.get(key))
+            if value is not None:
+                return value
+            if time.monotonic() >= deadline:
+                logger.warning(f"Timed out waiting for {key} to be computed, computing it here")
+                return self.compute_and_set(key, compute, expire_time, None)
+            token = self.acquire_lock(key, lease)
+
+        # stored between our read and taking the lock
+        value = decode(self.binary_client.get(key))
+        if value is not None:
+            self.release_lock(key, token)
+            return value
+        return self.compute_and_set(key, compute, expire_time, token)
+
+    def near_cache_stats(self) -> Optional[dict]:
+        return self.near_cache.stats() if self.near_cache else None
     
     def get_ttl(self, key: str) -> int:
         """Get remaining time to live for an itinerary in seconds"""
@@ -55,4 +299,89 @@ class RedisCache:
                 'ttl': self.client.ttl(key),
                 'type': self.client.type(key),
                 'value': self.get(key)
-            }
\ No newline at end of file
+            }
+
+class AsyncRedisCache:
+    """asyncio counterpart of RedisCache used by the ASGI server"""
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, 'client'):
+            self.client = AsyncRedis(
+                host=os.getenv('REDIS_HOST'),
+                port=6379,
+                db=0,
+                decode_responses=True,
+                socket_timeout=10
+            )
+            print("Async redis client initialized", self.client)
+            # RedisCache near caches (in other workers and in this one) must see async writes too
+            self.publish_invalidations = os.getenv('REDIS_NEAR_CACHE', 'false').lower() == 'true'
+            self.worker_id = new_worker_id()
+            self.codec = Codec.from_env()
+
+    @property
+    def binary_client(self) -> AsyncRedis:
+        """Client without response decoding, for values stored as bytes"""
+        if not hasattr(self, '_binary_client'):
+            self._binary_client = AsyncRedis(
+                host=os.getenv('REDIS_HOST'),
+                port=6379,
+                db=0,
+                decode_responses=False,
+                socket_timeout=10
+            )
+        return self._binary_client
+
+    async def invalidate(self, *keys: str) -> None:
+        if not self.publish_invalidations or not keys:
+            return
+        if RedisCache._instance is not None and RedisCache._instance.near_cache:
+            RedisCache._instance.near_cache.drop(list(keys))
+        await self.client.publish(INVALIDATION_CHANNEL, invalidation_message(self.worker_id, list(keys)))
+
+    async def set(self, key: str, data: dict, expire_time: int = 3600) -> None:
+        """Store itinerary data with expiration time"""
+        await self.binary_client.setex(
+            key,
+            expire_time,
+            self.codec.encode(data)
+        )
+        await self.invalidate(key)
+
+    async def get(self, key: str) -> Optional[dict]:
+        """Retrieve itinerary data"""
+        return decode(await self.binary_client.get(key))
+
+    async def delete(self, key: str) -> None:
+        """Delete itinerary data"""
+        await self.client.delete(key)
+        await self.invalidate(key)
+
+    async def get_many(self, keys: List[str]) -> List[Optional[dict]]:
+        """Values of keys in one round trip"""
+        if not keys:
+            return []
+        return [decode(data) for data in await self.binary_client.mget(keys)]
+
+    async def set_many(self, mapping: Dict[str, dict], expire_time: int = 3600) -> None:
+        """Store several values with the same expiration time in one round trip"""
+        async with self.pipeline() as pipe:
+            for key, data in mapping.items():
+                pipe.set(key, data, expire_time)
+
+    @asynccontextmanager
+    async def pipeline(self, transaction: bool = True):
+        """Async counterpart of RedisCache.pipeline"""
+        pipe = AsyncCachePipeline(self.binary_client.pipeline(transaction=transaction), self.codec)
+        try:
+            yield pipe
+            await pipe.execute()
+        finally:
+            await pipe.reset()
+        await self.invalidate(*pipe.written)
@@ -0,0 +1,123 @@
+import json
+import os
+import threading
+from typing import Any, Optional, Union
+import orjson
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Encoded values start with a header byte: the serialization format plus a compression flag.
+# Values written before codecs existed are plain JSON text, which never starts with one of
+# these bytes, so old and new values can be read side by side while workers are upgraded.
+FORMAT_JSON = 0x01
+FORMAT_MSGPACK = 0x02
+FLAG_ZSTD = 0x10
+HEADERS = {
+    FORMAT_JSON, FORMAT_MSGPACK,
+    FORMAT_JSON | FLAG_ZSTD, FORMAT_MSGPACK | FLAG_ZSTD,
+}
+
+# smaller values are not worth a zstd frame
+COMPRESS_MIN_BYTES = 1024
+
+
+class CodecError(ValueError):
+    pass
+
+
+class Codec:
+    """
+    Serializes values stored in redis.
+
+    name is one of json (plain JSON without a header, readable by older workers), orjson or
+    msgpack, optionally suffixed with +zstd. decode() reads every format whatever the codec
+    is configured to write.
+    """
+
+    def __init__(self, name: str = 'json', level: int = 3):
+        self.name = name
+        serializer, _, compression = name.partition('+')
+        if serializer not in ('json', 'orjson', 'msgpack') or compression not in ('', 'zstd'):
+            raise CodecError(f"Unknown redis codec {name}")
+        if serializer == 'json' and compression:
+            # the compressed format needs a header, use orjson+zstd
+            raise CodecError(f"Unknown redis codec {name}, json can't be compressed")
+        if serializer == 'msgpack' and msgpack is None:
+            raise CodecError("The msgpack codec needs the msgpack package")
+        if compression and zstandard is None:
+            raise CodecError("zstd compression needs the zstandard package")
+
+        self.serializer = serializer
+        self.compression = compression
+        self.level = level
+        # zstd (de)compressors must not be shared between threads
+        self._local = threading.local()
+
+    @property
+    def compressor(self):
+        if not self.compression:
+            return None
+        if not hasattr(self._local, 'compressor'):
+            self._local.compressor = zstandard.ZstdCompressor(level=self.level)
+        return self._local.compressor
+
+    @classmethod
+    def from_env(cls) -> 'Codec':
+        return cls(os.getenv('REDIS_CODEC', 'json'), level=int(os.getenv('REDIS_CODEC_LEVEL', 3)))
+
+    def encode(self, value: Any) -> bytes:
+        if self.serializer == 'json':
+            return json.dumps(value).encode('utf-8')
+
+        if self.serializer == 'msgpack':
+            header, data = FORMAT_MSGPACK, msgpack.packb(value, use_bin_type=True)
+        else:
+            header, data = FORMAT_JSON, orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+        if self.compressor is not None and len(data) >= COMPRESS_MIN_BYTES:
+            header, data = header | FLAG_ZSTD, self.compressor.compress(data)
+        return bytes([header]) + data
+
+
+_local = threading.local()
+
+
+def decompress(payload: bytes) -> bytes:
+    if zstandard is None:
+        raise CodecError("Value is zstd compressed but the zstandard package is not installed")
+    if not hasattr(_local, 'decompressor'):
+        _local.decompressor = zstandard.ZstdDecompressor()
+    return _local.decompressor.decompress(payload)
+
+
+def decode_json(data: Union[bytes, str]) -> Any:
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        # json.dumps writes NaN/Infinity, which orjson rejects
+        return json.loads(data)
+
+
+def decode(data: Optional[Union[bytes, str]]) -> Any:
+    """Value of any codec's (or legacy plain JSON) encoding, None for a missing key"""
+    if not data:
+        return None
+    if isinstance(data, str) or data[0] not in HEADERS:
+        return decode_json(data)
+
+    header, payload = data[0], data[1:]
+    if header & FLAG_ZSTD:
+        payload = decompress(payload)
+    if header & ~FLAG_ZSTD == FORMAT_MSGPACK:
+        if msgpack is None:
+            raise CodecError("Value is msgpack encoded but the msgpack package is not installed")
+        return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+    return decode_json(payload)
@@ -0,0 +1,76 @@
+from typing import List, Tuple
+from tools.redis_codec import Codec, decode
+
+
+class ThreadStore:
+    """
+    Append-only storage of conversation threads in a redis list.
+
+    Every message of a session is stored once, tagged with the agent that produced it.
+    The overall conversation is the whole list, an agent's private thread is the subset
+    tagged with its name. A turn only RPUSHes its new messages and refreshes the TTL.
+    Entries are encoded with the REDIS_CODEC codec, use a client without response decoding.
+    """
+
+    def __init__(self, client, expire_time: int = 3600, codec: Codec = None):
+        self.client = client
+        self.expire_time = expire_time
+        self.codec = codec or Codec.from_env()
+
+    def key(self, session_id: str) -> str:
+        return 'thread:conversation:' + session_id
+
+    def encode(self, agent_name: str, messages: List[dict]) -> List[bytes]:
+        return [self.codec.encode({'agent': agent_name, 'message': message}) for message in messages]
+
+    def decode(self, entries) -> List[dict]:
+        return [decode(entry) for entry in entries]
+
+    def split(self, entries, agent_name: str) -> Tuple[List[dict], List[dict]]:
+        """Return (agent thread, overall thread) messages from the stored entries"""
+        entries = self.decode(entries)
+        thread = [entry['message'] for entry in entries if entry['agent'] == agent_name]
+        overall_thread = [entry['message'] for entry in entries]
+        return thread, overall_thread
+
+    def read(self, pipe, session_id: str) -> None:
+        """Queue the read of a session's entries on a pipeline, pass the reply to split()"""
+        pipe.lrange(self.key(session_id), 0, -1)
+
+    def write(self, pipe, agent_name: str, session_id: str, messages: List[dict]) -> None:
+        """Queue the append of messages on a pipeline"""
+        if not messages:
+            return
+        key = self.key(session_id)
+        pipe.rpush(key, *self.encode(agent_name, messages))
+        pipe.expire(key, self.expire_time)
+
+    def load(self, agent_name: str, session_id: str) -> Tuple[List[dict], List[dict]]:
+        return self.split(self.client.lrange(self.key(session_id), 0, -1), agent_name)
+
+    def conversation(self, session_id: str) -> List[dict]:
+        return [entry['message'] for entry in self.decode(self.client.lrange(self.key(session_id), 0, -1))]
+
+    def append(self, agent_name: str, session_id: str, messages: List[dict]) -> None:
+        if not messages:
+            return
+        pipe = self.client.pipeline(transaction=True)
+        self.write(pipe, agent_name, session_id, messages)
+        pipe.execute()
+
+
+class AsyncThreadStore(ThreadStore):
+    """ThreadStore on top of an asyncio redis client"""
+
+    async def load(self, agent_name: str, session_id: str) -> Tuple[List[dict], List[dict]]:
+        return self.split(await self.client.lrange(self.key(session_id), 0, -1), agent_name)
+
+    async def conversation(self, session_id: str) -> List[dict]:
+        return [entry['message'] for entry in self.decode(await self.client.lrange(self.key(session_id), 0, -1))]
+
+    async def append(self, agent_name: str, session_id: str, messages: List[dict]) -> None:
+        if not messages:
+            return
+        pipe = self.client.pipeline(transaction=True)
+        self.write(pipe, agent_name, session_id, messages)
+        await pipe.execute()
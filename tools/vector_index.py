@@ -0,0 +1,218 @@
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+import numpy as np
+from dotenv import load_dotenv
+from logger import logger
+
+load_dotenv()
+
+VECTOR_INDEX_DIR = os.getenv('VECTOR_INDEX_DIR', 'data/vector_index')
+
+# same thresholds as the sql in get_hotels_tool / get_activities_tool
+HOTEL_MIN_SIMILARITY = 0.30  # inner product
+ACTIVITY_MAX_DISTANCE = 0.3  # cosine distance
+
+
+def to_vector(value) -> np.ndarray:
+    """pgvector values come back as '[0.1,0.2,...]' strings, ARRAY(Float) columns as lists"""
+    if isinstance(value, str):
+        return np.array(value.strip('[]').split(','), dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+class VectorIndex:
+    """
+    Embeddings of one table as a float32 matrix with the rows of each destination stored
+    contiguously, so a search only scores the slice of the destinations it is asked for.
+
+    metric is 'ip' (inner product, like <#>) or 'cosine' (rows are stored normalized, like <=>).
+    """
+
+    def __init__(self, matrix: np.ndarray, columns: Dict[str, list], destinations: Dict[int, dict], metric: str = 'ip'):
+        self.matrix = matrix
+        self.columns = columns
+        self.destinations = destinations
+        self.metric = metric
+        self._arrays = {}
+
+    @classmethod
+    def build(cls, records: List[dict], metric: str = 'ip') -> 'VectorIndex':
+        """records: dicts with destination_id, destination_name, embedding and any other columns"""
+        records = sorted(records, key=lambda record: record['destination_id'])
+        if records:
+            matrix = np.vstack([to_vector(record['embedding']) for record in records])
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        if metric == 'cosine' and len(matrix):
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.where(norms == 0, 1, norms)
+
+        names = [name for name in records[0] if name != 'embedding'] if records else []
+        columns = {name: [record[name] for record in records] for name in names}
+
+        destinations = {}
+        for position, record in enumerate(records):
+            destination = destinations.setdefault(record['destination_id'], {
+                'name': record['destination_name'], 'start': position, 'end': position,
+            })
+            destination['end'] = position + 1
+
+        return cls(matrix.astype(np.float32), columns, destinations, metric)
+
+    def save(self, directory: str, name: str) -> None:
+        """Write the matrix as .npy (memory mappable) and the metadata as json, the json is replaced last"""
+        os.makedirs(directory, exist_ok=True)
+        matrix_file = f"{name}.{uuid.uuid4().hex}.npy"
+        np.save(os.path.join(directory, matrix_file), self.matrix)
+
+        metadata_path = os.path.join(directory, f"{name}.json")
+        with open(metadata_path + '.tmp', 'w') as f:
+            json.dump({
+                'matrix': matrix_file,
+                'rows': len(self.matrix),
+                'metric': self.metric,
+                'columns': self.columns,
+                'destinations': self.destinations,
+            }, f)
+        os.replace(metadata_path + '.tmp', metadata_path)
+
+        # workers that still map an older file keep it open until they reload
+        for file in os.listdir(directory):
+            if file.startswith(f"{name}.") and file.endswith('.npy') and file != matrix_file:
+                os.remove(os.path.join(directory, file))
+
+    @classmethod
+    def load(cls, directory: str, name: str) -> 'VectorIndex':
+        with open(os.path.join(directory, f"{name}.json")) as f:
+            metadata = json.load(f)
+        matrix = np.load(os.path.join(directory, metadata['matrix']), mmap_mode='r')
+        if len(matrix) != metadata['rows']:
+            raise ValueError(f"Vector index {name} has {len(matrix)} rows, metadata expects {metadata['rows']}")
+        destinations = {int(id_): destination for id_, destination in metadata['destinations'].items()}
+        return cls(matrix, metadata['columns'], destinations, metadata['metric'])
+
+    def array(self, column: str) -> np.ndarray:
+        if column not in self._arrays:
+            self._arrays[column] = np.asarray(self.columns[column])
+        return self._arrays[column]
+
+    def distinct(self, *columns) -> List[tuple]:
+        """Distinct value combinations of columns, cached"""
+        key = ('distinct',) + columns
+        if key not in self._arrays:
+            self._arrays[key] = list(dict.fromkeys(zip(*(self.columns[column] for column in columns))))
+        return self._arrays[key]
+
+    def destination_ids(self, name: str) -> List[int]:
+        """Destinations whose name matches case insensitively (WHERE name ILIKE %s)"""
+        name = str(name or '').lower()
+        return [id_ for id_, destination in self.destinations.items() if destination['name'].lower() == name]
+
+    def search(self, query: List[float], destination_ids: List[int], k: int = 5, min_score: float = None, where=None) -> List[tuple]:
+        """
+        Top k (score, row index) pairs among the rows of destination_ids, best first.
+        Scores are inner products, or cosine similarities for a cosine index.
+        where: optional function (row indices) -> boolean mask to filter rows
+        """
+        slices = [self.destinations[id_] for id_ in destination_ids if id_ in self.destinations]
+        if not slices or not len(self.matrix):
+            return []
+        rows = np.concatenate([np.arange(s['start'], s['end']) for s in slices])
+        if where is not None:
+            rows = rows[where(rows)]
+        if not len(rows):
+            return []
+
+        query = np.asarray(query, dtype=np.float32)
+        if self.metric == 'cosine':
+            query = query / (np.linalg.norm(query) or 1)
+        scores = self.matrix[rows] @ query
+
+        if min_score is not None:
+            keep = scores > min_score
+            rows, scores = rows[keep], scores[keep]
+        if len(rows) > k:
+            top = np.argpartition(-scores, k)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind='stable')
+        return [(float(scores[i]), int(rows[i])) for i in order]
+
+
+class VectorIndexStore:
+    """Indexes memory mapped from the files written by data-pipeline.py, reloaded when they are rewritten"""
+
+    def __init__(self, directory: str = VECTOR_INDEX_DIR, check_interval: float = 30):
+        self.directory = directory
+        self.check_interval = check_interval
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Optional[VectorIndex]:
+        """The index, None if no index file has been written (callers then query the db)"""
+        index, mtime, checked_at = self._indexes.get(name, (None, None, 0.0))
+        if time.monotonic() - checked_at < self.check_interval:
+            return index
+
+        with self._lock:
+            try:
+                current_mtime = os.path.getmtime(os.path.join(self.directory, f"{name}.json"))
+                if current_mtime != mtime:
+                    index = VectorIndex.load(self.directory, name)
+                    mtime = current_mtime
+                    logger.info(f"Loaded vector index {name} with {len(index.matrix)} rows")
+            except FileNotFoundError:
+                index, mtime = None, None
+            except Exception as e:
+                logger.error(f"Error loading vector index {name}: {str(e)}", exc_info=True)
+            self._indexes[name] = (index, mtime, time.monotonic())
+        return index
+
+
+vector_indexes = VectorIndexStore(check_interval=float(os.getenv('VECTOR_INDEX_CHECK_INTERVAL', 30)))
+
+
+def search_hotels(query_embedding: List[float], destination: str, star_rating: int, k: int = 5) -> Optional[List[str]]:
+    """
+    Hotels with the given star rating in a location or destination whose name contains destination,
+    inner product above HOTEL_MIN_SIMILARITY. None when the index is not available.
+    """
+    index = vector_indexes.get('hotels')
+    if index is None:
+        return None
+
+    needle = str(destination).lower()
+    destination_ids = [id_ for id_, d in index.destinations.items() if needle in d['name'].lower()]
+    locations = [
+        (location_id, destination_id)
+        for location_id, location_name, destination_id in index.distinct('location_id', 'location_name', 'destination_id')
+        if needle in str(location_name).lower()
+    ]
+    location_ids = [location_id for location_id, _ in locations]
+
+    def where(rows):
+        mask = index.array('star')[rows] == star_rating
+        return mask & (
+            np.isin(index.array('destination_id')[rows], destination_ids)
+            | np.isin(index.array('location_id')[rows], location_ids)
+        )
+
+    candidates = set(destination_ids) | {destination_id for _, destination_id in locations}
+    results = index.search(query_embedding, list(candidates), k, HOTEL_MIN_SIMILARITY, where)
+    return [
+        f"{index.columns['name'][row]} at {index.columns['location_name'][row]}, {index.columns['destination_name'][row]}"
+        for _, row in results
+    ]
+
+
+def search_activities(query_embedding: List[float], destination: str, k: int = 5) -> Optional[List[str]]:
+    """Must travel activities of destination within ACTIVITY_MAX_DISTANCE cosine distance. None when the index is not available."""
+    index = vector_indexes.get('must_travel_activities')
+    if index is None:
+        return None
+
+    results = index.search(query_embedding, index.destination_ids(destination), k, 1 - ACTIVITY_MAX_DISTANCE)
+    return [index.columns['name'][row] for _, row in results]
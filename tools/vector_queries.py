@@ -0,0 +1,90 @@
+import os
+
+# The HNSW indexes only serve "ORDER BY embedding <op> query LIMIT k", a threshold in the WHERE
+# clause forces a sequential scan. The queries take the nearest candidates first and apply the
+# similarity threshold on that set.
+VECTOR_SEARCH_CANDIDATES = int(os.getenv('VECTOR_SEARCH_CANDIDATES', 40))
+
+# The star and destination filters are applied to the rows the index returns. A plain HNSW scan
+# returns at most hnsw.ef_search neighbours over the whole table, so a filtered search would only
+# see the few of them in the requested destination. With iterative scans (pgvector >= 0.8) the
+# index keeps scanning until enough rows pass the filters, up to hnsw.max_scan_tuples. Recall is
+# still approximate: relaxed_order may return candidates slightly out of distance order (the outer
+# query sorts them again) and a very selective filter can hit the scan limit and return fewer rows
+# than an exact scan. Set VECTOR_SEARCH_ITERATIVE_SCAN=off on pgvector < 0.8, where the filtered
+# searches then only see the ef_search global neighbours. data-pipeline.py --explain compares the
+# result counts with an exact scan.
+VECTOR_SEARCH_ITERATIVE_SCAN = os.getenv('VECTOR_SEARCH_ITERATIVE_SCAN', 'relaxed_order')
+VECTOR_SEARCH_EF_SEARCH = int(os.getenv('VECTOR_SEARCH_EF_SEARCH', max(VECTOR_SEARCH_CANDIDATES, 100)))
+
+HOTEL_SEARCH_SQL = """
+    SELECT id, name, location_name, destination_name, similarity
+    FROM (
+        SELECT
+            h.id,
+            h.name,
+            l.name AS location_name,
+            d.name AS destination_name,
+            -(h.embedding <#> %(embedding)s::vector) AS similarity
+        FROM hotel h
+        JOIN location l ON h.location_id = l.id
+        JOIN destination d ON l.destination_id = d.id
+        WHERE
+            h.star = %(star)s
+            AND (l.name ILIKE %(destination)s OR d.name ILIKE %(destination)s)
+        ORDER BY h.embedding <#> %(embedding)s::vector
+        LIMIT %(candidates)s
+    ) nearest
+    WHERE similarity > 0.30
+    ORDER BY similarity DESC
+    LIMIT %(k)s
+"""
+
+MUST_ACTIVITY_SEARCH_SQL = """
+    SELECT id, name, description, activity_image_url, activity_duration, distance
+    FROM (
+        SELECT
+            id,
+            name,
+            description,
+            activity_image_url,
+            activity_duration,
+            embedding <=> %(embedding)s::vector AS distance  -- cosine distance (lower is better)
+        FROM must_travel_activity
+        WHERE destination_id = %(destination_id)s
+        ORDER BY embedding <=> %(embedding)s::vector
+        LIMIT %(candidates)s
+    ) nearest
+    WHERE distance < 0.3
+    ORDER BY distance ASC
+    LIMIT %(k)s
+"""
+
+
+def vector_search_settings() -> list:
+    """SET LOCAL statements run in the transaction of a filtered nearest neighbour query"""
+    settings = [f"SET LOCAL hnsw.ef_search = {VECTOR_SEARCH_EF_SEARCH}"]
+    if VECTOR_SEARCH_ITERATIVE_SCAN != 'off':
+        settings.append(f"SET LOCAL hnsw.iterative_scan = {VECTOR_SEARCH_ITERATIVE_SCAN}")
+    return settings
+
+
+def fetch_nearest(cursor, sql: str, params: dict) -> list:
+    """
+    Rows of a filtered nearest neighbour query, run in its own transaction with the HNSW
+    settings (pooled connections are in autocommit mode, where SET LOCAL has no effect).
+    """
+    cursor.execute("BEGIN")
+    try:
+        for statement in vector_search_settings():
+            cursor.execute(statement)
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    finally:
+        # nothing was written, ending the transaction also resets the settings
+        cursor.execute("ROLLBACK")
+    return rows
+
+
+def vector_literal(embedding) -> str:
+    return "[" + ",".join(str(x) for x in embedding) + "]"